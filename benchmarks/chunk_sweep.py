@@ -0,0 +1,96 @@
+"""
+Chunk size / overlap sweep over a document set and a regression sheet.
+
+Re-chunks the documents under every size/overlap pair into local stand-in corpora, runs the
+sheet through the evaluation loop for each and reports chunk counts, embedding calls,
+retrieval latency and pass rate as JSON (see rag/tools/lifecycle/chunk_sweep.py).
+
+Usage:
+    python -m benchmarks.chunk_sweep --documents docs/ --sheet regression.xlsx --output sweep.json
+    python -m benchmarks.chunk_sweep --synthetic 40 --sizes 128,256,512 --overlaps 0,32 --fake-llm
+"""
+
+import os
+import sys
+import json
+import argparse
+import platform
+import tempfile
+import datetime
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Offline runs: importing rag must not start the Vertex warm-up and token refresher threads
+os.environ.setdefault("RAG_VERTEX_WARM_UP", "0")
+
+from benchmarks.fakes import FakeBackends, synthetic_text, write_synthetic_sheet  # noqa: E402
+from benchmarks.run_benchmarks import git_commit  # noqa: E402
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Chunk size / overlap sweep against local stand-in corpora")
+    parser.add_argument("--documents", nargs="*", default=[], help="Local files / directories or gs:// URIs")
+    parser.add_argument("--sheet", help="Regression sheet (.xlsx / .csv) with Query and Ground Truth columns")
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate this many synthetic documents and a matching sheet")
+    parser.add_argument("--sizes", help="Comma-separated chunk sizes in tokens (default: SWEEP_CHUNK_SIZES)")
+    parser.add_argument("--overlaps", help="Comma-separated chunk overlaps in tokens (default: SWEEP_CHUNK_OVERLAPS)")
+    parser.add_argument("--top-k", type=int, default=None, help="Chunks retrieved per query (default: RAG_DEFAULT_TOP_K)")
+    parser.add_argument("--max-rows", type=int, default=None, help="Evaluate only the first N rows of the sheet")
+    parser.add_argument("--cache", help="LLM completion cache file (default: RAG_STATE_DIR/llm_cache.sqlite3)")
+    parser.add_argument("--fake-llm", action="store_true", help="Use the in-process fake LLM (no Azure calls, throw-away cache)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this path (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.fake_llm:
+        # Also re-points the storage client, so gs:// documents are read from the fake bucket
+        FakeBackends(seed=args.seed).install()
+    from rag.tools.lifecycle.chunk_sweep import LLM_CACHE_PATH, run_chunking_sweep
+    from rag.config import RAG_DEFAULT_TOP_K
+
+    with tempfile.TemporaryDirectory() as workdir:
+        documents, sheet = list(args.documents), args.sheet
+        if args.synthetic:
+            for i in range(args.synthetic):
+                path = os.path.join(workdir, f"policy_{i:04d}.txt")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(synthetic_text(f"sweep-doc-{args.seed}-{i}", words=1500))
+                documents.append(path)
+            sheet = sheet or write_synthetic_sheet(os.path.join(workdir, "sheet.xlsx"), rows=args.synthetic, seed=args.seed)
+        if not documents or not sheet:
+            parser.error("pass --documents and --sheet, or --synthetic N")
+
+        result = run_chunking_sweep(
+            documents,
+            sheet,
+            chunk_sizes=_int_list(args.sizes) if args.sizes else None,
+            chunk_overlaps=_int_list(args.overlaps) if args.overlaps else None,
+            top_k=args.top_k or RAG_DEFAULT_TOP_K,
+            max_rows=args.max_rows,
+            cache_path=":memory:" if args.fake_llm else (args.cache or LLM_CACHE_PATH),
+        )
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "config": vars(args),
+        },
+        "result": result,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0 if result.get("status") == "success" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,549 @@
+"""
+Deterministic in-process stand-ins for the cloud backends used by the RAG tools:
+`vertexai.preview.rag`, `litellm.completion` and `google.cloud.storage`, plus a local HTTP
+stand-in for the live-agent hand-off endpoint used by the escalation outbox.
+
+Every fake takes a LatencyModel so that benchmarks can simulate slow replicas,
+jitter and error bursts without touching GCP or Azure.
+"""
+
+import json
+import sys
+import time
+import types
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional
+
+
+class LatencyModel:
+    """
+    Simulated call latency: `base_ms` plus uniform jitter in [0, jitter_ms],
+    failing with `error_rate` probability. Seeded, so runs are reproducible.
+    """
+
+    def __init__(self, base_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.base_ms = base_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def wait(self, operation: str) -> None:
+        with self._lock:
+            delay_ms = self.base_ms + (self._rng.random() * self.jitter_ms if self.jitter_ms else 0.0)
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+        if fail:
+            raise RuntimeError(f"Injected failure in {operation}")
+
+    @classmethod
+    def from_spec(cls, spec: Optional[Dict[str, Any]], seed: int = 0) -> "LatencyModel":
+        spec = spec or {}
+        return cls(
+            base_ms=spec.get("base_ms", 0.0),
+            jitter_ms=spec.get("jitter_ms", 0.0),
+            error_rate=spec.get("error_rate", 0.0),
+            seed=spec.get("seed", seed),
+        )
+
+
+def _stable_hash(*parts: str) -> int:
+    return int.from_bytes(hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=8).digest(), "big")
+
+
+_VOCABULARY = (
+    "policy premium claim benefit coverage insured beneficiary rider hospital surgery "
+    "outpatient deductible waiting period exclusion renewal lapse surrender maturity "
+    "critical illness accident disability death payout reimbursement document submission "
+    "customer service hotline branch agent plan term whole life savings investment fund"
+).split()
+
+
+def synthetic_text(seed: str, words: int = 380) -> str:
+    """Builds a deterministic pseudo-policy text of `words` words, split into sentences."""
+    rng = random.Random(_stable_hash(seed))
+    sentences = []
+    remaining = words
+    while remaining > 0:
+        length = min(remaining, rng.randint(8, 20))
+        sentence = " ".join(rng.choice(_VOCABULARY) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        remaining -= length
+    return " ".join(sentences)
+
+
+# ---------------------------------------------------------------- Vertex RAG
+
+
+class FakeRag(types.ModuleType):
+    """
+    Module-shaped fake of `vertexai.preview.rag`.
+    Holds `corpus_count` corpora with `files_per_corpus` files of `chunks_per_file` chunks each.
+    """
+
+    def __init__(
+        self,
+        corpus_count: int = 3,
+        files_per_corpus: int = 20,
+        chunks_per_file: int = 10,
+        latency: Optional[LatencyModel] = None,
+        project: str = "bench-project",
+        location: str = "asia-east1",
+    ):
+        super().__init__("vertexai.preview.rag")
+        self.latency = latency or LatencyModel()
+        self._prefix = f"projects/{project}/locations/{location}/ragCorpora"
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        self.corpora: Dict[str, SimpleNamespace] = {}
+        self.files: Dict[str, List[SimpleNamespace]] = {}
+        self.chunks: Dict[str, List[SimpleNamespace]] = {}
+        self.chunks_per_file = chunks_per_file
+        for c in range(corpus_count):
+            corpus = self._new_corpus(f"bench-corpus-{c}", str(1000 + c))
+            for f in range(files_per_corpus):
+                self._add_file(corpus.name, f"gs://bench-bucket/corpus-{c}/policy_{f:04d}.pdf")
+
+        # SDK types used by the tools
+        self.RagResource = lambda rag_corpus=None, rag_file_ids=None: SimpleNamespace(rag_corpus=rag_corpus, rag_file_ids=rag_file_ids)
+        self.EmbeddingModelConfig = lambda publisher_model=None: SimpleNamespace(publisher_model=publisher_model)
+        self.ChunkingConfig = lambda chunk_size=None, chunk_overlap=None: SimpleNamespace(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.TransformationConfig = lambda chunking_config=None: SimpleNamespace(chunking_config=chunking_config)
+
+    def _count(self, operation: str) -> None:
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        self.latency.wait(f"rag.{operation}")
+
+    @staticmethod
+    def _corpus_key(resource_name: str) -> str:
+        # Lookups go by corpus ID so that any project/location prefix resolves
+        return resource_name.split("/ragCorpora/")[-1].split("/")[0]
+
+    def _new_corpus(self, display_name: str, corpus_id: Optional[str] = None, description: str = "") -> SimpleNamespace:
+        corpus_id = corpus_id or str(1000 + len(self.corpora))
+        corpus = SimpleNamespace(
+            name=f"{self._prefix}/{corpus_id}",
+            display_name=display_name,
+            description=description,
+            create_time="2026-01-01T00:00:00Z",
+            corpus_status=SimpleNamespace(state="ACTIVE"),
+        )
+        self.corpora[corpus_id] = corpus
+        self.files[corpus_id] = []
+        self.chunks[corpus_id] = []
+        return corpus
+
+    def _add_file(self, corpus_name: str, gcs_uri: str) -> SimpleNamespace:
+        key = self._corpus_key(corpus_name)
+        corpus_name = self.corpora[key].name
+        file_id = str(_stable_hash(corpus_name, gcs_uri) % 10**12)
+        rag_file = SimpleNamespace(
+            name=f"{corpus_name}/ragFiles/{file_id}",
+            display_name=gcs_uri.split("/")[-1],
+            source_uri=gcs_uri,
+            create_time="2026-01-01T00:00:00Z",
+        )
+        self.files[key].append(rag_file)
+        for i in range(self.chunks_per_file):
+            self.chunks[key].append(SimpleNamespace(
+                text=synthetic_text(f"{gcs_uri}#{i}"),
+                source_uri=gcs_uri,
+            ))
+        return rag_file
+
+    # -- corpus management
+    def create_corpus(self, display_name=None, description=None, embedding_model_config=None):
+        self._count("create_corpus")
+        with self._lock:
+            return self._new_corpus(display_name, description=description or "")
+
+    def update_corpus(self, corpus_name=None, display_name=None, description=None):
+        self._count("update_corpus")
+        corpus = self.corpora[self._corpus_key(corpus_name)]
+        if display_name:
+            corpus.display_name = display_name
+        if description:
+            corpus.description = description
+        return corpus
+
+    def list_corpora(self, page_size=None, page_token=None):
+        self._count("list_corpora")
+        return list(self.corpora.values())
+
+    def get_corpus(self, name=None):
+        self._count("get_corpus")
+        key = self._corpus_key(name)
+        if key not in self.corpora:
+            raise KeyError(f"Corpus {name} not found")
+        return self.corpora[key]
+
+    def delete_corpus(self, name=None):
+        self._count("delete_corpus")
+        with self._lock:
+            key = self._corpus_key(name)
+            self.corpora.pop(key, None)
+            self.files.pop(key, None)
+            self.chunks.pop(key, None)
+
+    # -- files
+    def import_files(self, corpus_name, paths, transformation_config=None, max_embedding_requests_per_min=None, **kwargs):
+        self._count("import_files")
+        with self._lock:
+            for uri in paths:
+                self._add_file(corpus_name, uri)
+        return SimpleNamespace(imported_rag_files_count=len(paths), failed_rag_files_count=0, skipped_rag_files_count=0)
+
+    def list_files(self, corpus_name=None, page_size=None, page_token=None):
+        self._count("list_files")
+        key = self._corpus_key(corpus_name)
+        if key not in self.files:
+            raise KeyError(f"Corpus {corpus_name} not found")
+        return list(self.files[key])
+
+    def get_file(self, name=None):
+        self._count("get_file")
+        file_id = name.split("/ragFiles/")[-1]
+        for f in self.files.get(self._corpus_key(name), []):
+            if f.name.endswith(f"/ragFiles/{file_id}"):
+                return f
+        raise KeyError(f"File {name} not found")
+
+    def delete_file(self, name=None):
+        self._count("delete_file")
+        key = self._corpus_key(name)
+        file_id = name.split("/ragFiles/")[-1]
+        with self._lock:
+            files = self.files.get(key, [])
+            doomed = [f for f in files if f.name.endswith(f"/ragFiles/{file_id}")]
+            if not doomed:
+                raise KeyError(f"File {name} not found")
+            files.remove(doomed[0])
+            self.chunks[key] = [c for c in self.chunks[key] if c.source_uri != doomed[0].source_uri]
+
+    # -- retrieval
+    def retrieval_query(self, rag_resources=None, text=None, similarity_top_k=10, vector_distance_threshold=None, **kwargs):
+        """
+        Returns `similarity_top_k` chunks per request, chosen and scored deterministically
+        from a hash of (corpus, query, chunk) so that repeated runs give identical results.
+        """
+        self._count("retrieval_query")
+        contexts = []
+        for resource in rag_resources or []:
+            chunks = self.chunks.get(self._corpus_key(resource.rag_corpus), [])
+            if not chunks:
+                continue
+            scored = []
+            base = _stable_hash(resource.rag_corpus, text or "")
+            for offset in range(min(len(chunks), similarity_top_k * 3)):
+                index = (base + offset * 7919) % len(chunks)
+                distance = (_stable_hash(str(base), str(index)) % 1000) / 2000.0
+                scored.append((distance, index))
+            scored.sort()
+            for distance, index in scored[:similarity_top_k]:
+                if vector_distance_threshold is not None and distance > vector_distance_threshold:
+                    continue
+                chunk = chunks[index]
+                contexts.append(SimpleNamespace(text=chunk.text, source_uri=chunk.source_uri, distance=distance))
+        contexts.sort(key=lambda c: c.distance)
+        return SimpleNamespace(contexts=SimpleNamespace(contexts=contexts[:similarity_top_k]))
+
+
+# ---------------------------------------------------------------- LiteLLM
+
+
+class FakeLiteLLM(types.ModuleType):
+    """
+    Module-shaped fake of `litellm` exposing `completion`.
+    JSON-mode requests get a judge verdict, other requests a short generated answer.
+    """
+
+    def __init__(self, latency: Optional[LatencyModel] = None, pass_rate: float = 0.8):
+        super().__init__("litellm")
+        self.latency = latency or LatencyModel()
+        self.pass_rate = pass_rate
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_chars = 0
+        self.call_timestamps: List[float] = []
+
+    def completion(self, model=None, messages=None, response_format=None, **kwargs):
+        prompt = "\n".join(m.get("content", "") for m in messages or [])
+        with self._lock:
+            self.calls += 1
+            self.prompt_chars += len(prompt)
+        self.latency.wait("litellm.completion")
+        digest = _stable_hash(model or "", prompt)
+        if response_format and response_format.get("type") == "json_object":
+            passed = (digest % 1000) / 1000.0 < self.pass_rate
+            score = 0.7 + (digest % 300) / 1000.0 if passed else (digest % 700) / 1000.0
+            content = json.dumps({"score": round(score, 3), "reason": "Synthetic judgement"})
+        else:
+            content = synthetic_text(str(digest), words=40)
+        with self._lock:
+            self.call_timestamps.append(time.perf_counter())
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ),
+        )
+
+
+# ---------------------------------------------------------------- Cloud Storage
+
+
+class FakeBlob:
+    def __init__(self, bucket: "FakeBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+
+    def _store(self) -> Dict[str, bytes]:
+        return self.bucket.client.objects.setdefault(self.bucket.name, {})
+
+    def upload_from_string(self, data, content_type=None):
+        self.bucket.client._count("blob.upload")
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._store()[self.name] = bytes(data)
+
+    def upload_from_file(self, file_obj, content_type=None):
+        self.upload_from_string(file_obj.read(), content_type=content_type)
+
+    def upload_from_filename(self, filename, content_type=None):
+        with open(filename, "rb") as f:
+            self.upload_from_string(f.read(), content_type=content_type)
+
+    def download_as_bytes(self):
+        self.bucket.client._count("blob.download")
+        return self._store()[self.name]
+
+    def download_to_filename(self, filename):
+        with open(filename, "wb") as f:
+            f.write(self.download_as_bytes())
+
+    def exists(self):
+        self.bucket.client._count("blob.exists")
+        return self.name in self._store()
+
+    def delete(self):
+        self.bucket.client._count("blob.delete")
+        self._store().pop(self.name, None)
+
+
+class FakeBucket:
+    def __init__(self, client: "FakeStorageClient", name: str):
+        self.client = client
+        self.name = name
+
+    def exists(self):
+        self.client._count("bucket.exists")
+        return self.name in self.client.objects
+
+    def create(self, location=None):
+        self.client._count("bucket.create")
+        self.client.objects.setdefault(self.name, {})
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+
+class FakeStorageClient:
+    """In-memory `google.cloud.storage.Client` with per-call latency."""
+
+    def __init__(self, project=None, latency: Optional[LatencyModel] = None, objects: Optional[Dict[str, Dict[str, bytes]]] = None):
+        self.project = project
+        self.latency = latency or LatencyModel()
+        self.objects: Dict[str, Dict[str, bytes]] = objects if objects is not None else {}
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, operation: str) -> None:
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        self.latency.wait(f"storage.{operation}")
+
+    def bucket(self, name):
+        return FakeBucket(self, name)
+
+    def list_blobs(self, bucket_name, prefix=None):
+        self._count("list_blobs")
+        names = sorted(self.objects.get(bucket_name, {}))
+        return [SimpleNamespace(name=n) for n in names if not prefix or n.startswith(prefix)]
+
+
+def make_storage_module(client: FakeStorageClient) -> types.ModuleType:
+    """Module-shaped fake of `google.cloud.storage` whose Client() always returns `client`."""
+    module = types.ModuleType("google.cloud.storage")
+    module.Client = lambda project=None, **kwargs: client
+    module.Bucket = FakeBucket
+    module.Blob = FakeBlob
+    return module
+
+
+# ---------------------------------------------------------------- installation
+
+
+class FakeHandoffService:
+    """
+    Local HTTP stand-in for the live-agent hand-off endpoint (point HttpSink / RAG_ESCALATION_SINK_URL
+    at `url`). Accepts POSTed {"escalations": [...]} batches after the LatencyModel delay and answers
+    {"accepted": [ticket IDs]}; simulated errors answer 503. `fail_next` forces the next n requests
+    to fail, e.g. to exercise retries.
+    """
+
+    def __init__(self, latency: Optional[LatencyModel] = None, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency or LatencyModel()
+        self.received: List[Dict[str, Any]] = []
+        self.requests = 0
+        self.failures = 0
+        self.fail_next = 0
+        self._lock = threading.Lock()
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with service._lock:
+                    service.requests += 1
+                    forced = service.fail_next > 0
+                    service.fail_next -= 1 if forced else 0
+                try:
+                    if forced:
+                        raise RuntimeError("forced failure")
+                    service.latency.wait("handoff")
+                except RuntimeError:
+                    with service._lock:
+                        service.failures += 1
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                records = json.loads(body or b"{}").get("escalations", [])
+                with service._lock:
+                    service.received.extend(records)
+                payload = json.dumps({"accepted": [r["ticket_id"] for r in records]}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_address[1]}/escalations"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-handoff", daemon=True)
+
+    def start(self) -> "FakeHandoffService":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeHandoffService":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+class FakeBackends:
+    """
+    Bundle of the three fakes plus the wiring into the rag package.
+
+    install() must run before the rag tool modules are imported if the real SDKs are not
+    available; it then re-points the module-level SDK references of the tool modules at the
+    fakes, so the real SDKs are never called even when they are installed.
+    """
+
+    def __init__(
+        self,
+        rag_latency: Optional[Dict[str, Any]] = None,
+        llm_latency: Optional[Dict[str, Any]] = None,
+        storage_latency: Optional[Dict[str, Any]] = None,
+        corpus_count: int = 3,
+        files_per_corpus: int = 20,
+        chunks_per_file: int = 10,
+        seed: int = 0,
+    ):
+        self.rag = FakeRag(
+            corpus_count=corpus_count,
+            files_per_corpus=files_per_corpus,
+            chunks_per_file=chunks_per_file,
+            latency=LatencyModel.from_spec(rag_latency, seed=seed),
+        )
+        self.litellm = FakeLiteLLM(latency=LatencyModel.from_spec(llm_latency, seed=seed + 1))
+        self.storage_client = FakeStorageClient(latency=LatencyModel.from_spec(storage_latency, seed=seed + 2))
+        self.storage = make_storage_module(self.storage_client)
+
+    def _inject_missing_modules(self) -> None:
+        try:
+            import vertexai.preview.rag  # noqa: F401
+        except ImportError:
+            vertexai = types.ModuleType("vertexai")
+            vertexai.init = lambda **kwargs: None
+            preview = types.ModuleType("vertexai.preview")
+            preview.rag = self.rag
+            vertexai.preview = preview
+            sys.modules.update({"vertexai": vertexai, "vertexai.preview": preview, "vertexai.preview.rag": self.rag})
+        try:
+            import litellm  # noqa: F401
+        except ImportError:
+            sys.modules["litellm"] = self.litellm
+        try:
+            from google.cloud import storage  # noqa: F401
+        except ImportError:
+            sys.modules["google.cloud.storage"] = self.storage
+
+    def install(self) -> "FakeBackends":
+        self._inject_missing_modules()
+
+        from rag.tools.corpus import corpus_tools
+        from rag.tools.lifecycle import lifecycle_main
+        from rag.tools.storage import storage_tools
+        from rag.tools.preprocess import preprocess_tools
+
+        corpus_tools.rag = self.rag
+        lifecycle_main.litellm = self.litellm
+        lifecycle_main.storage_client = self.storage_client
+        storage_tools.storage = self.storage
+        preprocess_tools.storage = self.storage
+        self.corpus_tools = corpus_tools
+        self.lifecycle_main = lifecycle_main
+        self.storage_tools = storage_tools
+        return self
+
+    def corpus_ids(self) -> List[str]:
+        return list(self.rag.corpora)
+
+
+def write_synthetic_sheet(path: str, rows: int, seed: int = 0) -> str:
+    """Writes a regression sheet (`Query`, `Ground Truth`, `Category`) with `rows` rows."""
+    import openpyxl
+
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("testcases")
+    sheet.append(["Query", "Ground Truth", "Category"])
+    for i in range(rows):
+        topic = " ".join(rng.choice(_VOCABULARY) for _ in range(4))
+        sheet.append([
+            f"What does my policy say about {topic}? (case {i})",
+            synthetic_text(f"truth-{seed}-{i}", words=30),
+            rng.choice(["EMO", "POLICY", "VAS"]),
+        ])
+    workbook.save(path)
+    return path
@@ -0,0 +1,227 @@
+"""
+Offline benchmark suite for the RAG tools.
+
+Runs `query_corpus`, `parallel_check_relevant_corpus` and `automated_evaluation_testcase`
+against the in-process fakes in benchmarks/fakes.py and reports throughput and
+p50/p95/p99 latency as JSON, so results can be compared across commits.
+
+Usage:
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --sizes 100,1000 --rag-latency-ms 40 --compare bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Callable, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Offline runs: importing rag must not start the Vertex warm-up and token refresher threads
+os.environ.setdefault("RAG_VERTEX_WARM_UP", "0")
+
+from benchmarks.fakes import FakeBackends, write_synthetic_sheet  # noqa: E402
+
+
+def summarize(latencies: List[float], wall_seconds: float, errors: int = 0) -> Dict[str, Any]:
+    # Imported here: the rag package must not load before FakeBackends.install()
+    from rag.tools.instrumentation.instrumentation_tools import percentile
+
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "wall_seconds": round(wall_seconds, 4),
+        "throughput_per_sec": round(len(ordered) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+def run_concurrent(call: Callable[[int], Dict[str, Any]], iterations: int, concurrency: int) -> Dict[str, Any]:
+    """Runs `call(i)` for i in range(iterations) on `concurrency` threads and times each call."""
+
+    def timed(i: int):
+        started = time.perf_counter()
+        result = call(i)
+        return time.perf_counter() - started, isinstance(result, dict) and result.get("status") == "error"
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(timed, range(iterations)))
+    wall = time.perf_counter() - started
+    return summarize([o[0] for o in outcomes], wall, errors=sum(1 for o in outcomes if o[1]))
+
+
+def bench_query_corpus(backends: FakeBackends, iterations: int, concurrency: int) -> Dict[str, Any]:
+    corpus_tools = backends.corpus_tools
+    corpus_ids = backends.corpus_ids()
+    return run_concurrent(
+        lambda i: corpus_tools.query_corpus(corpus_id=corpus_ids[i % len(corpus_ids)], query=f"benchmark question {i}"),
+        iterations,
+        concurrency,
+    )
+
+
+def bench_parallel_check(backends: FakeBackends, iterations: int, concurrency: int) -> Dict[str, Any]:
+    corpus_tools = backends.corpus_tools
+    return run_concurrent(
+        lambda i: corpus_tools.parallel_check_relevant_corpus(query=f"benchmark question {i}"),
+        iterations,
+        concurrency,
+    )
+
+
+def bench_evaluation(backends: FakeBackends, rows: int, workdir: str, seed: int) -> Dict[str, Any]:
+    """
+    Runs a full regression sheet. Per-row latency is measured between consecutive
+    retrieve calls made by the evaluation loop (one per row).
+    """
+    lifecycle_main = backends.lifecycle_main
+    lifecycle_main.EVAL_ROW_DELAY_SECONDS = 0
+    sheet_path = write_synthetic_sheet(os.path.join(workdir, f"sheet_{rows}.xlsx"), rows, seed=seed)
+    corpus = next(iter(backends.rag.corpora.values()))
+
+    row_starts: List[float] = []
+    original_query = lifecycle_main.retrieve
+
+    def recording_query(*args, **kwargs):
+        row_starts.append(time.perf_counter())
+        return original_query(*args, **kwargs)
+
+    lifecycle_main.retrieve = recording_query
+    llm_calls_before = backends.litellm.calls
+    uploads_before = backends.storage_client.calls.get("blob.upload", 0)
+    try:
+        started = time.perf_counter()
+        result = lifecycle_main.automated_evaluation_testcase(
+            tool_context=None,
+            candidate_corpus=corpus.display_name,
+            excel_path=sheet_path,
+        )
+        finished = time.perf_counter()
+    finally:
+        lifecycle_main.retrieve = original_query
+
+    boundaries = row_starts + [finished]
+    row_latencies = [boundaries[i + 1] - boundaries[i] for i in range(len(row_starts))]
+    stats = summarize(row_latencies, finished - started, errors=0 if result.get("status") == "success" else 1)
+    stats.update({
+        "rows": rows,
+        "status": result.get("status"),
+        "llm_calls": backends.litellm.calls - llm_calls_before,
+        "checkpoint_uploads": backends.storage_client.calls.get("blob.upload", 0) - uploads_before,
+        "sheet_bytes": os.path.getsize(sheet_path),
+    })
+    return stats
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Lists the relative change of every latency/throughput figure present in both runs."""
+    changes = []
+    for name, stats in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_per_sec"):
+            if metric in stats and base.get(metric):
+                changes.append({
+                    "benchmark": name,
+                    "metric": metric,
+                    "baseline": base[metric],
+                    "current": stats[metric],
+                    "change_pct": round(100.0 * (stats[metric] - base[metric]) / base[metric], 1),
+                })
+    return changes
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline RAG tool benchmarks against fake backends")
+    parser.add_argument("--sizes", default="100,1000,10000", help="Comma-separated regression sheet sizes")
+    parser.add_argument("--iterations", type=int, default=200, help="Calls per retrieval benchmark")
+    parser.add_argument("--concurrency", default="1,8", help="Comma-separated thread counts for retrieval benchmarks")
+    parser.add_argument("--corpora", type=int, default=3)
+    parser.add_argument("--files-per-corpus", type=int, default=20)
+    parser.add_argument("--rag-latency-ms", type=float, default=20.0)
+    parser.add_argument("--rag-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--rag-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=5.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=5.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--storage-latency-ms", type=float, default=2.0)
+    parser.add_argument("--storage-jitter-ms", type=float, default=1.0)
+    parser.add_argument("--storage-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip", default="", help="Comma-separated benchmarks to skip (query,parallel,evaluation)")
+    parser.add_argument("--output", help="Write the JSON report to this path (default: stdout)")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    config = vars(args).copy()
+    backends = FakeBackends(
+        rag_latency={"base_ms": args.rag_latency_ms, "jitter_ms": args.rag_jitter_ms, "error_rate": args.rag_error_rate},
+        llm_latency={"base_ms": args.llm_latency_ms, "jitter_ms": args.llm_jitter_ms, "error_rate": args.llm_error_rate},
+        storage_latency={"base_ms": args.storage_latency_ms, "jitter_ms": args.storage_jitter_ms, "error_rate": args.storage_error_rate},
+        corpus_count=args.corpora,
+        files_per_corpus=args.files_per_corpus,
+        seed=args.seed,
+    ).install()
+
+    skip = {s.strip() for s in args.skip.split(",") if s.strip()}
+    results: Dict[str, Any] = {}
+    for concurrency in [int(c) for c in args.concurrency.split(",") if c]:
+        if "query" not in skip:
+            results[f"query_corpus@c{concurrency}"] = bench_query_corpus(backends, args.iterations, concurrency)
+        if "parallel" not in skip:
+            results[f"parallel_check_relevant_corpus@c{concurrency}"] = bench_parallel_check(
+                backends, max(1, args.iterations // 4), concurrency
+            )
+    if "evaluation" not in skip:
+        with tempfile.TemporaryDirectory() as workdir:
+            for rows in [int(s) for s in args.sizes.split(",") if s]:
+                results[f"automated_evaluation_testcase@{rows}"] = bench_evaluation(backends, rows, workdir, args.seed)
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": config,
+        },
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
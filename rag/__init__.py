@@ -1,16 +1,26 @@
 # Main package initialization
-from rag.agents import root_agent
 import logging
-import vertexai
-from rag.config import PROJECT_ID, LOCATION, RAG_DEFAULT_EMBEDDING_MODEL
+from rag.config import PROJECT_ID, LOCATION, RAG_DEFAULT_EMBEDDING_MODEL, VERTEX_WARM_UP_ON_START, EVAL_SHARD_WORKER
 logger = logging.getLogger(__name__)
 
 
-try:
-    if PROJECT_ID and LOCATION:
-        vertexai.init(project=PROJECT_ID, location=LOCATION)
-        logger.info(f"Initialized Vertex AI with project {PROJECT_ID}, location={LOCATION} with {RAG_DEFAULT_EMBEDDING_MODEL}")
-    else:
-        logger.warning("PROJECT_ID or LOCATION not set. Vertex AI initialization skipped.")
-except Exception as e:
-    logger.error(f"Failed to initialize Vertex AI: {e}")
+# Evaluation shard workers import this package only to reach the evaluation code
+# (rag/tools/lifecycle/shard_worker.py); they need no agent, warm-up or metrics exporter
+if not EVAL_SHARD_WORKER:
+    from rag.agents import root_agent
+    from rag.tools.executor.vertex_client import get_vertex_client
+
+    try:
+        if PROJECT_ID and LOCATION:
+            if VERTEX_WARM_UP_ON_START:
+                # Initialises vertexai and, in the background, fetches a token, opens the RAG channels and
+                # keeps the token fresh, so the first question after start-up does not pay for it
+                get_vertex_client().start()
+            else:
+                # No background threads (tests, offline benchmarks): the SDK refreshes the token on demand
+                get_vertex_client().initialize()
+            logger.info(f"Initialized Vertex AI with project {PROJECT_ID}, location={LOCATION} with {RAG_DEFAULT_EMBEDDING_MODEL}")
+        else:
+            logger.warning("PROJECT_ID or LOCATION not set. Vertex AI initialization skipped.")
+    except Exception as e:
+        logger.error(f"Failed to initialize Vertex AI: {e}")
@@ -5,22 +5,31 @@ from google.adk.models import Gemini
 from dotenv import load_dotenv
 from rag.config import AGENT_OUTPUT_KEY
 
-from rag.tools.corpus.corpus_tools import (
+# Async-native tools: blocking SDK calls run on a managed executor with per-call timeouts
+from rag.tools.corpus.async_corpus_tools import (
     create_corpus,
     update_corpus,
     list_corpora,
     get_corpus,
     delete_corpus,
     import_files,
+    get_ingestion_status,
+    get_import_job_status,
     list_files,
     get_file,
     delete_file_from_corpus,
+    bulk_delete_files,
     query_corpus,
 )
 from rag.tools.lifecycle.lifecycle_main import automated_evaluation_testcase
 from rag.tools.tone_management.tone_tools import tone_management
-from rag.tools.storage.storage_tools import create_gcs_bucket, list_blobs
+from rag.tools.storage.async_storage_tools import create_gcs_bucket, list_blobs
 from rag.tools.escalation.escalation_tools import escalate_to_live_agent
+from rag.tools.instrumentation.instrumentation_tools import (
+    instrument_tool,
+    install_downstream_instrumentation,
+    start_configured_exporters,
+)
 
 _rag_env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env")
 if os.path.exists(_rag_env_path):
@@ -45,27 +54,34 @@ def load_instructions(instruction_file_name):
     except Exception as e:
         return f"You are error reading instruction"
 
+# Per-tool latency / error / payload metrics (see rag/tools/instrumentation)
+install_downstream_instrumentation()
+start_configured_exporters()
+
 root_agent = Agent(
     name= "pru_rag_manager",
     model=model,
     description="managing rag data source lifecycle",
     instruction = load_instructions("instruction"),
-    tools = [
+    tools = [instrument_tool(tool) for tool in [
         create_corpus,
         update_corpus,
         list_corpora,
         get_corpus,
         delete_corpus,
         import_files,
+        get_ingestion_status,
+        get_import_job_status,
         list_files,
         get_file,
         delete_file_from_corpus,
+        bulk_delete_files,
         query_corpus,
         automated_evaluation_testcase,
         tone_management,
         create_gcs_bucket,
         list_blobs,
         escalate_to_live_agent,
-    ],
+    ]],
     output_key=AGENT_OUTPUT_KEY
 )
@@ -30,12 +30,135 @@ RAG_DEFAULT_SEARCH_TOP_K = 5
 RAG_DEFAULT_VECTOR_DISTANCE_THRESHOLD = 0.5
 RAG_DEFAULT_CHUNK_SIZE = 512
 RAG_DEFAULT_CHUNK_OVERLAP = 100
-RAG_DEFAULT_EMBEDDING_REQUESTS_PER_MIN = 1000
+RAG_PROJECT_EMBEDDING_REQUESTS_PER_MIN = 1000  # Embedding quota shared by all concurrent import_files jobs
+RAG_MAX_CORPORA_PER_RETRIEVAL = 1  # Vertex RAG retrieval_query currently accepts a single corpus per call
+RAG_FEDERATED_QUERY_MAX_WORKERS = 8
+RAG_BULK_DELETE_MAX_WORKERS = 8  # Concurrent delete_file calls in bulk_delete_files
+LIST_DEFAULT_PAGE_SIZE = 20  # list_corpora / list_files page size (0 = everything)
+LIST_CORPORA_DEFAULT_FIELDS = ["id", "display_name", "status"]
+LIST_FILES_DEFAULT_FIELDS = ["id", "display_name"]
+
+# Ingestion Scheduler Settings (shares the project embedding quota between concurrent imports)
+INGESTION_MAX_CONCURRENT_JOBS = 4  # Further import jobs wait in the queue
+INGESTION_BATCH_SIZE = 25  # GCS URIs per rag.import_files call; job rates are re-balanced between batches
+INGESTION_MIN_REQUESTS_PER_MIN = 50
+INGESTION_PRIORITY_WEIGHTS = {"hotfix": 4, "normal": 2, "backfill": 1}  # Admission order and quota weight
+INGESTION_JOB_HISTORY = 50  # Finished jobs kept for get_ingestion_status
+IMPORT_JOB_RETENTION_DAYS = 14  # Background import_files job records kept under LOCAL_STATE_DIR/import_jobs
+
+# Local Pre-chunking Settings (optional near-duplicate chunk elimination before import_files)
+PRECHUNK_MAX_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # Processes for text extraction, chunking and MinHash
+PRECHUNK_DOWNLOAD_WORKERS = 8
+PRECHUNK_START_METHOD = "spawn"
+PRECHUNK_MIN_BYTES_PER_WORKER = 2 * 1024 * 1024  # Smaller batches are chunked in-process (worker start-up costs seconds)
+PRECHUNK_TOKENIZER = "cl100k_base"  # Local approximation of the embedding model's tokenizer
+PRECHUNK_SHINGLE_WORDS = 5
+PRECHUNK_MINHASH_PERMUTATIONS = 128
+PRECHUNK_LSH_BANDS = 32  # 32 bands x 4 rows: candidates from ~0.45 Jaccard, verified against the threshold below
+PRECHUNK_DUPLICATE_THRESHOLD = 0.8  # Estimated Jaccard similarity at which a chunk counts as a duplicate
+PRECHUNK_STAGING_PREFIX = "prechunked"  # gs://STAGING_BUCKET_NAME/<prefix>/<corpus_id>/<run>/<source bucket>/<source path>.txt
+
+# Answer Context Settings (token budget for retrieved context per generator model)
+CONTEXT_DEFAULT_TOKEN_BUDGET = 3000
+CONTEXT_TOKEN_BUDGETS = {
+    "azure/gpt-4o": 6000,
+    "azure/gpt-4o-mini": 4000,
+    "gemini-1.5-pro-001": 8000,
+}
+CONTEXT_MIN_TRUNCATED_TOKENS = 40
+SNIPPET_MAX_SENTENCES = 3  # query_corpus(snippets=True): best window of up to this many sentences per chunk
+SNIPPET_SENTENCE_MAX_CHARS = 300  # Longer "sentences" (tables, lists without punctuation) are split first
+
+# Corpus Routing Index (local pre-selection of candidate corpora before retrieval)
+ROUTING_EMBEDDING_DIM = 1024
+ROUTING_KEYWORDS_PER_CORPUS = 200
+ROUTING_KEYWORD_WEIGHT = 0.3  # Blend of keyword-signature overlap vs centroid cosine similarity
+# Routing is off by default (0 = query every corpus). Set ROUTING_DEFAULT_TOP_N to N only after
+# evaluate_routing_accuracy shows acceptable recall@N on representative questions.
+ROUTING_DEFAULT_TOP_N = 0
+ROUTING_EVALUATION_TOP_N = 2  # Candidate count evaluate_routing_accuracy measures by default
+ROUTING_SAMPLE_FILES = 20  # Files sampled per import to update the corpus signature
+ROUTING_SAMPLE_CHUNKS_PER_FILE = 5
+
+# Escalation Outbox Settings (durable, non-blocking live-agent hand-off)
+ESCALATION_SINK_URL = os.environ.get("RAG_ESCALATION_SINK_URL", "")  # Hand-off endpoint (JSON POST); records are only logged if empty
+ESCALATION_SINK_TIMEOUT_SECONDS = 10
+ESCALATION_BATCH_SIZE = 20  # Records per delivery call
+ESCALATION_MAX_ATTEMPTS = 8  # Then the record is marked "dead" and logged as an error
+ESCALATION_RETRY_BASE_SECONDS = 2  # Exponential backoff with jitter between delivery attempts
+ESCALATION_RETRY_MAX_SECONDS = 300
+ESCALATION_RETENTION_DAYS = 14  # Delivered / dead records kept in LOCAL_STATE_DIR/escalation_outbox.sqlite3
 
 # Corpus Names
 STAGING_CORPUS_DISPLAY_NAME = "pru-rag-staging-corpus"
 PROD_CORPUS_DISPLAY_NAME = "pru-rag-prod-corpus"
 
+# Evaluation Settings
+EVAL_ROW_DELAY_SECONDS = 2  # Pause between test rows to stay under LLM / Vertex AI quotas
+EVAL_MAX_SHARDS = 8  # Upper bound on worker processes for sharded evaluation runs
+EVAL_SHARD_START_METHOD = "spawn"  # gRPC clients are not fork-safe
+# Set in the environment of spawned shard workers: importing the `rag` package there skips the
+# agent, the Vertex AI warm-up threads and the metrics exporters
+EVAL_SHARD_WORKER_ENV = "RAG_EVAL_SHARD_WORKER"
+EVAL_SHARD_WORKER = os.environ.get(EVAL_SHARD_WORKER_ENV, "") == "1"
+EVAL_INCREMENTAL_SAMPLE_RATE = 0.05  # Share of unaffected rows re-evaluated anyway by incremental runs
+SWEEP_CHUNK_SIZES = [256, 512, 1024]  # Chunking sweep grid (tokens); see tools/lifecycle/chunk_sweep.py
+SWEEP_CHUNK_OVERLAPS = [0, 50, 100]
+
+# Async Tool Settings (managed executor for SDK calls without a native async client)
+ASYNC_TOOL_MAX_WORKERS = 32
+ASYNC_TOOL_DEFAULT_TIMEOUT_SECONDS = 60
+ASYNC_TOOL_TIMEOUTS = {
+    "query_corpus": 30,
+    "parallel_check_relevant_corpus": 45,
+    "import_files": 1800,
+    "delete_corpus": 300,
+    "bulk_delete_files": 900,
+}
+# Tools that change state: on timeout the call keeps running in the background, so they report
+# status "pending" (may still complete) instead of an error the agent would retry
+ASYNC_TOOL_MUTATING = (
+    "create_corpus",
+    "update_corpus",
+    "delete_corpus",
+    "import_files",
+    "delete_file_from_corpus",
+    "bulk_delete_files",
+    "create_gcs_bucket",
+)
+
+# Vertex AI Client Settings (connection warm-up and proactive token refresh at agent start)
+VERTEX_WARM_UP_ON_START = os.environ.get("RAG_VERTEX_WARM_UP", "1") == "1"
+VERTEX_TOKEN_REFRESH_MARGIN_SECONDS = 600  # Renew this long before expiry (google-auth itself refreshes inside a request at 225 s)
+VERTEX_TOKEN_RETRY_SECONDS = 30  # Retry interval after a failed background refresh
+
+# Retrieval Resilience Settings (hedged requests + per-corpus circuit breakers around retrieval_query)
+RETRIEVAL_TIMEOUT_SECONDS = 20  # Give up on a retrieval (including its hedge) after this long
+RETRIEVAL_MAX_WORKERS = 32  # Threads for retrieval attempts; bounds the number of hung calls
+RETRIEVAL_HEDGE_ENABLED = True
+RETRIEVAL_HEDGE_PERCENTILE = 95  # Send a duplicate request once the first exceeds this latency percentile
+RETRIEVAL_HEDGE_MIN_SAMPLES = 20  # Latency samples needed before the percentile is trusted
+RETRIEVAL_HEDGE_DEFAULT_DELAY_SECONDS = 2.0  # Hedge delay until enough samples are collected
+RETRIEVAL_HEDGE_MIN_DELAY_SECONDS = 0.05
+RETRIEVAL_MAX_SPARE_IN_FLIGHT = 8  # Hedges plus abandoned (timed-out / losing) attempts still running; no new hedge beyond this
+RETRIEVAL_LATENCY_WINDOW = 500  # Recent successful retrieval latencies kept for the percentile
+BREAKER_WINDOW = 20  # Recent outcomes per corpus considered by the circuit breaker
+BREAKER_MIN_CALLS = 5
+BREAKER_ERROR_RATE = 0.5  # Open the breaker once this share of recent calls failed...
+BREAKER_CONSECUTIVE_FAILURES = 5  # ...or after this many failures in a row
+BREAKER_OPEN_SECONDS = 30  # Fail fast for this long, then let one probe request through
+RETRIEVAL_DEGRADED_CACHE_SIZE = 1024  # Last good answers served while a breaker is open
+
+# Instrumentation Settings
+METRICS_EXPORT_DIR = os.environ.get("RAG_METRICS_EXPORT_DIR", "")  # Local file exporter, disabled if empty
+METRICS_EXPORT_INTERVAL_SECONDS = 30
+METRICS_HTTP_PORT = int(os.environ.get("RAG_METRICS_HTTP_PORT", "0"))  # Prometheus /metrics endpoint, disabled if 0
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+METRICS_PAYLOAD_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# Local State (routing index, job records, caches)
+LOCAL_STATE_DIR = os.environ.get("RAG_STATE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".rag_state"))
+
 # Logging Settings
 LOG_LEVEL = "INFO" 
 LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
@@ -0,0 +1,8 @@
+from .context_tools import (
+    assemble_context,
+    build_context,
+    count_tokens,
+    extract_snippets,
+    get_token_budget,
+    truncate_to_tokens,
+)
@@ -0,0 +1,520 @@
+# ====================== CONTEXT TOOLS =====================
+
+import re
+import os
+import sys
+import logging
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+# Ensure parent directory is in path to allow imports if running as script or module
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+try:
+    from config import (
+        CONTEXT_DEFAULT_TOKEN_BUDGET,
+        CONTEXT_TOKEN_BUDGETS,
+        CONTEXT_MIN_TRUNCATED_TOKENS,
+        SNIPPET_MAX_SENTENCES,
+        SNIPPET_SENTENCE_MAX_CHARS,
+    )
+except ImportError:
+    try:
+        from rag.config import (
+            CONTEXT_DEFAULT_TOKEN_BUDGET,
+            CONTEXT_TOKEN_BUDGETS,
+            CONTEXT_MIN_TRUNCATED_TOKENS,
+            SNIPPET_MAX_SENTENCES,
+            SNIPPET_SENTENCE_MAX_CHARS,
+        )
+    except ImportError:
+        from ...config import (
+            CONTEXT_DEFAULT_TOKEN_BUDGET,
+            CONTEXT_TOKEN_BUDGETS,
+            CONTEXT_MIN_TRUNCATED_TOKENS,
+            SNIPPET_MAX_SENTENCES,
+            SNIPPET_SENTENCE_MAX_CHARS,
+        )
+
+# tiktoken ships with litellm; fall back to an approximation if it is missing
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Chunks are imported with an overlap (RAG_DEFAULT_CHUNK_OVERLAP tokens), so two
+# neighbouring chunks of the same file share a few hundred characters. Anything
+# shorter than this is treated as a coincidence rather than a real overlap.
+MIN_OVERLAP_CHARS = 40
+# Share of a chunk's word shingles already present in a selected span above which
+# the chunk is considered a near-duplicate (repeated boilerplate, re-imported files)
+NEAR_DUPLICATE_THRESHOLD = 0.85
+SHINGLE_SIZE = 5
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?;:])\s+")
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Sentence boundaries for snippets: end punctuation followed by whitespace, or a line break
+_SNIPPET_BREAK_RE = re.compile(r"(?<=[.!?;:])\s+|\s*\n\s*")
+_STOPWORDS = frozenset(
+    "a an and are as at be been by can do does for from has have how i if in into is it its me my "
+    "of on or our so than that the their there these this to was we what when where which who why "
+    "will with would you your".split()
+)
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: Optional[str]):
+    if tiktoken is None:
+        return None
+    name = (model or "").split("/")[-1]
+    try:
+        return tiktoken.encoding_for_model(name)
+    except Exception:
+        pass
+    try:
+        return tiktoken.get_encoding("o200k_base" if name.startswith("gpt-4o") else "cl100k_base")
+    except Exception:
+        return None
+
+
+def _approximate_tokens(text: str) -> int:
+    # Words longer than 4 characters are counted as several sub-word tokens
+    total = 0
+    for piece in _TOKEN_RE.findall(text):
+        total += 1 + (len(piece) - 1) // 4
+    return total
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Counts the LLM tokens in a text with a local tokenizer.
+    Uses the tiktoken encoding for `model` when available and an approximation otherwise.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return _approximate_tokens(text)
+
+
+def get_token_budget(model: Optional[str] = None) -> int:
+    """
+    Returns the context token budget configured for a generator model.
+    """
+    if model is None:
+        model = os.getenv("AZURE", "azure/gpt-4o")
+    if model in CONTEXT_TOKEN_BUDGETS:
+        return CONTEXT_TOKEN_BUDGETS[model]
+    short_name = model.split("/")[-1]
+    for name, budget in CONTEXT_TOKEN_BUDGETS.items():
+        if name.split("/")[-1] == short_name:
+            return budget
+    return CONTEXT_DEFAULT_TOKEN_BUDGET
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+def _shingles(text: str) -> set:
+    words = text.lower().split()
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _containment(a: set, b: set) -> float:
+    """Fraction of shingles of `a` that also occur in `b`."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a)
+
+
+def _suffix_prefix_overlap(left: str, right: str) -> int:
+    """
+    Returns the length of the longest suffix of `left` that is also a prefix of `right`
+    (0 if shorter than MIN_OVERLAP_CHARS).
+    """
+    if len(left) < MIN_OVERLAP_CHARS or len(right) < MIN_OVERLAP_CHARS:
+        return 0
+    probe = right[:MIN_OVERLAP_CHARS]
+    start = max(0, len(left) - len(right))
+    pos = left.find(probe, start)
+    while pos != -1:
+        tail = left[pos:]
+        if right.startswith(tail):
+            return len(tail)
+        pos = left.find(probe, pos + 1)
+    return 0
+
+
+def _merge_into_span(span: Dict[str, Any], text: str) -> bool:
+    """
+    Tries to fold a chunk into an existing span of the same source.
+    Handles containment and overlaps on either side. Returns True if merged.
+    """
+    current = span["text"]
+    if text in current:
+        return True
+    if current in text:
+        span["text"] = text
+        return True
+
+    overlap = _suffix_prefix_overlap(current, text)
+    if overlap:
+        span["text"] = current + text[overlap:]
+        return True
+
+    overlap = _suffix_prefix_overlap(text, current)
+    if overlap:
+        span["text"] = text + current[overlap:]
+        return True
+    return False
+
+
+def assemble_context(
+    results: List[Dict[str, Any]],
+    separator: str = "\n\n",
+    near_duplicate_threshold: float = NEAR_DUPLICATE_THRESHOLD,
+    model: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Builds the LLM context from retrieval results.
+
+    Chunks from the same `source_uri` that overlap or contain each other are merged into
+    contiguous spans, and chunks that are near-duplicates of an already selected span are
+    dropped. Spans keep the rank of their best chunk.
+
+    Args:
+        results: Retrieval results as returned by query_corpus (`text`, `source_uri`, `distance`)
+        separator: String placed between spans in the final context
+        near_duplicate_threshold: Shingle containment at which a chunk is dropped
+        model: Model whose tokenizer is used for the token statistics
+
+    Returns:
+        A dictionary with the assembled `context`, the `spans` used and token statistics.
+        `tokens_before` counts the chunks joined in retrieval order, with the same tokenizer and
+        separator as `tokens_after`, so `tokens_saved` is only what merging and dropping removed.
+    """
+    spans: List[Dict[str, Any]] = []
+    texts: List[str] = []
+    merged_count = 0
+    dropped_count = 0
+
+    for r in results:
+        text = _normalize(r.get("text", ""))
+        if not text:
+            continue
+        texts.append(text)
+        source_uri = r.get("source_uri") or ""
+
+        merged = False
+        for span in spans:
+            if span["source_uri"] == source_uri and _merge_into_span(span, text):
+                span["chunk_count"] += 1
+                span["shingles"] = _shingles(span["text"])
+                merged = True
+                break
+        if merged:
+            merged_count += 1
+            continue
+
+        shingles = _shingles(text)
+        if any(_containment(shingles, span["shingles"]) >= near_duplicate_threshold for span in spans):
+            dropped_count += 1
+            continue
+
+        spans.append({
+            "text": text,
+            "source_uri": source_uri,
+            "distance": r.get("distance"),
+            "score": r.get("score"),
+            "corpus_id": r.get("corpus_id"),
+            "chunk_count": 1,
+            "shingles": shingles,
+        })
+
+    # A merged span can now bridge two spans that were disjoint before
+    i = 0
+    while i < len(spans):
+        j = i + 1
+        while j < len(spans):
+            if spans[j]["source_uri"] == spans[i]["source_uri"] and _merge_into_span(spans[i], spans[j]["text"]):
+                spans[i]["chunk_count"] += spans[j]["chunk_count"]
+                spans[i]["shingles"] = _shingles(spans[i]["text"])
+                del spans[j]
+            else:
+                j += 1
+        i += 1
+
+    for span in spans:
+        del span["shingles"]
+
+    context = separator.join(span["text"] for span in spans)
+    tokens_before = count_tokens(separator.join(texts), model)
+    tokens_after = count_tokens(context, model)
+
+    return {
+        "context": context,
+        "spans": spans,
+        "input_chunks": len([r for r in results if r.get("text")]),
+        "merged_chunks": merged_count,
+        "dropped_duplicates": dropped_count,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": max(0, tokens_before - tokens_after),
+    }
+
+
+def _cut_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    # Hard cut after the first max_tokens tokens, for text without a usable sentence boundary
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        keep = max_tokens
+        while keep > 0:
+            # A cut inside a multi-byte character decodes to U+FFFD; drop it
+            cut = encoding.decode(tokens[:keep]).rstrip("\ufffd").rstrip()
+            if count_tokens(cut, model) <= max_tokens:
+                return cut
+            keep -= 1
+        return ""
+    end = 0
+    used = 0
+    for match in _TOKEN_RE.finditer(text):
+        cost = 1 + (len(match.group()) - 1) // 4
+        if used + cost > max_tokens:
+            break
+        used += cost
+        end = match.end()
+    return text[:end]
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """
+    Truncates a text to at most `max_tokens`, cutting at a sentence boundary.
+    If not even the first sentence fits (e.g. a table or list chunk without sentence
+    punctuation), the text is cut after `max_tokens` tokens instead.
+    """
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    kept = []
+    used = 0
+    for sentence in _SENTENCE_END_RE.split(text):
+        # +1 for the whitespace joining sentences back together
+        cost = count_tokens(sentence, model) + (1 if kept else 0)
+        if used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+    if not kept:
+        return _cut_to_tokens(text, max_tokens, model)
+    return " ".join(kept)
+
+
+def build_context(
+    results: List[Dict[str, Any]],
+    model: Optional[str] = None,
+    token_budget: Optional[int] = None,
+    separator: str = "\n\n"
+) -> Dict[str, Any]:
+    """
+    Builds a token-budgeted LLM context from retrieval results.
+
+    Overlapping chunks are first merged with assemble_context(). Spans are then picked greedily
+    by relevance per token (similarity 1 - vector distance) until the budget is spent; a span
+    that does not fit is truncated, at a sentence boundary where possible, if enough budget
+    remains. Selected spans are emitted in their original rank order.
+
+    Args:
+        results: Retrieval results as returned by query_corpus (`text`, `source_uri`, `distance`)
+        model: Generator model name, used for the tokenizer and the default budget
+        token_budget: Maximum context tokens (default: configured budget for `model`)
+        separator: String placed between spans in the final context
+
+    Returns:
+        A dictionary with the `context`, the selected `spans` and token statistics.
+    """
+    if token_budget is None:
+        token_budget = get_token_budget(model)
+
+    assembled = assemble_context(results, separator=separator, model=model)
+    spans = assembled["spans"]
+    separator_tokens = count_tokens(separator, model)
+
+    candidates = []
+    for rank, span in enumerate(spans):
+        tokens = count_tokens(span["text"], model)
+        distance = span.get("distance")
+        # The same fixed scale as the federated `score`, so spans of different corpora compare directly
+        relevance = max(0.0, 1.0 - distance) if isinstance(distance, (int, float)) else 0.5
+        # Small floor so that zero-relevance spans are still ordered by size
+        candidates.append((rank, tokens, (relevance + 1e-3) / max(tokens, 1)))
+
+    selected = {}
+    remaining = token_budget
+    truncated_count = 0
+    for rank, tokens, _ in sorted(candidates, key=lambda c: c[2], reverse=True):
+        cost = tokens + (separator_tokens if selected else 0)
+        if cost <= remaining:
+            selected[rank] = spans[rank]["text"]
+            remaining -= cost
+            continue
+        available = remaining - (separator_tokens if selected else 0)
+        if available >= CONTEXT_MIN_TRUNCATED_TOKENS:
+            truncated = truncate_to_tokens(spans[rank]["text"], available, model)
+            if truncated:
+                selected[rank] = truncated
+                remaining -= count_tokens(truncated, model) + (separator_tokens if len(selected) > 1 else 0)
+                truncated_count += 1
+
+    chosen = []
+    for rank in sorted(selected):
+        span = dict(spans[rank])
+        span["text"] = selected[rank]
+        chosen.append(span)
+
+    context = separator.join(span["text"] for span in chosen)
+    context_tokens = count_tokens(context, model)
+
+    return {
+        "context": context,
+        "spans": chosen,
+        "token_budget": token_budget,
+        "context_tokens": context_tokens,
+        "input_chunks": assembled["input_chunks"],
+        "merged_chunks": assembled["merged_chunks"],
+        "dropped_duplicates": assembled["dropped_duplicates"],
+        "dropped_over_budget": len(spans) - len(chosen),
+        "truncated_spans": truncated_count,
+        "tokens_before": assembled["tokens_before"],
+        "tokens_after": context_tokens,
+        "tokens_saved": max(0, assembled["tokens_before"] - context_tokens),
+    }
+
+
+def _stem(word: str) -> str:
+    # Light suffix stripping so that "claims" / "claimed" / "claiming" match "claim"
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def _terms(text: str) -> List[str]:
+    return [_stem(w) for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def _sentence_spans(text: str, max_chars: int) -> List[Tuple[int, int]]:
+    """Character (start, end) of each sentence; very long sentences are split at whitespace."""
+    spans = []
+    start = 0
+    for match in list(_SNIPPET_BREAK_RE.finditer(text)) + [None]:
+        end = match.start() if match else len(text)
+        while end - start > max_chars:
+            cut = text.rfind(" ", start, start + max_chars)
+            cut = cut if cut > start else start + max_chars
+            spans.append((start, cut))
+            start = cut + 1 if text[cut:cut + 1] == " " else cut
+        if end > start:
+            spans.append((start, end))
+        if match:
+            start = match.end()
+    return spans
+
+
+def extract_snippets(
+    results: List[Dict[str, Any]],
+    query: str,
+    max_sentences: int = SNIPPET_MAX_SENTENCES,
+    max_sentence_chars: int = SNIPPET_SENTENCE_MAX_CHARS
+) -> List[Dict[str, Any]]:
+    """
+    Replaces each hit's text by the window of up to `max_sentences` consecutive sentences that
+    best matches the query lexically.
+
+    All sentences of all hits go into one boolean sentence x query-term matrix. A window scores
+    the IDF-weighted number of distinct query terms it covers (plus a small bonus for
+    repetitions), computed for every window position at once from cumulative sums. Ties go to the
+    shorter window. Hits without any query term keep their leading sentences.
+
+    Args:
+        results: Retrieval results (`text`, `source_uri`, ...), e.g. from query_corpus
+        query: The user question
+        max_sentences: Maximum sentences per snippet
+        max_sentence_chars: Sentences longer than this are split at whitespace first
+
+    Returns:
+        The hits in the same order with `text` set to the snippet, plus `snippet_start` /
+        `snippet_end` (character offsets into the full chunk text), `chunk_chars` and
+        `snippet_score`. Snippets repeating an earlier snippet of the same source are dropped.
+    """
+    vocabulary = {term: i for i, term in enumerate(dict.fromkeys(_terms(query)))}
+    chunk_spans = [_sentence_spans(r.get("text") or "", max_sentence_chars) for r in results]
+    n_sentences = sum(len(spans) for spans in chunk_spans)
+
+    rows, cols = [], []
+    sentence = 0
+    for r, spans in zip(results, chunk_spans):
+        text = r.get("text") or ""
+        for start, end in spans:
+            for term in set(_terms(text[start:end])):
+                index = vocabulary.get(term)
+                if index is not None:
+                    rows.append(sentence)
+                    cols.append(index)
+            sentence += 1
+    present = np.zeros((n_sentences, max(1, len(vocabulary))), dtype=np.int32)
+    present[rows, cols] = 1
+    # Rare query terms (e.g. a product name) count for more than ones found everywhere
+    document_frequency = present.sum(axis=0)
+    idf = np.log1p(n_sentences / (1.0 + document_frequency)) if n_sentences else np.zeros(present.shape[1])
+
+    snippets = []
+    seen = set()
+    offset = 0
+    for r, spans in zip(results, chunk_spans):
+        text = r.get("text") or ""
+        n = len(spans)
+        block = present[offset:offset + n]
+        offset += n
+        if n == 0:
+            continue
+        cumulative = np.vstack([np.zeros((1, block.shape[1]), dtype=np.int32), np.cumsum(block, axis=0)])
+        best = (-1.0, 0, 1)  # (score, first sentence, window length)
+        for width in range(1, min(max_sentences, n) + 1):
+            counts = cumulative[width:] - cumulative[:-width]
+            scores = (counts > 0) @ idf + 0.1 * (counts @ idf) / width
+            position = int(np.argmax(scores))
+            if scores[position] > best[0] + 1e-9:
+                best = (float(scores[position]), position, width)
+        score, first, width = best
+        if score <= 0:
+            first, width = 0, min(max_sentences, n)
+        start, end = spans[first][0], spans[first + width - 1][1]
+        key = (r.get("source_uri"), text[start:end])
+        if key in seen:
+            continue
+        seen.add(key)
+        snippet = dict(r)
+        snippet.update({
+            "text": text[start:end],
+            "snippet_start": start,
+            "snippet_end": end,
+            "chunk_chars": len(text),
+            "snippet_score": round(max(score, 0.0), 3),
+        })
+        snippets.append(snippet)
+    return snippets
+
@@ -5,10 +5,19 @@ from .corpus_tools import (
     get_corpus,
     delete_corpus,
     import_files,
+    get_ingestion_status,
+    get_import_job_status,
     list_files,
     get_file,
     delete_file_from_corpus,
+    bulk_delete_files,
     query_corpus,
+    retrieve,
     get_corpus_id_by_display_name,
-    get_file_id_by_name
+    get_file_id_by_name,
+    parallel_check_relevant_corpus,
+    build_routing_index,
+    update_routing_index,
+    evaluate_routing_accuracy,
 )
+from .retrieval_results import RetrievalHits
@@ -0,0 +1,278 @@
+# ====================== ASYNC CORPUS TOOLS =====================
+#
+# Async-native versions of the corpus tools, registered with root_agent so that a slow
+# Vertex AI call only suspends its own conversation instead of blocking the event loop.
+# The vertexai.preview.rag helpers have no async client, so each call runs on the managed
+# executor with a configured per-tool timeout (see rag/tools/executor).
+
+from typing import Dict, Optional, Any, List
+
+try:
+    from tools.corpus import corpus_tools
+    from tools.executor.managed_executor import run_blocking, run_tool, get_timeout
+except ImportError:
+    try:
+        from rag.tools.corpus import corpus_tools
+        from rag.tools.executor.managed_executor import run_blocking, run_tool, get_timeout
+    except ImportError:
+        from . import corpus_tools
+        from ...tools.executor.managed_executor import run_blocking, run_tool, get_timeout
+
+RAG_DEFAULT_TOP_K = corpus_tools.RAG_DEFAULT_TOP_K
+RAG_DEFAULT_SEARCH_TOP_K = corpus_tools.RAG_DEFAULT_SEARCH_TOP_K
+RAG_DEFAULT_VECTOR_DISTANCE_THRESHOLD = corpus_tools.RAG_DEFAULT_VECTOR_DISTANCE_THRESHOLD
+ROUTING_DEFAULT_TOP_N = corpus_tools.ROUTING_DEFAULT_TOP_N
+LIST_DEFAULT_PAGE_SIZE = corpus_tools.LIST_DEFAULT_PAGE_SIZE
+
+
+async def create_corpus(
+    display_name: str,
+    description: Optional[str] = None,
+    embedding_model: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Creates a new RAG corpus in Vertex AI.
+
+    Args:
+        display_name: A human-readable name for the corpus
+        description: Optional description for the corpus
+        embedding_model: The embedding model to use (default: configured RAG_DEFAULT_EMBEDDING_MODEL)
+
+    Returns:
+        A dictionary containing the created corpus details.
+    """
+    return await run_tool(
+        "create_corpus", corpus_tools.create_corpus,
+        display_name=display_name, description=description, embedding_model=embedding_model,
+    )
+
+
+async def update_corpus(
+    corpus_id: str,
+    display_name: Optional[str] = None,
+    description: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Updates an existing RAG corpus with new display name and/or description.
+    """
+    return await run_tool(
+        "update_corpus", corpus_tools.update_corpus,
+        corpus_id=corpus_id, display_name=display_name, description=description,
+    )
+
+
+async def list_corpora(
+    page_size: int = LIST_DEFAULT_PAGE_SIZE,
+    page_token: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    display_name_prefix: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Lists RAG corpora in the current project and location, one page at a time.
+
+    Args:
+        page_size: Corpora per page (0 returns all matches)
+        page_token: next_page_token from the previous page (same filters required)
+        fields: Fields to return per corpus, from id, name, display_name, description,
+            create_time, status (default: id, display_name, status; ["*"] for all)
+        display_name_prefix: Only corpora whose display name starts with this (case-insensitive)
+        created_after: Only corpora created at or after this ISO 8601 date/time
+        created_before: Only corpora created before this ISO 8601 date/time
+    """
+    return await run_tool(
+        "list_corpora", corpus_tools.list_corpora,
+        page_size=page_size, page_token=page_token, fields=fields, display_name_prefix=display_name_prefix,
+        created_after=created_after, created_before=created_before,
+    )
+
+
+async def get_corpus(corpus_id: str) -> Dict[str, Any]:
+    """
+    Retrieves details of a specific RAG corpus.
+    """
+    return await run_tool("get_corpus", corpus_tools.get_corpus, corpus_id=corpus_id)
+
+
+async def delete_corpus(corpus_id: str) -> Dict[str, Any]:
+    """
+    Deletes a RAG corpus.
+    """
+    return await run_tool("delete_corpus", corpus_tools.delete_corpus, corpus_id=corpus_id)
+
+
+async def import_files(
+    corpus_id: str,
+    gcs_uris: List[str],
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+    max_embedding_requests_per_min: Optional[int] = None,
+    dedupe_chunks: bool = False,
+    priority: str = "normal",
+    wait: bool = True
+) -> Dict[str, Any]:
+    """
+    Imports files from Google Cloud Storage into a RAG corpus. With wait=False the import runs
+    in the background and a job_id is returned at once (see get_import_job_status).
+    """
+    return await run_tool(
+        "import_files", corpus_tools.import_files,
+        corpus_id=corpus_id, gcs_uris=gcs_uris, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+        max_embedding_requests_per_min=max_embedding_requests_per_min, dedupe_chunks=dedupe_chunks,
+        priority=priority, wait=wait,
+    )
+
+
+async def get_import_job_status(job_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Reports the state, progress and result of a background import job (import_files with
+    wait=False). Without job_id, lists the most recent jobs.
+    """
+    return await run_tool(
+        "get_import_job_status", corpus_tools.get_import_job_status,
+        job_id=job_id,
+    )
+
+
+async def get_ingestion_status() -> Dict[str, Any]:
+    """
+    Reports the import queue depth and the effective embedding rate of each import job.
+    """
+    return await run_tool("get_ingestion_status", corpus_tools.get_ingestion_status)
+
+
+async def list_files(
+    corpus_id: str,
+    page_size: int = LIST_DEFAULT_PAGE_SIZE,
+    page_token: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    display_name_prefix: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Lists files in a RAG corpus, one page at a time.
+
+    Args:
+        corpus_id: The ID of the corpus
+        page_size: Files per page (0 returns all matches)
+        page_token: next_page_token from the previous page (same filters required)
+        fields: Fields to return per file, from id, name, display_name, description,
+            create_time (default: id, display_name; ["*"] for all)
+        display_name_prefix: Only files whose display name starts with this (case-insensitive)
+        created_after: Only files imported at or after this ISO 8601 date/time
+        created_before: Only files imported before this ISO 8601 date/time
+    """
+    return await run_tool(
+        "list_files", corpus_tools.list_files,
+        corpus_id=corpus_id, page_size=page_size, page_token=page_token, fields=fields,
+        display_name_prefix=display_name_prefix, created_after=created_after, created_before=created_before,
+    )
+
+
+async def get_file(corpus_id: str, file_id: str) -> Dict[str, Any]:
+    """
+    Retrieves details of a specific file in a RAG corpus.
+    """
+    return await run_tool(
+        "get_file", corpus_tools.get_file,
+        corpus_id=corpus_id, file_id=file_id,
+    )
+
+
+async def delete_file_from_corpus(corpus_id: str, file_id: str) -> Dict[str, Any]:
+    """
+    Deletes a file from a RAG corpus.
+    """
+    return await run_tool(
+        "delete_file_from_corpus", corpus_tools.delete_file_from_corpus,
+        corpus_id=corpus_id, file_id=file_id,
+    )
+
+
+async def bulk_delete_files(
+    corpus_id: str,
+    file_ids: Optional[List[str]] = None,
+    display_name_patterns: Optional[List[str]] = None,
+    gcs_prefix: Optional[str] = None,
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    Deletes many files from a RAG corpus in one call.
+
+    Args:
+        corpus_id: The ID of the corpus
+        file_ids: Optional list of RAG file IDs
+        display_name_patterns: Optional glob patterns matched against file display names (e.g. "product_x_*")
+        gcs_prefix: Optional gs://bucket/prefix; files imported from objects under it are deleted
+        dry_run: If True, only report which files would be deleted
+    """
+    return await run_tool(
+        "bulk_delete_files", corpus_tools.bulk_delete_files,
+        corpus_id=corpus_id, file_ids=file_ids, display_name_patterns=display_name_patterns,
+        gcs_prefix=gcs_prefix, dry_run=dry_run,
+    )
+
+
+async def query_corpus(
+    corpus_id: str,
+    query: str,
+    similarity_top_k: int = RAG_DEFAULT_TOP_K,
+    vector_distance_threshold: float = RAG_DEFAULT_VECTOR_DISTANCE_THRESHOLD,
+    apply_token_budget: bool = False,
+    corpus_ids: Optional[List[str]] = None,
+    snippets: bool = False
+) -> Dict[str, Any]:
+    """
+    Queries a RAG corpus, or several corpora at once.
+
+    Args:
+        corpus_id: The ID of the corpus to query
+        query: The user question
+        similarity_top_k: Number of chunks to retrieve
+        vector_distance_threshold: Maximum vector distance of returned chunks
+        apply_token_budget: If True, overlapping chunks are merged and the results are trimmed to
+            the generator model's context token budget. Off by default, so results are
+            returned as retrieved unless the caller asks for a compact context
+        corpus_ids: Optional additional corpus IDs to search together with `corpus_id`; hits are
+            merged by vector distance and tagged with `corpus_id` and a similarity `score`
+        snippets: If True, each hit is cut down to the few sentences that best match the query
+            (much smaller results); `snippet_start` / `snippet_end` locate it in the full chunk
+    """
+    return await run_tool(
+        "query_corpus", corpus_tools.query_corpus,
+        corpus_id=corpus_id, query=query, similarity_top_k=similarity_top_k,
+        vector_distance_threshold=vector_distance_threshold, apply_token_budget=apply_token_budget,
+        corpus_ids=corpus_ids, snippets=snippets,
+    )
+
+
+async def parallel_check_relevant_corpus(
+    query: str,
+    per_corpus_top_k: int = RAG_DEFAULT_SEARCH_TOP_K,
+    routing_top_n: int = ROUTING_DEFAULT_TOP_N
+) -> Dict[str, Any]:
+    """
+    Ranks corpora by relevance to the query, querying the candidate corpora in parallel. With
+    `routing_top_n` > 0 the routing index pre-selects that many likely corpora; the default, 0,
+    queries every corpus.
+    """
+    return await run_tool(
+        "parallel_check_relevant_corpus", corpus_tools.parallel_check_relevant_corpus,
+        query=query, per_corpus_top_k=per_corpus_top_k, routing_top_n=routing_top_n,
+    )
+
+
+async def get_corpus_id_by_display_name(display_name: str) -> Optional[str]:
+    """
+    Helper: Finds a corpus ID by its display name.
+    """
+    return await run_blocking(corpus_tools.get_corpus_id_by_display_name, display_name, timeout=get_timeout("list_corpora"))
+
+
+async def get_file_id_by_name(corpus_id: str, file_display_name: str) -> Optional[str]:
+    """
+    Helper: Finds a file ID by its display name in a specific corpus.
+    """
+    return await run_blocking(corpus_tools.get_file_id_by_name, corpus_id, file_display_name, timeout=get_timeout("list_files"))
@@ -1,9 +1,17 @@
 # ====================== CORPUS TOOLS =====================
 
-import vertexai
 from vertexai.preview import rag
-from google.adk.tools import FunctionTool
-from typing import Dict, Optional, Any, List
+from typing import Callable, Dict, Optional, Any, List
+from concurrent.futures import ThreadPoolExecutor
+import fnmatch
+import base64
+import hashlib
+import datetime
+import contextvars
+import json
+import threading
+import logging
+import time
 import sys
 import os
 
@@ -23,7 +31,17 @@ try:
         RAG_DEFAULT_VECTOR_DISTANCE_THRESHOLD,
         RAG_DEFAULT_CHUNK_SIZE,
         RAG_DEFAULT_CHUNK_OVERLAP,
-        RAG_DEFAULT_EMBEDDING_REQUESTS_PER_MIN,
+        INGESTION_BATCH_SIZE,
+        RAG_MAX_CORPORA_PER_RETRIEVAL,
+        RAG_FEDERATED_QUERY_MAX_WORKERS,
+        RAG_BULK_DELETE_MAX_WORKERS,
+        LIST_DEFAULT_PAGE_SIZE,
+        LIST_CORPORA_DEFAULT_FIELDS,
+        LIST_FILES_DEFAULT_FIELDS,
+        ROUTING_DEFAULT_TOP_N,
+        ROUTING_EVALUATION_TOP_N,
+        ROUTING_SAMPLE_FILES,
+        ROUTING_SAMPLE_CHUNKS_PER_FILE,
     )
 except ImportError:
     try:
@@ -36,7 +54,17 @@ except ImportError:
             RAG_DEFAULT_VECTOR_DISTANCE_THRESHOLD,
             RAG_DEFAULT_CHUNK_SIZE,
             RAG_DEFAULT_CHUNK_OVERLAP,
-            RAG_DEFAULT_EMBEDDING_REQUESTS_PER_MIN,
+            INGESTION_BATCH_SIZE,
+            RAG_MAX_CORPORA_PER_RETRIEVAL,
+            RAG_FEDERATED_QUERY_MAX_WORKERS,
+            RAG_BULK_DELETE_MAX_WORKERS,
+            LIST_DEFAULT_PAGE_SIZE,
+            LIST_CORPORA_DEFAULT_FIELDS,
+            LIST_FILES_DEFAULT_FIELDS,
+            ROUTING_DEFAULT_TOP_N,
+            ROUTING_EVALUATION_TOP_N,
+            ROUTING_SAMPLE_FILES,
+            ROUTING_SAMPLE_CHUNKS_PER_FILE,
         )
     except ImportError:
         # Fallback for relative import if master is not a package
@@ -49,11 +77,181 @@ except ImportError:
             RAG_DEFAULT_VECTOR_DISTANCE_THRESHOLD,
             RAG_DEFAULT_CHUNK_SIZE,
             RAG_DEFAULT_CHUNK_OVERLAP,
-            RAG_DEFAULT_EMBEDDING_REQUESTS_PER_MIN,
+            INGESTION_BATCH_SIZE,
+            RAG_MAX_CORPORA_PER_RETRIEVAL,
+            RAG_FEDERATED_QUERY_MAX_WORKERS,
+            RAG_BULK_DELETE_MAX_WORKERS,
+            LIST_DEFAULT_PAGE_SIZE,
+            LIST_CORPORA_DEFAULT_FIELDS,
+            LIST_FILES_DEFAULT_FIELDS,
+            ROUTING_DEFAULT_TOP_N,
+            ROUTING_EVALUATION_TOP_N,
+            ROUTING_SAMPLE_FILES,
+            ROUTING_SAMPLE_CHUNKS_PER_FILE,
         )
 
-# initialize vertexai
-vertexai.init(project=PROJECT_ID, location=LOCATION)
+try:
+    from tools.context.context_tools import build_context, count_tokens, extract_snippets, get_token_budget
+except ImportError:
+    try:
+        from rag.tools.context.context_tools import build_context, count_tokens, extract_snippets, get_token_budget
+    except ImportError:
+        from ...tools.context.context_tools import build_context, count_tokens, extract_snippets, get_token_budget
+
+try:
+    from tools.corpus.routing_index import get_routing_index
+except ImportError:
+    try:
+        from rag.tools.corpus.routing_index import get_routing_index
+    except ImportError:
+        from .routing_index import get_routing_index
+
+try:
+    from tools.executor.single_flight import get_single_flight
+    from tools.executor.resilience import get_resilient_caller
+    from tools.executor.ingestion_scheduler import get_ingestion_scheduler, get_ingestion_stats
+    from tools.executor.vertex_client import get_vertex_client
+except ImportError:
+    try:
+        from rag.tools.executor.single_flight import get_single_flight
+        from rag.tools.executor.resilience import get_resilient_caller
+        from rag.tools.executor.ingestion_scheduler import get_ingestion_scheduler, get_ingestion_stats
+        from rag.tools.executor.vertex_client import get_vertex_client
+    except ImportError:
+        from ...tools.executor.single_flight import get_single_flight
+        from ...tools.executor.resilience import get_resilient_caller
+        from ...tools.executor.ingestion_scheduler import get_ingestion_scheduler, get_ingestion_stats
+        from ...tools.executor.vertex_client import get_vertex_client
+
+try:
+    from tools.corpus.retrieval_results import RetrievalHits
+except ImportError:
+    try:
+        from rag.tools.corpus.retrieval_results import RetrievalHits
+    except ImportError:
+        from .retrieval_results import RetrievalHits
+
+try:
+    from tools.corpus.import_jobs import get_import_job_store
+except ImportError:
+    try:
+        from rag.tools.corpus.import_jobs import get_import_job_store
+    except ImportError:
+        from .import_jobs import get_import_job_store
+
+try:
+    from tools.preprocess.preprocess_tools import prechunk_files, source_uri_of_staged
+except ImportError:
+    try:
+        from rag.tools.preprocess.preprocess_tools import prechunk_files, source_uri_of_staged
+    except ImportError:
+        from ...tools.preprocess.preprocess_tools import prechunk_files, source_uri_of_staged
+
+logger = logging.getLogger(__name__)
+
+# initialize vertexai (credentials are shared with the warm-up / token refresher, see tools/executor/vertex_client.py)
+get_vertex_client().initialize()
+
+# Concurrent identical Vertex AI reads share one in-flight call (see tools/executor/single_flight.py)
+_retrieval_flight = get_single_flight("retrieval_query")
+_list_corpora_flight = get_single_flight("list_corpora")
+_list_files_flight = get_single_flight("list_files")
+# Hedged retrievals with a timeout and per-corpus circuit breakers (see tools/executor/resilience.py)
+_retrieval_caller = get_resilient_caller("retrieval_query")
+
+def _list_rag_corpora() -> List[Any]:
+    """
+    Helper: Returns all corpora (rag.list_corpora, fully paged). Concurrent callers share one call.
+    """
+    return _list_corpora_flight.do((PROJECT_ID, LOCATION), lambda: list(rag.list_corpora()))
+
+def _list_rag_files(corpus_name: str) -> List[Any]:
+    """
+    Helper: Returns all files of a corpus (rag.list_files, fully paged). Concurrent callers share one call.
+    """
+    return _list_files_flight.do(corpus_name, lambda: list(rag.list_files(corpus_name=corpus_name)))
+
+# -- listings: filtering, pagination and field projection
+# Vertex AI list calls only page, so filtering happens here on the (coalesced) full listing.
+# Page tokens are opaque offsets bound to the filters they were issued for.
+CORPUS_FIELDS = ("id", "name", "display_name", "description", "create_time", "status")
+FILE_FIELDS = ("id", "name", "display_name", "description", "create_time")
+
+def _as_datetime(value: Any) -> Optional[datetime.datetime]:
+    """Helper: Parses an SDK timestamp or ISO 8601 string to an aware UTC datetime (None if unparseable)."""
+    if value is None or value == "":
+        return None
+    if not isinstance(value, datetime.datetime):
+        text = str(value).strip()
+        if text.endswith("Z"):
+            text = text[:-1] + "+00:00"
+        try:
+            value = datetime.datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+def _resolve_fields(fields: Optional[List[str]], default: List[str], allowed: tuple) -> List[str]:
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    if not fields:
+        return list(default)
+    if fields == ["*"]:
+        return list(allowed)
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s) {', '.join(unknown)}. Available: {', '.join(allowed)}")
+    return list(fields)
+
+def _page_token_filter(*filters: Any) -> str:
+    return hashlib.sha1(json.dumps(filters, default=str).encode("utf-8")).hexdigest()[:12]
+
+def _paginate(records: List[Dict[str, Any]], page_size: int, page_token: Optional[str], filter_key: str) -> tuple:
+    """Helper: Returns (page, next_page_token). page_size <= 0 returns everything from the token on."""
+    offset = 0
+    if page_token:
+        try:
+            token = json.loads(base64.urlsafe_b64decode(page_token.encode("ascii")))
+            offset = int(token["offset"])
+        except Exception:
+            raise ValueError("Invalid page_token")
+        if token.get("filter") != filter_key:
+            raise ValueError("page_token was issued for a different filter; restart without page_token")
+    if page_size <= 0:
+        return records[offset:], None
+    page = records[offset:offset + page_size]
+    next_offset = offset + page_size
+    next_token = None
+    if next_offset < len(records):
+        next_token = base64.urlsafe_b64encode(json.dumps({"offset": next_offset, "filter": filter_key}).encode("utf-8")).decode("ascii")
+    return page, next_token
+
+def _filter_listing(
+    items: List[Any],
+    display_name_prefix: Optional[str],
+    created_after: Optional[str],
+    created_before: Optional[str],
+) -> List[Any]:
+    """Helper: Keeps items whose display name starts with the prefix (case-insensitive) and created_after <= create_time < created_before."""
+    after = _as_datetime(created_after) if created_after else None
+    before = _as_datetime(created_before) if created_before else None
+    if created_after and after is None:
+        raise ValueError(f"Invalid created_after '{created_after}' (expected ISO 8601, e.g. 2025-01-31 or 2025-01-31T08:00:00Z)")
+    if created_before and before is None:
+        raise ValueError(f"Invalid created_before '{created_before}' (expected ISO 8601, e.g. 2025-01-31 or 2025-01-31T08:00:00Z)")
+    prefix = (display_name_prefix or "").lower()
+    kept = []
+    for item in items:
+        if prefix and not (getattr(item, "display_name", "") or "").lower().startswith(prefix):
+            continue
+        if after or before:
+            created = _as_datetime(getattr(item, "create_time", None))
+            if created is None or (after and created < after) or (before and created >= before):
+                continue
+        kept.append(item)
+    return kept
 
 def create_corpus(
     display_name: str,
@@ -145,15 +343,34 @@ def update_corpus(
             "message": f"Failed to update RAG corpus: {str(e)}"
         }
 
-def list_corpora() -> Dict[str, Any]:
+def list_corpora(
+    page_size: int = LIST_DEFAULT_PAGE_SIZE,
+    page_token: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    display_name_prefix: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None,
+) -> Dict[str, Any]:
     """
-    Lists all RAG corpora in the current project and location.
+    Lists RAG corpora in the current project and location, one page at a time.
+
+    Args:
+        page_size: Corpora per page (0 returns all matches)
+        page_token: next_page_token from the previous page (same filters required)
+        fields: Fields to return per corpus, from id, name, display_name, description,
+            create_time, status (default: LIST_CORPORA_DEFAULT_FIELDS; ["*"] for all)
+        display_name_prefix: Only corpora whose display name starts with this (case-insensitive)
+        created_after: Only corpora created at or after this ISO 8601 date/time
+        created_before: Only corpora created before this ISO 8601 date/time
     """
     try:
-        corpora = rag.list_corpora()
+        fields = _resolve_fields(fields, LIST_CORPORA_DEFAULT_FIELDS, CORPUS_FIELDS)
+        corpora = _filter_listing(_list_rag_corpora(), display_name_prefix, created_after, created_before)
+        filter_key = _page_token_filter("corpora", display_name_prefix, created_after, created_before)
+        page, next_page_token = _paginate(corpora, page_size, page_token, filter_key)
         
         corpus_list = []
-        for corpus in corpora:
+        for corpus in page:
             corpus_id = corpus.name.split('/')[-1]
             
             # Safely get status
@@ -162,21 +379,26 @@ def list_corpora() -> Dict[str, Any]:
             if hasattr(corpus, "corpus_status") and hasattr(corpus.corpus_status, "state"):
                 status = str(corpus.corpus_status.state)
             
-            corpus_list.append({
+            record = {
                 "id": corpus_id,
                 "name": corpus.name,
                 "display_name": corpus.display_name,
                 "description": getattr(corpus, "description", None),
                 "create_time": str(getattr(corpus, "create_time", "")),
                 "status": status
-            })
+            }
+            corpus_list.append({field: record[field] for field in fields})
         
-        return {
+        result = {
             "status": "success",
             "corpora": corpus_list,
             "count": len(corpus_list),
-            "message": f"Found {len(corpus_list)} RAG corpora"
+            "total_count": len(corpora),
+            "message": f"Found {len(corpora)} RAG corpora, showing {len(corpus_list)}"
         }
+        if next_page_token:
+            result["next_page_token"] = next_page_token
+        return result
     except Exception as e:
         return {
             "status": "error",
@@ -195,9 +417,7 @@ def get_corpus(corpus_id: str) -> Dict[str, Any]:
         files_count = 0
         try:
             # Simple list to count
-            files_iter = rag.list_files(corpus_name=corpus_name)
-            # rag.list_files returns an iterable, need to convert to list to count
-            files_count = len(list(files_iter))
+            files_count = len(_list_rag_files(corpus_name))
         except:
             pass
 
@@ -228,6 +448,12 @@ def delete_corpus(corpus_id: str) -> Dict[str, Any]:
     try:
         corpus_name = f"projects/{PROJECT_ID}/locations/{LOCATION}/ragCorpora/{corpus_id}"
         rag.delete_corpus(name=corpus_name)
+        try:
+            index = get_routing_index()
+            index.remove_corpus(corpus_id)
+            index.save()
+        except Exception as e:
+            logger.warning(f"Failed to drop corpus {corpus_id} from routing index: {e}")
         return {
             "status": "success",
             "corpus_id": corpus_id,
@@ -247,10 +473,72 @@ def import_files(
     chunk_size: Optional[int] = None,
     chunk_overlap: Optional[int] = None,
     max_embedding_requests_per_min: Optional[int] = None,
+    dedupe_chunks: bool = False,
+    priority: str = "normal",
+    wait: bool = True,
 ) -> Dict[str, Any]:
     """
     Imports files from Google Cloud Storage into a RAG corpus.
+
+    Imports share the project embedding quota through the ingestion scheduler: the job may wait
+    in the queue, then runs in batches at its priority-weighted share of the quota ("hotfix"
+    before "normal" before "backfill"). max_embedding_requests_per_min optionally caps the share.
+
+    With dedupe_chunks=True the files are chunked locally first and chunks that near-duplicate
+    an earlier chunk of the batch (shared boilerplate) are dropped before import, so they are
+    not embedded again. Supported files are then imported as staged plain-text copies.
+
+    With wait=False the import runs in the background and a job_id is returned immediately;
+    poll get_import_job_status(job_id) for progress and the final counts.
+    """
+    if wait:
+        return _run_import(corpus_id, gcs_uris, chunk_size, chunk_overlap, max_embedding_requests_per_min, dedupe_chunks, priority)
+    try:
+        params = {
+            "corpus_id": corpus_id,
+            "gcs_uris": list(gcs_uris),
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "max_embedding_requests_per_min": max_embedding_requests_per_min,
+            "dedupe_chunks": dedupe_chunks,
+            "priority": priority,
+        }
+        job = get_import_job_store().start(
+            "import_files", params,
+            lambda progress: _run_import(
+                corpus_id, gcs_uris, chunk_size, chunk_overlap, max_embedding_requests_per_min, dedupe_chunks, priority,
+                progress=progress,
+            ),
+        )
+        return {
+            "status": "success",
+            "job_id": job["job_id"],
+            "state": job["state"],
+            "message": f"Started background import of {len(gcs_uris)} URIs into corpus '{corpus_id}'. Check progress with get_import_job_status('{job['job_id']}')"
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "corpus_id": corpus_id,
+            "error_message": str(e),
+            "message": f"Failed to start import job: {str(e)}"
+        }
+
+def _run_import(
+    corpus_id: str,
+    gcs_uris: List[str],
+    chunk_size: Optional[int],
+    chunk_overlap: Optional[int],
+    max_embedding_requests_per_min: Optional[int],
+    dedupe_chunks: bool,
+    priority: str,
+    progress: Optional[Callable[..., None]] = None,
+) -> Dict[str, Any]:
     """
+    Helper: The import itself, run inline by import_files or on a background job thread.
+    `progress(**fields)` receives stage and batch counts as the import advances.
+    """
+    progress = progress or (lambda **fields: None)
     try:
         corpus_name = f"projects/{PROJECT_ID}/locations/{LOCATION}/ragCorpora/{corpus_id}"
 
@@ -258,8 +546,30 @@ def import_files(
             chunk_size = RAG_DEFAULT_CHUNK_SIZE
         if chunk_overlap is None:
             chunk_overlap = RAG_DEFAULT_CHUNK_OVERLAP
-        if max_embedding_requests_per_min is None:
-            max_embedding_requests_per_min = RAG_DEFAULT_EMBEDDING_REQUESTS_PER_MIN
+
+        source_uris = gcs_uris
+        preprocessing = None
+        if dedupe_chunks:
+            progress(stage="preprocessing", files_total=len(source_uris))
+            preprocessing = prechunk_files(gcs_uris, corpus_id, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            if preprocessing["status"] != "success":
+                return {
+                    "status": "error",
+                    "corpus_id": corpus_id,
+                    "error_message": preprocessing["error_message"],
+                    "message": f"Failed to import files: {preprocessing['message']}"
+                }
+            gcs_uris = preprocessing["import_uris"]
+            preprocessing = {"stats": preprocessing["stats"], "fully_duplicate_uris": preprocessing["fully_duplicate_uris"]}
+            if not gcs_uris:
+                return {
+                    "status": "success",
+                    "imported_count": 0,
+                    "failed_count": 0,
+                    "skipped_count": len(source_uris),
+                    "preprocessing": preprocessing,
+                    "message": f"All {len(source_uris)} files duplicate content already in this batch; nothing to import into corpus '{corpus_id}'"
+                }
 
         transformation_config = rag.TransformationConfig(
             chunking_config=rag.ChunkingConfig(
@@ -268,31 +578,57 @@ def import_files(
             ),
         )
 
-        response = rag.import_files(
-            corpus_name,
-            gcs_uris,
-            transformation_config=transformation_config,
-            max_embedding_requests_per_min=max_embedding_requests_per_min,
+        batches = [gcs_uris[i:i + INGESTION_BATCH_SIZE] for i in range(0, len(gcs_uris), INGESTION_BATCH_SIZE)]
+        done = {"batches_done": 0, "uris_done": 0, "imported_count": 0, "failed_count": 0, "skipped_count": 0}
+
+        def _import_batch(batch: List[str], rpm: int) -> Any:
+            progress(stage="importing", batches_total=len(batches), uris_total=len(gcs_uris), current_rpm=rpm, **done)
+            response = rag.import_files(
+                corpus_name,
+                batch,
+                transformation_config=transformation_config,
+                max_embedding_requests_per_min=rpm,
+            )
+            done["batches_done"] += 1
+            done["uris_done"] += len(batch)
+            for key, attribute in (("imported_count", "imported_rag_files_count"), ("failed_count", "failed_rag_files_count"), ("skipped_count", "skipped_rag_files_count")):
+                done[key] += getattr(response, attribute, 0) or 0
+            progress(**done)
+            return response
+
+        progress(stage="queued", batches_total=len(batches), uris_total=len(gcs_uris), **done)
+        scheduled = get_ingestion_scheduler().run(
+            corpus_id, batches, _import_batch, priority=priority, rate_cap=max_embedding_requests_per_min,
         )
+
+        imported_count = done["imported_count"]
+        failed_count = done["failed_count"]
+        skipped_count = done["skipped_count"]
+        progress(stage="done", current_rpm=0)
+
+        # Refresh the corpus routing signature from the newly imported files (off the request path).
+        # Skipped while routing is off: the probes cost retrieval quota, and build_routing_index
+        # rebuilds every signature before routing is switched on
+        if imported_count and ROUTING_DEFAULT_TOP_N > 0:
+            threading.Thread(
+                target=update_routing_index,
+                args=(corpus_id, source_uris),
+                name=f"routing-index-{corpus_id}",
+                daemon=True,
+            ).start()
         
-        imported_count = 0
-        failed_count = 0
-        skipped_count = 0
-        
-        if hasattr(response, "imported_rag_files_count"):
-             imported_count = response.imported_rag_files_count
-        if hasattr(response, "failed_rag_files_count"):
-             failed_count = response.failed_rag_files_count
-        if hasattr(response, "skipped_rag_files_count"):
-             skipped_count = response.skipped_rag_files_count
-        
-        return {
+        result = {
             "status": "success",
             "imported_count": imported_count,
             "failed_count": failed_count,
             "skipped_count": skipped_count,
+            "ingestion_job": scheduled["job"],
             "message": f"Successfully initiated import of {len(gcs_uris)} URIs into corpus '{corpus_id}'. Imported: {imported_count}, Failed: {failed_count}, Skipped: {skipped_count}"
         }
+        if preprocessing is not None:
+            result["preprocessing"] = preprocessing
+            result["message"] += f". Pre-chunking saved ~{preprocessing['stats']['embedding_requests_saved']} embedding requests"
+        return result
     except Exception as e:
         return {
             "status": "error",
@@ -301,30 +637,115 @@ def import_files(
             "message": f"Failed to import files: {str(e)}"
         }
 
-def list_files(corpus_id: str) -> Dict[str, Any]:
+def get_import_job_status(job_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Reports a background import job started with import_files(wait=False): its state
+    (queued, running, completed, failed or interrupted), progress and, once finished, the
+    import result. Without job_id, lists the most recent jobs.
+    """
+    try:
+        store = get_import_job_store()
+        if not job_id:
+            jobs = store.list()
+            return {
+                "status": "success",
+                "jobs": jobs,
+                "count": len(jobs),
+                "message": f"Found {len(jobs)} recent import jobs"
+            }
+        job = store.get(job_id)
+        if job is None:
+            return {
+                "status": "error",
+                "job_id": job_id,
+                "error_message": f"Import job '{job_id}' not found",
+                "message": f"Import job '{job_id}' not found"
+            }
+        progress = job["progress"]
+        detail = f"{progress.get('batches_done', 0)}/{progress.get('batches_total', '?')} batches"
+        return {
+            "status": "success",
+            "job": job,
+            "message": f"Import job '{job_id}' into corpus '{job['params']['corpus_id']}' is {job['state']} ({detail})"
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "job_id": job_id,
+            "error_message": str(e),
+            "message": f"Failed to get import job status: {str(e)}"
+        }
+
+def get_ingestion_status() -> Dict[str, Any]:
+    """
+    Reports the import queue: queue depth, the share of the project embedding quota allocated
+    to running imports, and each queued, running and recently finished job with its effective rate.
+    """
+    try:
+        stats = get_ingestion_stats()
+        return {
+            "status": "success",
+            **stats,
+            "message": f"{stats['running_jobs']} import job(s) running at {stats['allocated_rpm']}/{stats['project_rpm']} embedding requests/min, {stats['queue_depth']} queued"
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": str(e),
+            "message": f"Failed to get ingestion status: {str(e)}"
+        }
+
+def list_files(
+    corpus_id: str,
+    page_size: int = LIST_DEFAULT_PAGE_SIZE,
+    page_token: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    display_name_prefix: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None,
+) -> Dict[str, Any]:
     """
-    Lists files in a RAG corpus.
+    Lists files in a RAG corpus, one page at a time.
+
+    Args:
+        corpus_id: The ID of the corpus
+        page_size: Files per page (0 returns all matches)
+        page_token: next_page_token from the previous page (same filters required)
+        fields: Fields to return per file, from id, name, display_name, description,
+            create_time (default: LIST_FILES_DEFAULT_FIELDS; ["*"] for all)
+        display_name_prefix: Only files whose display name starts with this (case-insensitive)
+        created_after: Only files imported at or after this ISO 8601 date/time
+        created_before: Only files imported before this ISO 8601 date/time
     """
     try:
         corpus_name = f"projects/{PROJECT_ID}/locations/{LOCATION}/ragCorpora/{corpus_id}"
-        files = rag.list_files(corpus_name=corpus_name)
+        fields = _resolve_fields(fields, LIST_FILES_DEFAULT_FIELDS, FILE_FIELDS)
+        files = _filter_listing(_list_rag_files(corpus_name), display_name_prefix, created_after, created_before)
+        filter_key = _page_token_filter("files", corpus_id, display_name_prefix, created_after, created_before)
+        page, next_page_token = _paginate(files, page_size, page_token, filter_key)
         
         file_list = []
-        for f in files:
+        for f in page:
             file_id = f.name.split('/')[-1]
-            file_list.append({
+            record = {
                 "id": file_id,
                 "name": f.name,
                 "display_name": f.display_name,
+                "description": getattr(f, "description", None),
                 "create_time": str(getattr(f, "create_time", ""))
-            })
+            }
+            file_list.append({field: record[field] for field in fields})
             
-        return {
+        result = {
             "status": "success",
             "files": file_list,
             "count": len(file_list),
-            "message": f"Found {len(file_list)} files in corpus '{corpus_id}'"
+            "total_count": len(files),
+            "message": f"Found {len(files)} files in corpus '{corpus_id}', showing {len(file_list)}"
         }
+        if next_page_token:
+            result["next_page_token"] = next_page_token
+        return result
     except Exception as e:
         return {
             "status": "error",
@@ -380,38 +801,354 @@ def delete_file_from_corpus(corpus_id: str, file_id: str) -> Dict[str, Any]:
             "message": f"Failed to delete file: {str(e)}"
         }
 
-def query_corpus(
+def _rag_file_source_uris(corpus_name: str, files: List[Any]) -> Dict[str, str]:
+    """
+    Helper: Maps RAG file resource names to the gs:// URI each file was imported from; staged
+    pre-chunked copies map to their original file. rag.list_files does not return the import
+    source, so files without a `source_uri` are looked up through the data-service client.
+    """
+    sources = {f.name: f.source_uri for f in files if getattr(f, "source_uri", None)}
+    if len(sources) < len(files):
+        client = get_vertex_client().data_client
+        if client is None:
+            from vertexai.preview.rag.utils import _gapic_utils
+            client = _gapic_utils.create_rag_data_service_client()
+        for rag_file in client.list_rag_files(request={"parent": corpus_name}):
+            uris = list(rag_file.gcs_source.uris)
+            if uris:
+                sources.setdefault(rag_file.name, uris[0])
+    return {name: source_uri_of_staged(uri) or uri for name, uri in sources.items()}
+
+def bulk_delete_files(
+    corpus_id: str,
+    file_ids: Optional[List[str]] = None,
+    display_name_patterns: Optional[List[str]] = None,
+    gcs_prefix: Optional[str] = None,
+    dry_run: bool = False,
+    max_workers: int = RAG_BULK_DELETE_MAX_WORKERS
+) -> Dict[str, Any]:
+    """
+    Deletes many files from a RAG corpus in one call.
+
+    Files are selected by any combination of explicit file IDs, display-name glob patterns
+    (e.g. "product_x_*.pdf", case-insensitive) and a GCS prefix (files imported from a source URI
+    starting with gs://bucket/prefix, including files imported as pre-chunked copies). Selectors are resolved against a single file listing and
+    the matches are deleted by a bounded worker pool.
+
+    Args:
+        corpus_id: The ID of the corpus
+        file_ids: Optional list of RAG file IDs
+        display_name_patterns: Optional list of glob patterns matched against file display names
+        gcs_prefix: Optional gs://bucket/prefix; files imported from under it are removed
+        dry_run: If True, only report which files would be deleted
+        max_workers: Maximum number of concurrent delete calls
+
+    Returns:
+        Per-file outcomes ("deleted", "error", "would_delete"), unmatched selectors and throughput.
+    """
+    if not (file_ids or display_name_patterns or gcs_prefix):
+        return {
+            "status": "error",
+            "corpus_id": corpus_id,
+            "error_message": "no selector",
+            "message": "Provide file_ids, display_name_patterns and/or gcs_prefix"
+        }
+    try:
+        started = time.perf_counter()
+        corpus_name = f"projects/{PROJECT_ID}/locations/{LOCATION}/ragCorpora/{corpus_id}"
+        files = _list_rag_files(corpus_name)
+        by_id = {f.name.split('/')[-1]: f for f in files}
+
+        # file_id -> selectors that matched it
+        selected: Dict[str, List[str]] = {}
+        unmatched = []
+        for file_id in file_ids or []:
+            if file_id in by_id:
+                selected.setdefault(file_id, []).append(f"id:{file_id}")
+            else:
+                unmatched.append(f"id:{file_id}")
+        for pattern in display_name_patterns or []:
+            hits = [fid for fid, f in by_id.items() if fnmatch.fnmatch((f.display_name or "").lower(), pattern.lower())]
+            for fid in hits:
+                selected.setdefault(fid, []).append(f"pattern:{pattern}")
+            if not hits:
+                unmatched.append(f"pattern:{pattern}")
+        if gcs_prefix:
+            if not gcs_prefix.startswith("gs://"):
+                raise ValueError(f"GCS prefix must start with gs://, got '{gcs_prefix}'")
+            sources = _rag_file_source_uris(corpus_name, files)
+            hits = [fid for fid, f in by_id.items() if sources.get(f.name, "").startswith(gcs_prefix)]
+            for fid in hits:
+                selected.setdefault(fid, []).append(f"gcs_prefix:{gcs_prefix}")
+            if not hits:
+                unmatched.append(f"gcs_prefix:{gcs_prefix}")
+        resolve_seconds = time.perf_counter() - started
+
+        def outcome(file_id: str, status: str, error: Optional[str] = None) -> Dict[str, Any]:
+            item = {
+                "file_id": file_id,
+                "display_name": by_id[file_id].display_name,
+                "matched_by": selected[file_id],
+                "status": status,
+            }
+            if error:
+                item["error_message"] = error
+            return item
+
+        if dry_run or not selected:
+            outcomes = [outcome(fid, "would_delete") for fid in selected]
+            return {
+                "status": "success",
+                "corpus_id": corpus_id,
+                "dry_run": dry_run,
+                "files_in_corpus": len(by_id),
+                "matched": len(selected),
+                "unmatched_selectors": unmatched,
+                "results": outcomes,
+                "message": f"{len(selected)} of {len(by_id)} files in corpus '{corpus_id}' match the selectors"
+            }
+
+        def delete_one(file_id: str) -> Dict[str, Any]:
+            result = delete_file_from_corpus(corpus_id, file_id)
+            if result.get("status") == "success":
+                return outcome(file_id, "deleted")
+            return outcome(file_id, "error", result.get("error_message"))
+
+        delete_started = time.perf_counter()
+        workers = max(1, min(max_workers or 1, RAG_BULK_DELETE_MAX_WORKERS, len(selected)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Each delete runs in a copy of the caller's context, so its Vertex call is attributed to the tool
+            futures = [pool.submit(contextvars.copy_context().run, delete_one, file_id) for file_id in selected]
+            outcomes = [future.result() for future in futures]
+        delete_seconds = time.perf_counter() - delete_started
+
+        deleted = sum(1 for o in outcomes if o["status"] == "deleted")
+        failed = len(outcomes) - deleted
+        return {
+            # Partial failures are reported per file; only a run where nothing was deleted is an error
+            "status": "success" if deleted or not failed else "error",
+            "corpus_id": corpus_id,
+            "files_in_corpus": len(by_id),
+            "matched": len(selected),
+            "deleted": deleted,
+            "failed": failed,
+            "unmatched_selectors": unmatched,
+            "results": outcomes,
+            "throughput": {
+                "workers": workers,
+                "resolve_seconds": round(resolve_seconds, 3),
+                "delete_seconds": round(delete_seconds, 3),
+                "files_per_second": round(len(outcomes) / delete_seconds, 2) if delete_seconds > 0 else 0.0,
+            },
+            "message": f"Deleted {deleted} of {len(selected)} matched files from corpus '{corpus_id}'"
+                       + (f" ({failed} failed)" if failed else "")
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "corpus_id": corpus_id,
+            "error_message": str(e),
+            "message": f"Failed to bulk delete files: {str(e)}"
+        }
+
+def _retrieve_batch(
+    corpus_ids: List[str],
+    query: str,
+    similarity_top_k: int,
+    vector_distance_threshold: float
+) -> RetrievalHits:
+    """
+    Helper: Runs one retrieval_query over one or more corpora (one rag.RagResource each).
+    Concurrent identical retrievals (same corpora, query and parameters) share one call.
+    """
+    return _retrieval_flight.do(
+        (tuple(corpus_ids), query, similarity_top_k, vector_distance_threshold),
+        _resilient_retrieval_query, corpus_ids, query, similarity_top_k, vector_distance_threshold
+    )
+
+def _resilient_retrieval_query(
+    corpus_ids: List[str],
+    query: str,
+    similarity_top_k: int,
+    vector_distance_threshold: float
+) -> RetrievalHits:
+    """
+    Helper: Runs the retrieval hedged and behind the corpus' circuit breaker. While the breaker
+    is open the last good answer to the same request is returned with every hit marked `stale`.
+    """
+    results, degraded = _retrieval_caller.call(
+        ",".join(corpus_ids),
+        (tuple(corpus_ids), query, similarity_top_k, vector_distance_threshold),
+        _run_retrieval_query, corpus_ids, query, similarity_top_k, vector_distance_threshold
+    )
+    if degraded:
+        results = results.as_stale()
+    return results
+
+def _run_retrieval_query(
+    corpus_ids: List[str],
+    query: str,
+    similarity_top_k: int,
+    vector_distance_threshold: float
+) -> RetrievalHits:
+    response = rag.retrieval_query(
+        rag_resources=[
+            rag.RagResource(rag_corpus=f"projects/{PROJECT_ID}/locations/{LOCATION}/ragCorpora/{corpus_id}")
+            for corpus_id in corpus_ids
+        ],
+        text=query,
+        similarity_top_k=similarity_top_k,
+        vector_distance_threshold=vector_distance_threshold
+    )
+
+    if hasattr(response, "contexts") and hasattr(response.contexts, "contexts"):
+        return RetrievalHits.from_contexts(response.contexts.contexts)
+    return RetrievalHits.empty()
+
+def _retrieve_per_corpus(
+    corpus_ids: List[str],
+    query: str,
+    similarity_top_k: int,
+    vector_distance_threshold: float,
+    batch_size: int = RAG_MAX_CORPORA_PER_RETRIEVAL
+) -> List[Dict[str, Any]]:
+    """
+    Helper: Retrieves from several corpora, packing up to `batch_size` corpora into each
+    retrieval_query and running the calls in parallel.
+
+    Returns one entry per batch: {"corpus_ids", "results", "error"}. Hits of a single-corpus
+    batch are tagged with its `corpus_id`. The service does not report which corpus a hit of a
+    multi-corpus batch came from, so those hits are tagged with the comma-joined batch.
+    """
+    batch_size = max(1, batch_size)
+    batches = [corpus_ids[i:i + batch_size] for i in range(0, len(corpus_ids), batch_size)]
+
+    def run(batch: List[str]) -> Dict[str, Any]:
+        try:
+            # Each corpus of the batch may contribute up to similarity_top_k hits
+            results = _retrieve_batch(batch, query, similarity_top_k * len(batch), vector_distance_threshold)
+            return {"corpus_ids": batch, "results": results.with_corpus_id(",".join(batch)), "error": None}
+        except Exception as e:
+            return {"corpus_ids": batch, "results": RetrievalHits.empty(), "error": str(e)}
+
+    if len(batches) == 1:
+        return [run(batches[0])]
+    with ThreadPoolExecutor(max_workers=min(len(batches), RAG_FEDERATED_QUERY_MAX_WORKERS)) as pool:
+        # Each batch runs in a copy of the caller's context (metrics attribution etc.)
+        futures = [pool.submit(contextvars.copy_context().run, run, batch) for batch in batches]
+        return [future.result() for future in futures]
+
+def _federated_query(
+    corpus_ids: List[str],
+    query: str,
+    similarity_top_k: int,
+    vector_distance_threshold: float
+) -> Dict[str, Any]:
+    """
+    Helper: Queries several corpora and merges the hits into one global top-k ranked by raw
+    vector distance. Each hit carries its similarity `score` and is tagged with its `corpus_id`.
+    """
+    batches = _retrieve_per_corpus(corpus_ids, query, similarity_top_k, vector_distance_threshold)
+
+    merged = []
+    per_corpus = {}
+    errors = {}
+    for batch in batches:
+        tag = batch["corpus_ids"][0] if len(batch["corpus_ids"]) == 1 else ",".join(batch["corpus_ids"])
+        if batch["error"]:
+            errors[tag] = batch["error"]
+            continue
+        merged.append(batch["results"].with_similarity_scores())
+        per_corpus[tag] = len(batch["results"])
+
+    top = RetrievalHits.concat(merged).top_k(similarity_top_k)
+    return {"results": top, "per_corpus": per_corpus, "errors": errors, "calls": len(batches)}
+
+def retrieve(
     corpus_id: str,
     query: str,
     similarity_top_k: int = RAG_DEFAULT_TOP_K,
     vector_distance_threshold: float = RAG_DEFAULT_VECTOR_DISTANCE_THRESHOLD
+) -> RetrievalHits:
+    """
+    Retrieves from one corpus and returns the hits as RetrievalHits (raises on failure).
+    For in-process callers such as the evaluation loop; agent tools use query_corpus.
+    """
+    return _retrieve_batch([corpus_id], query, similarity_top_k, vector_distance_threshold)
+
+def query_corpus(
+    corpus_id: str,
+    query: str,
+    similarity_top_k: int = RAG_DEFAULT_TOP_K,
+    vector_distance_threshold: float = RAG_DEFAULT_VECTOR_DISTANCE_THRESHOLD,
+    apply_token_budget: bool = False,
+    corpus_ids: Optional[List[str]] = None,
+    snippets: bool = False
 ) -> Dict[str, Any]:
     """
-    Queries a RAG corpus.
+    Queries a RAG corpus, or several corpora at once.
+
+    Args:
+        corpus_id: The ID of the corpus to query
+        query: The user question
+        similarity_top_k: Number of chunks to retrieve
+        vector_distance_threshold: Maximum vector distance of returned chunks
+        apply_token_budget: If True, overlapping chunks are merged and the results are trimmed to
+            the generator model's context token budget (see build_context). Off by default, so results are
+            returned as retrieved unless the caller asks for a compact context
+        corpus_ids: Optional additional corpus IDs to search together with `corpus_id`. Hits are
+            merged into one top-k by vector distance, tagged with `corpus_id` and given a
+            similarity `score` (1 - distance) on the same scale for every corpus.
+        snippets: If True, each hit's text is cut down to the sentences that best match the query
+            (see extract_snippets); `snippet_start` / `snippet_end` locate it in the full chunk.
     """
     try:
-        corpus_name = f"projects/{PROJECT_ID}/locations/{LOCATION}/ragCorpora/{corpus_id}"
-        
-        response = rag.retrieval_query(
-            rag_resources=[rag.RagResource(rag_corpus=corpus_name)],
-            text=query,
-            similarity_top_k=similarity_top_k,
-            vector_distance_threshold=vector_distance_threshold
-        )
-        
-        results = []
-        if hasattr(response, "contexts") and hasattr(response.contexts, "contexts"):
-            for ctx in response.contexts.contexts:
-                results.append({
-                    "text": ctx.text,
-                    "source_uri": ctx.source_uri,
-                    "distance": ctx.distance
-                })
+        federated = {}
+        all_ids = [c for c in dict.fromkeys([corpus_id] + list(corpus_ids or [])) if c]
+        if len(all_ids) > 1:
+            federated = _federated_query(all_ids, query, similarity_top_k, vector_distance_threshold)
+            if federated["errors"] and not federated["per_corpus"]:
+                raise RuntimeError("; ".join(f"{c}: {e}" for c, e in federated["errors"].items()))
+            results = federated["results"]
+        else:
+            results = _retrieve_batch(all_ids, query, similarity_top_k, vector_distance_threshold)
+
+        extra = {}
+        if federated:
+            extra = {
+                "corpora": federated["per_corpus"],
+                "corpus_errors": federated["errors"],
+                "retrieval_calls": federated["calls"],
+            }
+        if results.stale.any():
+            # A circuit breaker is open: (some) hits are the last good answer to this request
+            extra["degraded"] = True
+
+        # Hits become dicts only here, at the tool boundary
+        if snippets and len(results):
+            return _snippet_results(results.to_dicts(), query, apply_token_budget, extra)
+
+        if apply_token_budget and len(results):
+            budgeted = build_context(results.to_dicts())
+            results = [
+                {k: v for k, v in span.items() if k != "chunk_count" and v is not None}
+                for span in budgeted["spans"]
+            ]
+            return {
+                "status": "success",
+                "results": results,
+                "count": len(results),
+                "context_tokens": budgeted["context_tokens"],
+                "token_budget": budgeted["token_budget"],
+                **extra,
+                "message": f"Found {len(results)} results for query ({budgeted['context_tokens']} context tokens)"
+            }
         
         return {
             "status": "success",
-            "results": results,
+            "results": results.to_dicts(),
             "count": len(results),
+            **extra,
             "message": f"Found {len(results)} results for query"
         }
     except Exception as e:
@@ -421,52 +1158,271 @@ def query_corpus(
             "message": f"Failed to query corpus: {str(e)}"
         }
 
+def _snippet_results(
+    hits: List[Dict[str, Any]],
+    query: str,
+    apply_token_budget: bool,
+    extra: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Helper: query_corpus result in snippet mode. Snippets are short and already non-overlapping,
+    so the token budget is applied by keeping them in rank order until it is spent.
+    """
+    full_tokens = sum(count_tokens(hit["text"]) for hit in hits)
+    selected = []
+    context_tokens = 0
+    token_budget = get_token_budget() if apply_token_budget else None
+    for snippet in extract_snippets(hits, query):
+        tokens = count_tokens(snippet["text"])
+        if token_budget is not None and context_tokens + tokens > token_budget:
+            break
+        selected.append({k: v for k, v in snippet.items() if v is not None})
+        context_tokens += tokens
+    budget = {"token_budget": token_budget} if token_budget is not None else {}
+    return {
+        "status": "success",
+        "results": selected,
+        "count": len(selected),
+        "snippet_mode": True,
+        "context_tokens": context_tokens,
+        "full_chunk_tokens": full_tokens,
+        "tokens_saved": full_tokens - context_tokens,
+        **budget,
+        **extra,
+        "message": f"Found {len(selected)} snippets for query ({context_tokens} context tokens, {full_tokens} in the full chunks)"
+    }
+
+def _score_corpus(corpus: Any, hits: Optional[RetrievalHits], per_corpus_top_k: int) -> Dict[str, Any]:
+    """
+    Helper: Builds the relevance entry of one corpus from its retrieval hits (None if retrieval failed).
+    """
+    avg_distance = hits.mean_distance() if hits is not None else None
+    top = hits.head(per_corpus_top_k) if hits is not None else RetrievalHits.empty()
+    return {
+        "corpus_id": corpus.name.split('/')[-1],
+        "display_name": corpus.display_name,
+        "avg_distance": avg_distance if avg_distance is not None else 1.0,
+        "top_chunks": [
+            {
+                "text": text,
+                "source_uri": uri,
+                "filename": uri.rsplit("/", 1)[-1]
+            }
+            for text, uri in zip(top.texts, top.source_uris)
+        ]
+    }
+
+def _rank_corpora(scores: List[Dict[str, Any]]) -> Dict[str, Any]:
+    scores.sort(key=lambda x: x["avg_distance"])
+    best = scores[0] if scores else None
+    return {
+        "status": "success",
+        "best_corpus": best,
+        "ranked": scores,
+        "message": "Computed relevance across corpora"
+    }
+
 def parallel_check_relevant_corpus(
     query: str,
-    per_corpus_top_k: int = RAG_DEFAULT_SEARCH_TOP_K
+    per_corpus_top_k: int = RAG_DEFAULT_SEARCH_TOP_K,
+    routing_top_n: int = ROUTING_DEFAULT_TOP_N
 ) -> Dict[str, Any]:
+    """
+    Ranks corpora by relevance to the query.
+
+    With `routing_top_n` > 0 the local routing index first pre-selects the `routing_top_n` most
+    likely corpora, so full retrieval only runs against those (plus any corpus the index has not
+    seen yet). The default, 0, queries every corpus.
+    """
     try:
-        corpora = rag.list_corpora()
+        corpora = _list_rag_corpora()
+        by_id = {corpus.name.split('/')[-1]: corpus for corpus in corpora}
+
+        candidate_ids = list(by_id)
+        routing = None
+        if routing_top_n and routing_top_n > 0 and len(by_id) > routing_top_n:
+            index = get_routing_index()
+            started = time.perf_counter()
+            routed = index.route(query, routing_top_n, candidates=candidate_ids)
+            unindexed = [c for c in candidate_ids if c not in index]
+            if routed:
+                candidate_ids = [r["corpus_id"] for r in routed] + unindexed
+                routing = {
+                    "candidates": candidate_ids,
+                    "routed": routed,
+                    "unindexed": unindexed,
+                    "skipped": len(by_id) - len(candidate_ids),
+                    "routing_time_us": round((time.perf_counter() - started) * 1e6, 1),
+                }
+
+        # One retrieval per candidate corpus, run in parallel. Corpora are never batched here:
+        # each corpus is scored on its own hits, which needs every hit attributed to one corpus.
+        batches = _retrieve_per_corpus(
+            candidate_ids,
+            query,
+            per_corpus_top_k,
+            RAG_DEFAULT_VECTOR_DISTANCE_THRESHOLD,
+            batch_size=1
+        )
         scores = []
-        for corpus in corpora:
+        for batch in batches:
+            by_corpus = {} if batch["error"] else batch["results"].split_by_corpus()
+            for corpus_id in batch["corpus_ids"]:
+                hits = None if batch["error"] else by_corpus.get(corpus_id, RetrievalHits.empty())
+                scores.append(_score_corpus(by_id[corpus_id], hits, per_corpus_top_k))
+        ranked = _rank_corpora(scores)
+        if routing:
+            ranked["routing"] = routing
+        return ranked
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": str(e),
+            "message": f"Failed to check relevant corpus: {str(e)}"
+        }
+
+def _sample_corpus_texts(corpus_id: str, gcs_uris: List[str], probe_queries: Optional[List[str]] = None) -> List[str]:
+    """
+    Helper: Collects sample chunk texts of a corpus for its routing signature by probing
+    retrieval with each file's name (and any extra probe queries).
+
+    Probes call the retrieval directly, not through request coalescing and the resilient
+    caller, so their latencies and errors do not move the hedge delay or the circuit breakers.
+    """
+    texts = []
+    for uri in gcs_uris[:ROUTING_SAMPLE_FILES]:
+        filename = uri.rstrip("/").split("/")[-1]
+        probe = os.path.splitext(filename)[0].replace("_", " ").replace("-", " ")
+        texts.append(probe)
+        try:
+            hits = _run_retrieval_query([corpus_id], probe, ROUTING_SAMPLE_CHUNKS_PER_FILE * 2, 1.0)
+        except Exception as e:
+            logger.warning(f"Routing probe for {uri} failed: {e}")
+            continue
+        own = [text for text, source in zip(hits.texts, hits.source_uris) if source == uri]
+        texts.extend((own or hits.texts)[:ROUTING_SAMPLE_CHUNKS_PER_FILE])
+    for probe in probe_queries or []:
+        try:
+            texts.extend(_run_retrieval_query([corpus_id], probe, ROUTING_SAMPLE_CHUNKS_PER_FILE, 1.0).texts)
+        except Exception as e:
+            logger.warning(f"Routing probe '{probe}' on corpus {corpus_id} failed: {e}")
+    return texts
+
+def update_routing_index(corpus_id: str, gcs_uris: List[str]) -> Dict[str, Any]:
+    """
+    Updates the routing signature of a corpus from newly imported files and persists the index.
+    """
+    try:
+        index = get_routing_index()
+        added = index.add_texts(corpus_id, _sample_corpus_texts(corpus_id, gcs_uris))
+        index.save()
+        return {
+            "status": "success",
+            "corpus_id": corpus_id,
+            "sampled_chunks": added,
+            "message": f"Updated routing index for corpus '{corpus_id}' with {added} sample chunks"
+        }
+    except Exception as e:
+        logger.warning(f"Failed to update routing index for corpus {corpus_id}: {e}")
+        return {
+            "status": "error",
+            "error_message": str(e),
+            "message": f"Failed to update routing index: {str(e)}"
+        }
+
+def build_routing_index(
+    corpus_ids: Optional[List[str]] = None,
+    probe_queries: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    (Re)builds the routing signatures of existing corpora from their file listings, optionally
+    adding chunks retrieved for representative questions (e.g. the regression sheet queries).
+    """
+    try:
+        index = get_routing_index()
+        wanted = set(corpus_ids or [])
+        built = {}
+        for corpus in _list_rag_corpora():
             corpus_id = corpus.name.split('/')[-1]
-            q = query_corpus(
-                corpus_id=corpus_id,
-                query=query,
-                similarity_top_k=per_corpus_top_k,
-                vector_distance_threshold=RAG_DEFAULT_VECTOR_DISTANCE_THRESHOLD
+            if wanted and corpus_id not in wanted:
+                continue
+            files = _list_rag_files(corpus.name)
+            uris = [getattr(f, "source_uri", None) or f.display_name for f in files]
+            index.remove_corpus(corpus_id)
+            built[corpus_id] = index.add_texts(
+                corpus_id,
+                [corpus.display_name, getattr(corpus, "description", "") or ""]
+                + _sample_corpus_texts(corpus_id, uris, probe_queries)
             )
-            avg_distance = None
-            if q.get("status") == "success" and q.get("results"):
-                ds = [r.get("distance", 1.0) for r in q["results"]]
-                if ds:
-                    avg_distance = sum(ds) / len(ds)
-            scores.append({
-                "corpus_id": corpus_id,
-                "display_name": corpus.display_name,
-                "avg_distance": avg_distance if avg_distance is not None else 1.0,
-                "top_chunks": [
-                    {
-                        "text": r.get("text", ""),
-                        "source_uri": r.get("source_uri", ""),
-                        "filename": r.get("source_uri", "").split("/")[-1]
-                    }
-                    for r in (q.get("results") or [])[:per_corpus_top_k]
-                ]
-            })
-        scores.sort(key=lambda x: x["avg_distance"])
-        best = scores[0] if scores else None
+        index.save()
         return {
             "status": "success",
-            "best_corpus": best,
-            "ranked": scores,
-            "message": "Computed relevance across corpora"
+            "sampled_chunks": built,
+            "index": index.stats(),
+            "message": f"Built routing index for {len(built)} corpora"
         }
     except Exception as e:
         return {
             "status": "error",
             "error_message": str(e),
-            "message": f"Failed to check relevant corpus: {str(e)}"
+            "message": f"Failed to build routing index: {str(e)}"
+        }
+
+def evaluate_routing_accuracy(
+    queries: List[str],
+    routing_top_n: int = ROUTING_EVALUATION_TOP_N,
+    per_corpus_top_k: int = RAG_DEFAULT_SEARCH_TOP_K
+) -> Dict[str, Any]:
+    """
+    Compares routed corpus selection with the exhaustive method (query every corpus, lowest
+    average distance wins) over a list of questions.
+
+    Reports top-1 agreement, recall@N (exhaustive best corpus among the routed candidates),
+    routing latency and the number of retrievals saved. Routing stays off
+    (ROUTING_DEFAULT_TOP_N = 0) until this shows acceptable recall@N.
+    """
+    try:
+        top1_hits = 0
+        recall_hits = 0
+        routing_times = []
+        retrievals_exhaustive = 0
+        retrievals_routed = 0
+        evaluated = 0
+        for query in queries:
+            exhaustive = parallel_check_relevant_corpus(query, per_corpus_top_k, routing_top_n=0)
+            routed = parallel_check_relevant_corpus(query, per_corpus_top_k, routing_top_n=routing_top_n)
+            if exhaustive.get("status") != "success" or not exhaustive.get("best_corpus"):
+                continue
+            evaluated += 1
+            truth = exhaustive["best_corpus"]["corpus_id"]
+            retrievals_exhaustive += len(exhaustive["ranked"])
+            retrievals_routed += len(routed.get("ranked") or [])
+            if routed.get("best_corpus") and routed["best_corpus"]["corpus_id"] == truth:
+                top1_hits += 1
+            routing = routed.get("routing")
+            candidates = routing["candidates"] if routing else [r["corpus_id"] for r in routed.get("ranked") or []]
+            if truth in candidates:
+                recall_hits += 1
+            if routing:
+                routing_times.append(routing["routing_time_us"])
+
+        routing_times.sort()
+        return {
+            "status": "success",
+            "queries": evaluated,
+            "routing_top_n": routing_top_n,
+            "top1_accuracy": round(top1_hits / evaluated, 4) if evaluated else None,
+            "recall_at_n": round(recall_hits / evaluated, 4) if evaluated else None,
+            "retrievals_exhaustive": retrievals_exhaustive,
+            "retrievals_routed": retrievals_routed,
+            "routing_time_us_p50": routing_times[len(routing_times) // 2] if routing_times else None,
+            "message": f"Routing matched the exhaustive best corpus on {top1_hits}/{evaluated} queries"
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": str(e),
+            "message": f"Failed to evaluate routing accuracy: {str(e)}"
         }
 
 def automated_evaluation_testcase(
@@ -489,7 +1445,7 @@ def get_corpus_id_by_display_name(display_name: str) -> Optional[str]:
     Helper: Finds a corpus ID by its display name.
     """
     try:
-        corpora = rag.list_corpora()
+        corpora = _list_rag_corpora()
         for corpus in corpora:
             if corpus.display_name == display_name:
                 return corpus.name.split('/')[-1]
@@ -503,7 +1459,7 @@ def get_file_id_by_name(corpus_id: str, file_display_name: str) -> Optional[str]
     """
     try:
         corpus_name = f"projects/{PROJECT_ID}/locations/{LOCATION}/ragCorpora/{corpus_id}"
-        files = rag.list_files(corpus_name=corpus_name)
+        files = _list_rag_files(corpus_name)
         for f in files:
             # Check if display name matches OR if the file name ends with the display name (e.g. URI)
             if f.display_name == file_display_name or f.display_name.endswith(file_display_name):
@@ -0,0 +1,215 @@
+# ====================== IMPORT JOBS =====================
+#
+# Background import jobs. import_files(wait=False) returns a job ID at once and runs the import on
+# a daemon thread; get_import_job_status reads the job record. Every state change is written to
+# LOCAL_STATE_DIR/import_jobs/<job_id>.json, so finished jobs can still be looked up after a
+# restart. A job that was still running when its process died is reported as "interrupted".
+
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# Ensure parent directory is in path to allow imports if running as script or module
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+try:
+    from config import LOCAL_STATE_DIR, IMPORT_JOB_RETENTION_DAYS
+except ImportError:
+    try:
+        from rag.config import LOCAL_STATE_DIR, IMPORT_JOB_RETENTION_DAYS
+    except ImportError:
+        from ...config import LOCAL_STATE_DIR, IMPORT_JOB_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+IMPORT_JOBS_DIR = os.path.join(LOCAL_STATE_DIR, "import_jobs")
+ACTIVE_STATES = ("queued", "running")
+
+# Identifies this process in job records; a record left active by another process is stale
+_PROCESS_TOKEN = uuid.uuid4().hex
+
+
+def _process_alive(pid: Optional[int]) -> bool:
+    if not pid or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except Exception:
+        return True
+    return True
+
+
+class ImportJobStore:
+    """
+    Job records kept in memory and mirrored to one JSON file per job.
+
+    Records are plain dicts: job_id, state (queued / running / completed / failed /
+    interrupted), the request parameters, progress, result and timestamps.
+    """
+
+    def __init__(self, directory: Optional[str] = IMPORT_JOBS_DIR, retention_days: float = IMPORT_JOB_RETENTION_DAYS):
+        self.directory = directory
+        self.retention_seconds = retention_days * 86400
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        if self.directory:
+            self._load()
+
+    # -- persistence
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _save(self, record: Dict[str, Any]) -> None:
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(record["job_id"])
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(record, f, default=str)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to persist import job {record['job_id']}: {e}")
+
+    def _load(self) -> None:
+        if not os.path.isdir(self.directory):
+            return
+        cutoff = time.time() - self.retention_seconds
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    record = json.load(f)
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable import job record {path}: {e}")
+                continue
+            if (record.get("finished_at") or record.get("submitted_at") or 0) < cutoff:
+                os.remove(path)
+                continue
+            # Another live process (e.g. a second server worker) may still own the job
+            if (
+                record.get("state") in ACTIVE_STATES
+                and record.get("process_token") != _PROCESS_TOKEN
+                and not _process_alive(record.get("pid"))
+            ):
+                record["state"] = "interrupted"
+                record["finished_at"] = record.get("updated_at")
+                record["error_message"] = (
+                    "The process running this job stopped before it finished. Vertex AI may still have "
+                    "imported some files; check list_files before re-running the import."
+                )
+                self._save(record)
+            self._jobs[record["job_id"]] = record
+
+    # -- job lifecycle
+    def _update(self, job_id: str, **changes: Any) -> Dict[str, Any]:
+        with self._lock:
+            record = self._jobs[job_id]
+            record.update(changes)
+            record["updated_at"] = time.time()
+            snapshot = json.loads(json.dumps(record, default=str))
+        self._save(snapshot)
+        return snapshot
+
+    def start(self, kind: str, params: Dict[str, Any], func: Callable[[Callable[..., None]], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Records a new job and runs `func(progress)` on a daemon thread.
+
+        `progress(**fields)` merges fields into the record's "progress". The tool-style dict
+        returned by func becomes the job result; status "error" (or an exception) fails the job.
+        """
+        now = time.time()
+        record = {
+            "job_id": uuid.uuid4().hex[:16],
+            "kind": kind,
+            "state": "queued",
+            "params": params,
+            "progress": {},
+            "result": None,
+            "error_message": None,
+            "submitted_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "updated_at": now,
+            "process_token": _PROCESS_TOKEN,
+            "pid": os.getpid(),
+        }
+        with self._lock:
+            self._jobs[record["job_id"]] = record
+        self._save(record)
+        threading.Thread(
+            target=self._run,
+            args=(record["job_id"], func),
+            name=f"{kind}-job-{record['job_id']}",
+            daemon=True,
+        ).start()
+        return self.get(record["job_id"])
+
+    def _run(self, job_id: str, func: Callable[[Callable[..., None]], Dict[str, Any]]) -> None:
+        def progress(**fields: Any) -> None:
+            with self._lock:
+                merged = {**self._jobs[job_id]["progress"], **fields}
+            self._update(job_id, progress=merged)
+
+        self._update(job_id, state="running", started_at=time.time())
+        try:
+            result = func(progress)
+        except Exception as e:
+            logger.exception(f"Import job {job_id} failed")
+            self._update(job_id, state="failed", error_message=str(e), finished_at=time.time())
+            return
+        failed = isinstance(result, dict) and result.get("status") == "error"
+        self._update(
+            job_id,
+            state="failed" if failed else "completed",
+            result=result,
+            error_message=result.get("error_message") if failed else None,
+            finished_at=time.time(),
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._jobs.get(job_id)
+        # Jobs run by other processes sharing the state directory: read their latest record
+        if self.directory and job_id.isalnum() and (record is None or (record["state"] in ACTIVE_STATES and record["process_token"] != _PROCESS_TOKEN)):
+            try:
+                with open(self._path(job_id), "r", encoding="utf-8") as f:
+                    record = json.load(f)
+                with self._lock:
+                    self._jobs[job_id] = record
+            except (OSError, ValueError):
+                pass
+        return json.loads(json.dumps(record, default=str)) if record else None
+
+    def list(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recently submitted jobs first."""
+        with self._lock:
+            records = sorted(self._jobs.values(), key=lambda r: r.get("submitted_at") or 0, reverse=True)[:limit]
+            return json.loads(json.dumps(records, default=str))
+
+
+_store: Optional[ImportJobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_import_job_store() -> ImportJobStore:
+    """Returns the process-wide job store, loaded from LOCAL_STATE_DIR on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ImportJobStore()
+    return _store
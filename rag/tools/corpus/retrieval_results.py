@@ -0,0 +1,167 @@
+# ====================== RETRIEVAL RESULTS =====================
+#
+# Array-backed retrieval hits. Retrieval, federated merging, corpus ranking and the evaluation
+# loop pass RetrievalHits around; the list-of-dicts shape returned by the tools is produced once,
+# at the tool boundary, by to_dicts().
+
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+_EMPTY_FLOATS = np.zeros(0, dtype=np.float64)
+_EMPTY_BOOLS = np.zeros(0, dtype=bool)
+
+
+class RetrievalHits:
+    """
+    Retrieval hits as parallel columns: texts, interned source URIs, distances (float64, NaN
+    when the service returned none), optional similarity scores, optional corpus tags and
+    stale flags.
+
+    Instances are never modified after construction; every operation returns a new instance
+    that shares the unchanged columns. That also makes copies unnecessary, so copy/deepcopy
+    (e.g. by request coalescing) return the instance itself.
+    """
+
+    __slots__ = ("texts", "source_uris", "distances", "scores", "corpus_ids", "stale")
+
+    def __init__(
+        self,
+        texts: List[str],
+        source_uris: List[str],
+        distances: np.ndarray,
+        scores: Optional[np.ndarray] = None,
+        corpus_ids: Optional[List[str]] = None,
+        stale: Optional[np.ndarray] = None,
+    ):
+        self.texts = texts
+        self.source_uris = source_uris
+        self.distances = distances
+        self.scores = scores
+        self.corpus_ids = corpus_ids
+        self.stale = stale if stale is not None else np.zeros(len(texts), dtype=bool)
+
+    # -- construction
+    @classmethod
+    def empty(cls) -> "RetrievalHits":
+        return cls([], [], _EMPTY_FLOATS, stale=_EMPTY_BOOLS)
+
+    @classmethod
+    def from_contexts(cls, contexts: Iterable[Any]) -> "RetrievalHits":
+        """Builds hits from rag.retrieval_query response contexts."""
+        texts, uris, distances = [], [], []
+        for ctx in contexts:
+            texts.append(ctx.text)
+            uris.append(sys.intern(ctx.source_uri or ""))
+            distance = getattr(ctx, "distance", None)
+            distances.append(distance if isinstance(distance, (int, float)) else np.nan)
+        return cls(texts, uris, np.asarray(distances, dtype=np.float64))
+
+    @classmethod
+    def concat(cls, parts: Sequence["RetrievalHits"]) -> "RetrievalHits":
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+        with_scores = all(p.scores is not None for p in parts)
+        with_corpus = all(p.corpus_ids is not None for p in parts)
+        return cls(
+            [t for p in parts for t in p.texts],
+            [u for p in parts for u in p.source_uris],
+            np.concatenate([p.distances for p in parts]),
+            scores=np.concatenate([p.scores for p in parts]) if with_scores else None,
+            corpus_ids=[c for p in parts for c in p.corpus_ids] if with_corpus else None,
+            stale=np.concatenate([p.stale for p in parts]),
+        )
+
+    def __copy__(self) -> "RetrievalHits":
+        return self
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "RetrievalHits":
+        return self
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    # -- derived views
+    def take(self, indices: Sequence[int]) -> "RetrievalHits":
+        indices = np.asarray(indices, dtype=np.intp)
+        return RetrievalHits(
+            [self.texts[i] for i in indices],
+            [self.source_uris[i] for i in indices],
+            self.distances[indices],
+            scores=self.scores[indices] if self.scores is not None else None,
+            corpus_ids=[self.corpus_ids[i] for i in indices] if self.corpus_ids is not None else None,
+            stale=self.stale[indices],
+        )
+
+    def head(self, n: int) -> "RetrievalHits":
+        return self if n >= len(self) else self.take(range(max(0, n)))
+
+    def as_stale(self) -> "RetrievalHits":
+        return RetrievalHits(self.texts, self.source_uris, self.distances, self.scores, self.corpus_ids, np.ones(len(self), dtype=bool))
+
+    def with_corpus_id(self, corpus_id: str) -> "RetrievalHits":
+        tag = sys.intern(corpus_id)
+        return RetrievalHits(self.texts, self.source_uris, self.distances, self.scores, [tag] * len(self), self.stale)
+
+    def with_similarity_scores(self) -> "RetrievalHits":
+        """
+        Adds a `score` in [0, 1] (higher is better): the similarity 1 - distance, clipped. The
+        scale is fixed, so scores of different corpora (or of different calls) compare directly
+        and do not depend on how spread out one corpus's distances happen to be. Hits without a
+        distance score 0.
+        """
+        d = self.distances
+        valid = ~np.isnan(d)
+        scores = np.zeros(len(d), dtype=np.float64)
+        scores[valid] = np.clip(1.0 - d[valid], 0.0, 1.0)
+        return RetrievalHits(self.texts, self.source_uris, self.distances, scores, self.corpus_ids, self.stale)
+
+    def top_k(self, k: int) -> "RetrievalHits":
+        """Best k hits by raw distance (ascending, missing last); equal distances keep their order."""
+        distances = np.where(np.isnan(self.distances), np.inf, self.distances)
+        order = np.argsort(distances, kind="stable")[:k]
+        return self.take(order)
+
+    def split_by_corpus(self) -> Dict[str, "RetrievalHits"]:
+        """Groups tagged hits by `corpus_id`, keeping their order; untagged hits are not returned."""
+        if self.corpus_ids is None:
+            return {}
+        groups: Dict[str, List[int]] = {}
+        for i, corpus_id in enumerate(self.corpus_ids):
+            groups.setdefault(corpus_id, []).append(i)
+        return {corpus_id: self.take(indices) for corpus_id, indices in groups.items()}
+
+    def mean_distance(self, missing: float = 1.0) -> Optional[float]:
+        if not len(self):
+            return None
+        return float(np.where(np.isnan(self.distances), missing, self.distances).mean())
+
+    def unique_sources(self) -> List[str]:
+        return sorted({uri for uri in self.source_uris if uri})
+
+    # -- tool boundary
+    def to_dicts(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The hits in the tools' result shape: text, source_uri, distance [, score, corpus_id, stale]."""
+        n = len(self) if limit is None else min(limit, len(self))
+        distances = self.distances[:n].tolist()
+        scores = self.scores[:n].tolist() if self.scores is not None else None
+        stale = self.stale[:n].tolist()
+        out = []
+        for i in range(n):
+            hit = {
+                "text": self.texts[i],
+                "source_uri": self.source_uris[i],
+                "distance": None if distances[i] != distances[i] else distances[i],
+            }
+            if scores is not None:
+                hit["score"] = scores[i]
+            if self.corpus_ids is not None:
+                hit["corpus_id"] = self.corpus_ids[i]
+            if stale[i]:
+                hit["stale"] = True
+            out.append(hit)
+        return out
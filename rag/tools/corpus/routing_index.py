@@ -0,0 +1,252 @@
+# ====================== CORPUS ROUTING INDEX =====================
+#
+# Lightweight local index used to pick candidate corpora for a question before running
+# full retrievals. Each corpus is summarised by the centroid of hashed bag-of-words vectors
+# of sample chunks plus a keyword signature; routing is one small matrix-vector product.
+
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import math
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Any, Iterable, List, Optional
+
+import numpy as np
+
+# Ensure parent directory is in path to allow imports if running as script or module
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+try:
+    from config import (
+        ROUTING_EMBEDDING_DIM,
+        ROUTING_KEYWORDS_PER_CORPUS,
+        ROUTING_KEYWORD_WEIGHT,
+        LOCAL_STATE_DIR,
+    )
+except ImportError:
+    try:
+        from rag.config import (
+            ROUTING_EMBEDDING_DIM,
+            ROUTING_KEYWORDS_PER_CORPUS,
+            ROUTING_KEYWORD_WEIGHT,
+            LOCAL_STATE_DIR,
+        )
+    except ImportError:
+        from ...config import (
+            ROUTING_EMBEDDING_DIM,
+            ROUTING_KEYWORDS_PER_CORPUS,
+            ROUTING_KEYWORD_WEIGHT,
+            LOCAL_STATE_DIR,
+        )
+
+logger = logging.getLogger(__name__)
+
+ROUTING_INDEX_PATH = os.path.join(LOCAL_STATE_DIR, "routing_index.npz")
+
+_WORD_RE = re.compile(r"[a-z0-9]{2,}")
+_STOPWORDS = frozenset(
+    "the and for are but not you all any can had her was one our out has have this that with from "
+    "they will would there their what which when where who how your into than then them these those "
+    "its also been being does did each may might must shall should some such very just only about "
+    "pdf docx txt html gs www com".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [w for w in _WORD_RE.findall((text or "").lower()) if w not in _STOPWORDS]
+
+
+def embed_terms(terms: Iterable[str], dim: int = ROUTING_EMBEDDING_DIM) -> np.ndarray:
+    """
+    Hashed bag-of-words vector (log term frequency, signed feature hashing), L2-normalised.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    counts = Counter(terms)
+    if not counts:
+        return vector
+    for term, count in counts.items():
+        h = zlib.crc32(term.encode("utf-8"))
+        vector[h % dim] += (1.0 if (h >> 31) & 1 else -1.0) * (1.0 + math.log(count))
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+class CorpusRoutingIndex:
+    """
+    Per-corpus summary vectors and keyword signatures kept in compact NumPy arrays.
+
+    `_sums` holds the running sum of chunk vectors per corpus (row i <-> `corpus_ids[i]`),
+    `_counts` the number of chunks summed, and `_centroids` the L2-normalised centroids used
+    for routing. Keyword signatures are the most frequent terms seen per corpus.
+    """
+
+    def __init__(self, path: Optional[str] = ROUTING_INDEX_PATH, dim: int = ROUTING_EMBEDDING_DIM):
+        self.path = path
+        self.dim = dim
+        self._lock = threading.Lock()
+        self.corpus_ids: List[str] = []
+        self._sums = np.zeros((0, dim), dtype=np.float32)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._centroids = np.zeros((0, dim), dtype=np.float32)
+        self._term_counts: Dict[str, Counter] = {}
+        self._keywords: List[frozenset] = []
+        if path and os.path.exists(path):
+            self.load()
+
+    # -- building
+    def add_texts(self, corpus_id: str, texts: Iterable[str]) -> int:
+        """Folds sample chunk texts of a corpus into its centroid and keyword signature."""
+        vectors = []
+        terms_seen: Counter = Counter()
+        for text in texts:
+            terms = tokenize(text)
+            if not terms:
+                continue
+            vectors.append(embed_terms(terms, self.dim))
+            terms_seen.update(set(terms))
+        if not vectors:
+            return 0
+
+        with self._lock:
+            if corpus_id not in self.corpus_ids:
+                self.corpus_ids.append(corpus_id)
+                self._sums = np.vstack([self._sums, np.zeros((1, self.dim), dtype=np.float32)])
+                self._counts = np.append(self._counts, 0)
+                self._term_counts[corpus_id] = Counter()
+            i = self.corpus_ids.index(corpus_id)
+            self._sums[i] += np.sum(vectors, axis=0)
+            self._counts[i] += len(vectors)
+            counter = self._term_counts[corpus_id]
+            counter.update(terms_seen)
+            if len(counter) > ROUTING_KEYWORDS_PER_CORPUS * 4:
+                self._term_counts[corpus_id] = Counter(dict(counter.most_common(ROUTING_KEYWORDS_PER_CORPUS * 2)))
+            self._rebuild()
+        return len(vectors)
+
+    def remove_corpus(self, corpus_id: str) -> None:
+        with self._lock:
+            if corpus_id not in self.corpus_ids:
+                return
+            i = self.corpus_ids.index(corpus_id)
+            del self.corpus_ids[i]
+            self._sums = np.delete(self._sums, i, axis=0)
+            self._counts = np.delete(self._counts, i)
+            self._term_counts.pop(corpus_id, None)
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        norms = np.linalg.norm(self._sums, axis=1, keepdims=True)
+        self._centroids = np.divide(self._sums, norms, out=np.zeros_like(self._sums), where=norms > 0)
+        self._keywords = [
+            frozenset(t for t, _ in self._term_counts.get(c, Counter()).most_common(ROUTING_KEYWORDS_PER_CORPUS))
+            for c in self.corpus_ids
+        ]
+
+    # -- routing
+    def route(self, query: str, top_n: int, candidates: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Returns up to `top_n` corpora ranked by blended centroid similarity and keyword overlap.
+        If `candidates` is given, only those corpus IDs are considered.
+        """
+        terms = tokenize(query)
+        q = embed_terms(terms, self.dim)
+        query_terms = set(terms)
+        with self._lock:
+            ids = self.corpus_ids
+            centroids = self._centroids
+            keywords = self._keywords
+        if not ids:
+            return []
+
+        similarity = centroids @ q
+        if query_terms:
+            overlap = np.fromiter((len(query_terms & kw) for kw in keywords), dtype=np.float32, count=len(ids))
+            overlap /= len(query_terms)
+        else:
+            overlap = np.zeros(len(ids), dtype=np.float32)
+        score = (1.0 - ROUTING_KEYWORD_WEIGHT) * similarity + ROUTING_KEYWORD_WEIGHT * overlap
+
+        if candidates is not None:
+            allowed = set(candidates)
+            mask = np.fromiter((c in allowed for c in ids), dtype=bool, count=len(ids))
+            score = np.where(mask, score, -np.inf)
+        n = min(top_n, int(np.isfinite(score).sum()))
+        if n <= 0:
+            return []
+        top = np.argpartition(-score, n - 1)[:n]
+        top = top[np.argsort(-score[top])]
+        return [
+            {"corpus_id": ids[i], "score": float(score[i]), "similarity": float(similarity[i]), "keyword_overlap": float(overlap[i])}
+            for i in top
+        ]
+
+    def __contains__(self, corpus_id: str) -> bool:
+        return corpus_id in self.corpus_ids
+
+    # -- persistence
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp.npz"
+            np.savez_compressed(
+                tmp_path,
+                corpus_ids=np.array(self.corpus_ids, dtype=str),
+                sums=self._sums,
+                counts=self._counts,
+                term_counts=np.array(json.dumps({c: dict(t) for c, t in self._term_counts.items()})),
+                saved_at=np.array(time.time()),
+            )
+            os.replace(tmp_path, self.path)
+
+    def load(self) -> None:
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                corpus_ids = [str(c) for c in data["corpus_ids"]]
+                sums = data["sums"].astype(np.float32)
+                counts = data["counts"].astype(np.int64)
+                term_counts = json.loads(str(data["term_counts"]))
+        except Exception as e:
+            logger.warning(f"Failed to load routing index from {self.path}: {e}")
+            return
+        if sums.shape[1:] != (self.dim,):
+            logger.warning(f"Ignoring routing index {self.path}: dimension {sums.shape[1:]} != {self.dim}")
+            return
+        with self._lock:
+            self.corpus_ids = corpus_ids
+            self._sums = sums
+            self._counts = counts
+            self._term_counts = {c: Counter(t) for c, t in term_counts.items()}
+            self._rebuild()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "corpora": len(self.corpus_ids),
+                "chunks_per_corpus": dict(zip(self.corpus_ids, (int(c) for c in self._counts))),
+                "dim": self.dim,
+                "bytes": int(self._centroids.nbytes + self._sums.nbytes),
+            }
+
+
+_index: Optional[CorpusRoutingIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_routing_index() -> CorpusRoutingIndex:
+    """Returns the process-wide routing index, loaded from LOCAL_STATE_DIR on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = CorpusRoutingIndex()
+    return _index
@@ -0,0 +1,436 @@
+# ====================== ESCALATION OUTBOX =====================
+#
+# Durable, non-blocking hand-off of live-agent escalations. escalate_to_live_agent writes the
+# hand-off record to a local SQLite outbox and returns the ticket ID at once; a background
+# dispatcher delivers pending records in batches to the configured sink (the ticketing / MCP
+# endpoint) and retries failed deliveries with exponential backoff. A slow or unavailable hand-off
+# service therefore never holds the customer's turn, and records survive a restart.
+#
+# Several processes may share the outbox file: a dispatcher claims a batch with a lease inside an
+# IMMEDIATE transaction, so each record is sent by one dispatcher at a time.
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+import urllib.request
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence
+
+# Ensure parent directory is in path to allow imports if running as script or module
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+try:
+    from config import (
+        LOCAL_STATE_DIR,
+        ESCALATION_SINK_URL,
+        ESCALATION_SINK_TIMEOUT_SECONDS,
+        ESCALATION_BATCH_SIZE,
+        ESCALATION_MAX_ATTEMPTS,
+        ESCALATION_RETRY_BASE_SECONDS,
+        ESCALATION_RETRY_MAX_SECONDS,
+        ESCALATION_RETENTION_DAYS,
+    )
+except ImportError:
+    try:
+        from rag.config import (
+            LOCAL_STATE_DIR,
+            ESCALATION_SINK_URL,
+            ESCALATION_SINK_TIMEOUT_SECONDS,
+            ESCALATION_BATCH_SIZE,
+            ESCALATION_MAX_ATTEMPTS,
+            ESCALATION_RETRY_BASE_SECONDS,
+            ESCALATION_RETRY_MAX_SECONDS,
+            ESCALATION_RETENTION_DAYS,
+        )
+    except ImportError:
+        from ...config import (
+            LOCAL_STATE_DIR,
+            ESCALATION_SINK_URL,
+            ESCALATION_SINK_TIMEOUT_SECONDS,
+            ESCALATION_BATCH_SIZE,
+            ESCALATION_MAX_ATTEMPTS,
+            ESCALATION_RETRY_BASE_SECONDS,
+            ESCALATION_RETRY_MAX_SECONDS,
+            ESCALATION_RETENTION_DAYS,
+        )
+
+try:
+    from tools.instrumentation.instrumentation_tools import percentile, registry
+except ImportError:
+    try:
+        from rag.tools.instrumentation.instrumentation_tools import percentile, registry
+    except ImportError:
+        from ..instrumentation.instrumentation_tools import percentile, registry
+
+logger = logging.getLogger(__name__)
+
+ESCALATION_OUTBOX_PATH = os.path.join(LOCAL_STATE_DIR, "escalation_outbox.sqlite3")
+# A claimed batch not finished within this time (dispatcher died) becomes due again
+CLAIM_LEASE_SECONDS = 120
+# Recent samples kept for the enqueue latency / delivery lag percentiles
+_SAMPLE_WINDOW = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    ticket_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    claimed_until REAL NOT NULL DEFAULT 0,
+    delivered_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (state, next_attempt_at);
+"""
+
+
+# ------------------------------------------------------------ sinks
+
+class EscalationSink:
+    """
+    Destination of escalation records. deliver() receives a batch of records and either returns
+    the ticket IDs it accepted (None = all of them) or raises, in which case the whole batch is
+    retried later.
+    """
+
+    name = "sink"
+
+    def deliver(self, records: List[Dict[str, Any]]) -> Optional[Sequence[str]]:
+        raise NotImplementedError
+
+
+class LogSink(EscalationSink):
+    """Logs the records; the default while no hand-off endpoint is configured."""
+
+    name = "log"
+
+    def deliver(self, records: List[Dict[str, Any]]) -> Optional[Sequence[str]]:
+        for record in records:
+            logger.info(f"Escalation {record['ticket_id']} ready for hand-off: {record.get('reason')}")
+        return None
+
+
+class HttpSink(EscalationSink):
+    """
+    POSTs {"escalations": [record, ...]} as JSON. A 2xx response accepts the batch; if its JSON
+    body has an "accepted" list of ticket IDs, only those count as delivered.
+    """
+
+    name = "http"
+
+    def __init__(self, url: str, timeout_seconds: float = ESCALATION_SINK_TIMEOUT_SECONDS, headers: Optional[Dict[str, str]] = None):
+        self.url = url
+        self.timeout_seconds = timeout_seconds
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+
+    def deliver(self, records: List[Dict[str, Any]]) -> Optional[Sequence[str]]:
+        body = json.dumps({"escalations": records}, default=str).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers=self.headers, method="POST")
+        # Non-2xx responses raise urllib.error.HTTPError
+        with urllib.request.urlopen(request, timeout=self.timeout_seconds) as response:
+            raw = response.read()
+        try:
+            accepted = json.loads(raw).get("accepted") if raw else None
+        except (ValueError, AttributeError):
+            accepted = None
+        return accepted if isinstance(accepted, list) else None
+
+
+def default_sink() -> EscalationSink:
+    return HttpSink(ESCALATION_SINK_URL) if ESCALATION_SINK_URL else LogSink()
+
+
+# ------------------------------------------------------------ outbox
+
+def _percentiles(samples: Sequence[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"p50": None, "p95": None, "max": None}
+    ordered = sorted(samples)
+    return {"p50": round(percentile(ordered, 50), 6), "p95": round(percentile(ordered, 95), 6), "max": round(ordered[-1], 6)}
+
+
+class EscalationOutbox:
+    """
+    SQLite-backed outbox with a background dispatcher.
+
+    Records move from "pending" to "delivered", or to "dead" after `max_attempts` failed
+    deliveries. Delivered and dead records are purged after ESCALATION_RETENTION_DAYS.
+    """
+
+    def __init__(
+        self,
+        path: str = ESCALATION_OUTBOX_PATH,
+        sink: Optional[EscalationSink] = None,
+        batch_size: int = ESCALATION_BATCH_SIZE,
+        max_attempts: int = ESCALATION_MAX_ATTEMPTS,
+        retry_base_seconds: float = ESCALATION_RETRY_BASE_SECONDS,
+        retry_max_seconds: float = ESCALATION_RETRY_MAX_SECONDS,
+    ):
+        self.path = path
+        self.sink = sink or default_sink()
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One connection shared by the tool threads and the dispatcher, serialised by a lock
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._enqueue_seconds: deque = deque(maxlen=_SAMPLE_WINDOW)
+        self._delivery_lag_seconds: deque = deque(maxlen=_SAMPLE_WINDOW)
+        self.enqueued = 0
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.dead = 0
+        self.batches_sent = 0
+
+    # -- producer side
+    def enqueue(self, record: Dict[str, Any]) -> str:
+        """Stores the record (must carry a `ticket_id`) and wakes the dispatcher; returns the ticket ID."""
+        started = time.perf_counter()
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO outbox (ticket_id, payload, state, enqueued_at, next_attempt_at) VALUES (?, ?, 'pending', ?, ?)",
+                (record["ticket_id"], json.dumps(record, default=str), now, now),
+            )
+            self.enqueued += 1
+            self._enqueue_seconds.append(time.perf_counter() - started)
+        self._wake.set()
+        return record["ticket_id"]
+
+    def get(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state, attempts, enqueued_at, delivered_at, last_error FROM outbox WHERE ticket_id = ?",
+                (ticket_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        state, attempts, enqueued_at, delivered_at, last_error = row
+        return {
+            "ticket_id": ticket_id,
+            "state": state,
+            "attempts": attempts,
+            "enqueued_at": enqueued_at,
+            "delivered_at": delivered_at,
+            "last_error": last_error,
+        }
+
+    # -- dispatcher side
+    def _claim(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT ticket_id, payload, attempts, enqueued_at FROM outbox "
+                    "WHERE state = 'pending' AND next_attempt_at <= ? AND claimed_until <= ? "
+                    "ORDER BY enqueued_at LIMIT ?",
+                    (now, now, self.batch_size),
+                ).fetchall()
+                self._db.executemany(
+                    "UPDATE outbox SET claimed_until = ? WHERE ticket_id = ?",
+                    [(now + CLAIM_LEASE_SECONDS, row[0]) for row in rows],
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return [
+            {"ticket_id": ticket_id, "record": json.loads(payload), "attempts": attempts, "enqueued_at": enqueued_at}
+            for ticket_id, payload, attempts, enqueued_at in rows
+        ]
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.retry_max_seconds, self.retry_base_seconds * (2 ** (attempts - 1)))
+        # Full jitter keeps many processes from retrying in lockstep
+        return random.uniform(delay / 2, delay)
+
+    def _settle(self, batch: List[Dict[str, Any]], accepted: Optional[Sequence[str]], error: Optional[str]) -> None:
+        now = time.time()
+        accepted_ids = {entry["ticket_id"] for entry in batch} if accepted is None and error is None else set(accepted or ())
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for entry in batch:
+                    ticket_id = entry["ticket_id"]
+                    if ticket_id in accepted_ids:
+                        self._db.execute(
+                            "UPDATE outbox SET state = 'delivered', delivered_at = ?, claimed_until = 0, "
+                            "attempts = attempts + 1, last_error = NULL WHERE ticket_id = ?",
+                            (now, ticket_id),
+                        )
+                        self.delivered += 1
+                        self._delivery_lag_seconds.append(now - entry["enqueued_at"])
+                        continue
+                    attempts = entry["attempts"] + 1
+                    dead = attempts >= self.max_attempts
+                    self._db.execute(
+                        "UPDATE outbox SET state = ?, attempts = ?, next_attempt_at = ?, claimed_until = 0, "
+                        "last_error = ? WHERE ticket_id = ?",
+                        (
+                            "dead" if dead else "pending",
+                            attempts,
+                            now + self._backoff(attempts),
+                            error or "Not accepted by the hand-off service",
+                            ticket_id,
+                        ),
+                    )
+                    self.failed_attempts += 1
+                    if dead:
+                        self.dead += 1
+                        logger.error(f"Escalation {ticket_id} could not be delivered after {attempts} attempts: {error}")
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def dispatch_once(self) -> int:
+        """Claims and sends one batch of due records; returns the number of records sent."""
+        batch = self._claim()
+        if not batch:
+            return 0
+        accepted, error = None, None
+        try:
+            accepted = self.sink.deliver([entry["record"] for entry in batch])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.warning(f"Escalation hand-off of {len(batch)} records failed: {error}")
+        self.batches_sent += 1
+        self._settle(batch, accepted, error)
+        return len(batch)
+
+    def _next_due_in(self) -> float:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MIN(MAX(next_attempt_at, claimed_until)) FROM outbox WHERE state = 'pending'"
+            ).fetchone()
+        return max(0.0, row[0] - now) if row and row[0] is not None else self.retry_max_seconds
+
+    def purge(self, retention_days: float = ESCALATION_RETENTION_DAYS) -> int:
+        cutoff = time.time() - retention_days * 86400
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM outbox WHERE state IN ('delivered', 'dead') AND enqueued_at < ?", (cutoff,)
+            )
+        return cursor.rowcount
+
+    def _run(self) -> None:
+        self.purge()
+        while not self._stop.is_set():
+            try:
+                if self.dispatch_once():
+                    continue
+                wait = self._next_due_in()
+            except Exception as e:
+                logger.exception(f"Escalation dispatcher error: {e}")
+                wait = self.retry_base_seconds
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def start(self) -> "EscalationOutbox":
+        """Starts the dispatcher thread (once); records left pending by an earlier run are sent too."""
+        with self._lock:
+            if self._dispatcher is None or not self._dispatcher.is_alive():
+                self._stop.clear()
+                self._dispatcher = threading.Thread(target=self._run, name="escalation-dispatcher", daemon=True)
+                self._dispatcher.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state").fetchall())
+            oldest = self._db.execute("SELECT MIN(enqueued_at) FROM outbox WHERE state = 'pending'").fetchone()[0]
+            enqueue_seconds = list(self._enqueue_seconds)
+            lag_seconds = list(self._delivery_lag_seconds)
+        return {
+            "sink": self.sink.name,
+            "pending": counts.get("pending", 0),
+            "delivered": counts.get("delivered", 0),
+            "dead": counts.get("dead", 0),
+            "oldest_pending_age_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "enqueued_total": self.enqueued,
+            "delivered_total": self.delivered,
+            "failed_attempts_total": self.failed_attempts,
+            "dead_total": self.dead,
+            "batches_sent": self.batches_sent,
+            "enqueue_seconds": _percentiles(enqueue_seconds),
+            "delivery_lag_seconds": _percentiles(lag_seconds),
+            "dispatcher_running": bool(self._dispatcher and self._dispatcher.is_alive()),
+        }
+
+
+_outbox: Optional[EscalationOutbox] = None
+_outbox_lock = threading.Lock()
+
+
+def get_escalation_outbox() -> EscalationOutbox:
+    """Returns the process-wide outbox with its dispatcher running, creating it on first use."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = EscalationOutbox().start()
+        return _outbox
+
+
+def get_escalation_outbox_stats() -> Dict[str, Any]:
+    """Queue depth, delivery counts, enqueue latency and delivery lag of the process-wide outbox."""
+    with _outbox_lock:
+        outbox = _outbox
+    # Do not create the outbox (and its SQLite file) just to report on it
+    return outbox.stats() if outbox is not None else {"sink": None, "pending": 0, "dispatcher_running": False}
+
+
+registry.describe("rag_escalation_outbox_pending", "gauge", "Escalations waiting in the outbox for delivery")
+registry.describe("rag_escalation_oldest_pending_seconds", "gauge", "Age of the oldest undelivered escalation")
+registry.describe("rag_escalation_delivered_total", "counter", "Escalations delivered to the hand-off service")
+registry.describe("rag_escalation_failed_attempts_total", "counter", "Failed escalation delivery attempts")
+registry.describe("rag_escalation_dead_total", "counter", "Escalations given up after the maximum number of attempts")
+registry.describe("rag_escalation_enqueue_seconds", "gauge", "Time for escalate_to_live_agent to write the outbox record (recent quantiles)")
+registry.describe("rag_escalation_delivery_lag_seconds", "gauge", "Time from enqueue to accepted delivery (recent quantiles)")
+
+
+def _collect_metrics() -> None:
+    stats = get_escalation_outbox_stats()
+    if stats["sink"] is None:
+        return
+    registry.set_gauge("rag_escalation_outbox_pending", stats["pending"])
+    registry.set_gauge("rag_escalation_oldest_pending_seconds", stats["oldest_pending_age_seconds"])
+    registry.set_counter("rag_escalation_delivered_total", stats["delivered_total"])
+    registry.set_counter("rag_escalation_failed_attempts_total", stats["failed_attempts_total"])
+    registry.set_counter("rag_escalation_dead_total", stats["dead_total"])
+    for name, key in (
+        ("rag_escalation_enqueue_seconds", "enqueue_seconds"),
+        ("rag_escalation_delivery_lag_seconds", "delivery_lag_seconds"),
+    ):
+        for quantile, value in stats[key].items():
+            if value is not None:
+                registry.set_gauge(name, value, {"quantile": quantile})
+
+
+registry.register_collector(_collect_metrics)
@@ -1,23 +1,33 @@
 from typing import Dict, Any
+import datetime
+
+try:
+    from tools.escalation.escalation_outbox import get_escalation_outbox
+except ImportError:
+    try:
+        from rag.tools.escalation.escalation_outbox import get_escalation_outbox
+    except ImportError:
+        from .escalation_outbox import get_escalation_outbox
 
 def escalate_to_live_agent(reason: str, context: str = "") -> Dict[str, Any]:
     """
     Escalates the current conversation to a live human agent.
     Use this when the user explicitly asks for a human or when the query is too complex to handle automatically.
-    
+
     Args:
         reason: The reason for escalation (e.g., "User request", "Complex query").
         context: Additional context or the specific query that triggered the escalation.
-        
+
     Returns:
-        A dictionary with the escalation status and mock ticket details.
+        A dictionary with the escalation status and ticket details. The hand-off record is queued
+        locally and delivered to the live-agent service in the background.
     """
     import random
     import string
-    
+
     ticket_id = "TKT-" + ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
     policy_id = "POL-" + ''.join(random.choices(string.digits, k=10))
-    
+
     # Mock MCP Data Sample
     mcp_data_sample = {
         "channel": "live_chat",
@@ -26,16 +36,33 @@ def escalate_to_live_agent(reason: str, context: str = "") -> Dict[str, Any]:
         "routing_queue": "general_inquiries",
         "system_metadata": {
             "source": "rag_agent_v4",
-            "handoff_timestamp": "2024-05-21T10:00:00Z" # In real scenario this would be dynamic
+            "handoff_timestamp": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
         }
     }
-    
+
+    # The record is written to the durable outbox; delivery happens on the dispatcher thread
+    try:
+        get_escalation_outbox().enqueue({
+            "ticket_id": ticket_id,
+            "policy_id": policy_id,
+            "reason": reason,
+            "context": context,
+            "mcp_data": mcp_data_sample,
+        })
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": str(e),
+            "message": f"Failed to record the escalation: {str(e)}"
+        }
+
     return {
         "status": "success",
         "message": "Your request has been escalated to a live agent.",
         "ticket_id": ticket_id,
         "policy_id": policy_id,
         "mcp_data_sample": mcp_data_sample,
+        "handoff_status": "queued",
         "estimated_wait_time": "5 minutes",
         "reason": reason,
         "context_captured": context
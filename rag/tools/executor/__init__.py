@@ -0,0 +1,29 @@
+from .managed_executor import (
+    get_executor,
+    run_blocking,
+    run_tool,
+    shutdown_executor,
+)
+from .single_flight import (
+    SingleFlight,
+    get_single_flight,
+    get_single_flight_stats,
+)
+from .resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CallTimeoutError,
+    ResilientCaller,
+    get_resilient_caller,
+    get_resilience_stats,
+)
+from .ingestion_scheduler import (
+    IngestionScheduler,
+    get_ingestion_scheduler,
+    get_ingestion_stats,
+)
+from .vertex_client import (
+    VertexClient,
+    get_vertex_client,
+    get_vertex_client_stats,
+)
@@ -0,0 +1,311 @@
+# ====================== INGESTION SCHEDULER =====================
+#
+# Process-wide embedding quota for import jobs. The embedding requests-per-minute quota belongs to
+# the project, but rag.import_files takes its rate per call, so two concurrent imports would each
+# ask for the whole quota and both get throttled.
+#
+# The scheduler admits at most INGESTION_MAX_CONCURRENT_JOBS jobs (highest priority first) and runs
+# every job as a sequence of batches. Before each batch the job is granted a rate: its priority-
+# weighted share of the project quota among the running jobs, limited by what the batches in
+# flight leave unallocated. Shares are therefore re-balanced at batch boundaries as jobs start
+# and finish.
+
+import os
+import sys
+import time
+import uuid
+import heapq
+import logging
+import itertools
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+# Ensure parent directory is in path to allow imports if running as script or module
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+try:
+    from config import (
+        RAG_PROJECT_EMBEDDING_REQUESTS_PER_MIN,
+        INGESTION_MAX_CONCURRENT_JOBS,
+        INGESTION_MIN_REQUESTS_PER_MIN,
+        INGESTION_PRIORITY_WEIGHTS,
+        INGESTION_JOB_HISTORY,
+    )
+except ImportError:
+    try:
+        from rag.config import (
+            RAG_PROJECT_EMBEDDING_REQUESTS_PER_MIN,
+            INGESTION_MAX_CONCURRENT_JOBS,
+            INGESTION_MIN_REQUESTS_PER_MIN,
+            INGESTION_PRIORITY_WEIGHTS,
+            INGESTION_JOB_HISTORY,
+        )
+    except ImportError:
+        from ...config import (
+            RAG_PROJECT_EMBEDDING_REQUESTS_PER_MIN,
+            INGESTION_MAX_CONCURRENT_JOBS,
+            INGESTION_MIN_REQUESTS_PER_MIN,
+            INGESTION_PRIORITY_WEIGHTS,
+            INGESTION_JOB_HISTORY,
+        )
+
+try:
+    from tools.instrumentation.instrumentation_tools import registry
+except ImportError:
+    try:
+        from rag.tools.instrumentation.instrumentation_tools import registry
+    except ImportError:
+        from ..instrumentation.instrumentation_tools import registry
+
+logger = logging.getLogger(__name__)
+
+# Order of INGESTION_PRIORITY_WEIGHTS is the admission order (first = most urgent)
+PRIORITIES = list(INGESTION_PRIORITY_WEIGHTS)
+
+
+class IngestionJob:
+    """Bookkeeping for one import job; read through IngestionScheduler.stats()."""
+
+    def __init__(self, label: str, priority: str, batches: int, items: int, rate_cap: Optional[int]):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.priority = priority
+        self.rank = PRIORITIES.index(priority)
+        self.weight = INGESTION_PRIORITY_WEIGHTS[priority]
+        self.rate_cap = rate_cap
+        self.batches_total = batches
+        self.batches_done = 0
+        self.items_total = items
+        self.items_done = 0
+        self.state = "queued"
+        self.current_rpm = 0
+        self.error: Optional[str] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._granted_rpm_seconds = 0.0
+        self._running_seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        running = (end - self.started_at) if self.started_at else 0.0
+        return {
+            "job_id": self.job_id,
+            "label": self.label,
+            "priority": self.priority,
+            "state": self.state,
+            "batches_done": self.batches_done,
+            "batches_total": self.batches_total,
+            "items_done": self.items_done,
+            "items_total": self.items_total,
+            "current_rpm": self.current_rpm,
+            # Time-weighted average of the rates granted to this job's batches
+            "average_rpm": round(self._granted_rpm_seconds / self._running_seconds, 1) if self._running_seconds else 0.0,
+            "items_per_min": round(60.0 * self.items_done / running, 2) if running else 0.0,
+            "queued_seconds": round((self.started_at or end) - self.submitted_at, 3),
+            "running_seconds": round(running, 3),
+            "error": self.error,
+        }
+
+
+class IngestionScheduler:
+    """
+    Shares one embedding requests-per-minute budget between concurrent import jobs.
+
+    run() blocks the calling thread until the job is admitted and all its batches are done.
+    Admission and rate grants are both served in (priority, arrival) order, so a hotfix job
+    queued behind a backfill is admitted first and a waiting grant cannot be overtaken.
+    """
+
+    def __init__(
+        self,
+        project_rpm: int = RAG_PROJECT_EMBEDDING_REQUESTS_PER_MIN,
+        max_concurrent_jobs: int = INGESTION_MAX_CONCURRENT_JOBS,
+        min_rpm: int = INGESTION_MIN_REQUESTS_PER_MIN,
+    ):
+        self.project_rpm = project_rpm
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.min_rpm = min(min_rpm, project_rpm)
+        self._cond = threading.Condition()
+        self._sequence = itertools.count()
+        self._admission: List = []  # heap of (rank, seq, job)
+        self._grants: List = []  # heap of (rank, seq, job) waiting for a batch rate
+        self._running: Dict[str, IngestionJob] = {}
+        self._allocated: Dict[str, int] = {}  # job_id -> rate of its batch in flight
+        self._history: deque = deque(maxlen=INGESTION_JOB_HISTORY)
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+
+    # ------------------------------------------------------------ scheduling
+
+    def _fair_share(self, job: IngestionJob) -> int:
+        total_weight = sum(j.weight for j in self._running.values())
+        share = int(self.project_rpm * job.weight / total_weight)
+        if job.rate_cap:
+            share = min(share, job.rate_cap)
+        return max(self.min_rpm, share)
+
+    def _admit(self, job: IngestionJob) -> None:
+        entry = (job.rank, next(self._sequence), job)
+        with self._cond:
+            heapq.heappush(self._admission, entry)
+            self._cond.notify_all()
+            while self._admission[0] is not entry or len(self._running) >= self.max_concurrent_jobs:
+                self._cond.wait()
+            heapq.heappop(self._admission)
+            self._running[job.job_id] = job
+            job.state = "running"
+            job.started_at = time.time()
+            self._cond.notify_all()
+
+    def _acquire(self, job: IngestionJob) -> int:
+        entry = (job.rank, next(self._sequence), job)
+        with self._cond:
+            heapq.heappush(self._grants, entry)
+            while True:
+                # Wait for the full share rather than starting a whole batch on leftovers: batches
+                # in flight only release capacity, since later grants queue behind this one
+                if self._grants[0] is entry:
+                    rate = min(self._fair_share(job), self.project_rpm)
+                    if self.project_rpm - sum(self._allocated.values()) >= rate:
+                        break
+                self._cond.wait()
+            heapq.heappop(self._grants)
+            self._allocated[job.job_id] = rate
+            job.current_rpm = rate
+            self._cond.notify_all()
+            return rate
+
+    def _release(self, job: IngestionJob, rate: int, seconds: float, items: int) -> None:
+        with self._cond:
+            self._allocated.pop(job.job_id, None)
+            job.current_rpm = 0
+            job._granted_rpm_seconds += rate * seconds
+            job._running_seconds += seconds
+            job.batches_done += 1
+            job.items_done += items
+            self._cond.notify_all()
+
+    def _finish(self, job: IngestionJob, error: Optional[BaseException]) -> None:
+        with self._cond:
+            self._running.pop(job.job_id, None)
+            job.finished_at = time.time()
+            if error is None:
+                job.state = "completed"
+                self.jobs_completed += 1
+            else:
+                job.state = "failed"
+                job.error = str(error)
+                self.jobs_failed += 1
+            self._history.append(job)
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------ public API
+
+    def run(
+        self,
+        label: str,
+        batches: List[List[Any]],
+        run_batch: Callable[[List[Any], int], Any],
+        priority: str = "normal",
+        rate_cap: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Runs `run_batch(batch, rpm)` for every batch under the shared quota.
+
+        Args:
+            label: Human-readable job name (e.g. the corpus ID)
+            batches: Work items split into batches; rates are re-balanced between batches
+            run_batch: Callable performing one batch at the granted requests-per-minute
+            priority: One of INGESTION_PRIORITY_WEIGHTS (e.g. "hotfix", "normal", "backfill")
+            rate_cap: Optional upper bound on this job's rate
+
+        Returns:
+            {"job": <job stats>, "results": [run_batch result per batch]}. Exceptions from
+            run_batch propagate after the job is marked failed.
+        """
+        if priority not in INGESTION_PRIORITY_WEIGHTS:
+            raise ValueError(f"Unknown priority '{priority}'. Use one of: {', '.join(PRIORITIES)}")
+        job = IngestionJob(label, priority, len(batches), sum(len(b) for b in batches), rate_cap)
+        self._admit(job)
+        results = []
+        try:
+            for batch in batches:
+                rate = self._acquire(job)
+                started = time.perf_counter()
+                try:
+                    results.append(run_batch(batch, rate))
+                finally:
+                    self._release(job, rate, time.perf_counter() - started, len(batch))
+        except BaseException as e:
+            self._finish(job, e)
+            raise
+        self._finish(job, None)
+        logger.info(f"Ingestion job {job.job_id} ({label}, {priority}) finished {job.batches_total} batches")
+        return {"job": job.to_dict(), "results": results}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            queued = sorted(self._admission)
+            running = list(self._running.values())
+            history = list(self._history)
+            allocated = sum(self._allocated.values())
+            return {
+                "project_rpm": self.project_rpm,
+                "allocated_rpm": allocated,
+                "queue_depth": len(queued),
+                "running_jobs": len(running),
+                "max_concurrent_jobs": self.max_concurrent_jobs,
+                "jobs_completed": self.jobs_completed,
+                "jobs_failed": self.jobs_failed,
+                "queued": [entry[2].to_dict() for entry in queued],
+                "running": [job.to_dict() for job in running],
+                "recent": [job.to_dict() for job in reversed(history)],
+            }
+
+
+_scheduler: Optional[IngestionScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_ingestion_scheduler() -> IngestionScheduler:
+    """Returns the process-wide ingestion scheduler, creating it on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = IngestionScheduler()
+        return _scheduler
+
+
+def get_ingestion_stats() -> Dict[str, Any]:
+    """Queue depth, quota allocation and per-job rates of the process-wide scheduler."""
+    return get_ingestion_scheduler().stats()
+
+
+registry.describe("rag_ingestion_queue_depth", "gauge", "Import jobs waiting for admission by the ingestion scheduler")
+registry.describe("rag_ingestion_running_jobs", "gauge", "Import jobs currently running")
+registry.describe("rag_ingestion_allocated_rpm", "gauge", "Embedding requests/min granted to import batches in flight, by priority")
+registry.describe("rag_ingestion_project_rpm", "gauge", "Project embedding quota shared by import jobs")
+registry.describe("rag_ingestion_jobs_total", "counter", "Finished import jobs by outcome")
+
+
+def _collect_metrics() -> None:
+    stats = get_ingestion_stats()
+    registry.set_gauge("rag_ingestion_queue_depth", stats["queue_depth"])
+    registry.set_gauge("rag_ingestion_running_jobs", stats["running_jobs"])
+    registry.set_gauge("rag_ingestion_project_rpm", stats["project_rpm"])
+    registry.set_counter("rag_ingestion_jobs_total", stats["jobs_completed"], {"status": "success"})
+    registry.set_counter("rag_ingestion_jobs_total", stats["jobs_failed"], {"status": "error"})
+    # Per priority rather than per job, to keep label cardinality bounded
+    allocated = {priority: 0 for priority in INGESTION_PRIORITY_WEIGHTS}
+    for job in stats["running"]:
+        allocated[job["priority"]] += job["current_rpm"]
+    for priority, rpm in allocated.items():
+        registry.set_gauge("rag_ingestion_allocated_rpm", rpm, {"priority": priority})
+
+
+registry.register_collector(_collect_metrics)
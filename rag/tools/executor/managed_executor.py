@@ -0,0 +1,128 @@
+# ====================== MANAGED EXECUTOR =====================
+
+import os
+import sys
+import atexit
+import asyncio
+import logging
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# Ensure parent directory is in path to allow imports if running as script or module
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+try:
+    from config import (
+        ASYNC_TOOL_MAX_WORKERS,
+        ASYNC_TOOL_DEFAULT_TIMEOUT_SECONDS,
+        ASYNC_TOOL_TIMEOUTS,
+        ASYNC_TOOL_MUTATING,
+    )
+except ImportError:
+    try:
+        from rag.config import (
+            ASYNC_TOOL_MAX_WORKERS,
+            ASYNC_TOOL_DEFAULT_TIMEOUT_SECONDS,
+            ASYNC_TOOL_TIMEOUTS,
+            ASYNC_TOOL_MUTATING,
+        )
+    except ImportError:
+        from ...config import (
+            ASYNC_TOOL_MAX_WORKERS,
+            ASYNC_TOOL_DEFAULT_TIMEOUT_SECONDS,
+            ASYNC_TOOL_TIMEOUTS,
+            ASYNC_TOOL_MUTATING,
+        )
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Returns the process-wide pool used to run blocking SDK calls off the event loop.
+    The pool is bounded so that a burst of slow calls cannot spawn unbounded threads.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=ASYNC_TOOL_MAX_WORKERS, thread_name_prefix="rag-tool")
+                atexit.register(shutdown_executor)
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def get_timeout(tool_name: str) -> Optional[float]:
+    """The configured timeout for the tool (<= 0 disables it)."""
+    timeout_seconds = ASYNC_TOOL_TIMEOUTS.get(tool_name, ASYNC_TOOL_DEFAULT_TIMEOUT_SECONDS)
+    return timeout_seconds if timeout_seconds and timeout_seconds > 0 else None
+
+
+async def run_blocking(func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """
+    Runs a blocking function on the managed executor and awaits it.
+
+    The caller's context variables are propagated to the worker thread. On timeout or
+    cancellation the awaiting coroutine is released immediately; the worker thread finishes
+    the in-flight SDK call in the background and its result is discarded.
+
+    Raises:
+        asyncio.TimeoutError: if the call does not finish within `timeout` seconds
+        asyncio.CancelledError: if the awaiting task is cancelled
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    future = loop.run_in_executor(get_executor(), functools.partial(context.run, func, *args, **kwargs))
+    try:
+        if timeout is None:
+            return await future
+        return await asyncio.wait_for(future, timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        future.cancel()
+        raise
+
+
+async def run_tool(tool_name: str, func: Callable, *args, **kwargs) -> Dict[str, Any]:
+    """
+    Runs a synchronous tool function through run_blocking with the tool's configured timeout.
+    Cancellation propagates to the caller.
+
+    A timed-out read returns the standard error response. A timed-out mutating tool
+    (ASYNC_TOOL_MUTATING) returns status "pending" instead: its SDK call is still running on the
+    worker thread and may yet succeed, so it must be checked rather than retried.
+    """
+    timeout = get_timeout(tool_name)
+    try:
+        return await run_blocking(func, *args, timeout=timeout, **kwargs)
+    except asyncio.TimeoutError:
+        logger.warning(f"{tool_name} timed out after {timeout}s")
+        if tool_name in ASYNC_TOOL_MUTATING:
+            return {
+                "status": "pending",
+                "message": (
+                    f"{tool_name} did not finish within {timeout} seconds and is still running in the "
+                    "background; it may still complete. Check the current state (e.g. get_corpus, "
+                    "list_files) before retrying."
+                )
+            }
+        return {
+            "status": "error",
+            "error_message": "timeout",
+            "message": f"{tool_name} timed out after {timeout} seconds"
+        }
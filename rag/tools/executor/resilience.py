@@ -0,0 +1,501 @@
+# ====================== RESILIENCE =====================
+#
+# Hedged requests and circuit breakers for blocking SDK calls.
+#
+# A call is started on a bounded pool; if it has not answered after the recent p95 latency,
+# one duplicate ("hedge") is sent and whichever answers first wins. Each key (e.g. corpus)
+# has a circuit breaker that opens once its recent error rate spikes; while open, calls fail
+# fast and the last good answer for the same request is served instead, if there is one.
+# Only timeouts and transient / server-side errors count against the breaker; client errors
+# (a missing corpus, an invalid argument) are raised without touching it.
+
+import os
+import sys
+import copy
+import time
+import atexit
+import logging
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# Ensure parent directory is in path to allow imports if running as script or module
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+try:
+    from config import (
+        RETRIEVAL_TIMEOUT_SECONDS,
+        RETRIEVAL_MAX_WORKERS,
+        RETRIEVAL_HEDGE_ENABLED,
+        RETRIEVAL_HEDGE_PERCENTILE,
+        RETRIEVAL_HEDGE_MIN_SAMPLES,
+        RETRIEVAL_HEDGE_DEFAULT_DELAY_SECONDS,
+        RETRIEVAL_HEDGE_MIN_DELAY_SECONDS,
+        RETRIEVAL_MAX_SPARE_IN_FLIGHT,
+        RETRIEVAL_LATENCY_WINDOW,
+        BREAKER_WINDOW,
+        BREAKER_MIN_CALLS,
+        BREAKER_ERROR_RATE,
+        BREAKER_CONSECUTIVE_FAILURES,
+        BREAKER_OPEN_SECONDS,
+        RETRIEVAL_DEGRADED_CACHE_SIZE,
+    )
+except ImportError:
+    try:
+        from rag.config import (
+            RETRIEVAL_TIMEOUT_SECONDS,
+            RETRIEVAL_MAX_WORKERS,
+            RETRIEVAL_HEDGE_ENABLED,
+            RETRIEVAL_HEDGE_PERCENTILE,
+            RETRIEVAL_HEDGE_MIN_SAMPLES,
+            RETRIEVAL_HEDGE_DEFAULT_DELAY_SECONDS,
+            RETRIEVAL_HEDGE_MIN_DELAY_SECONDS,
+            RETRIEVAL_MAX_SPARE_IN_FLIGHT,
+            RETRIEVAL_LATENCY_WINDOW,
+            BREAKER_WINDOW,
+            BREAKER_MIN_CALLS,
+            BREAKER_ERROR_RATE,
+            BREAKER_CONSECUTIVE_FAILURES,
+            BREAKER_OPEN_SECONDS,
+            RETRIEVAL_DEGRADED_CACHE_SIZE,
+        )
+    except ImportError:
+        from ...config import (
+            RETRIEVAL_TIMEOUT_SECONDS,
+            RETRIEVAL_MAX_WORKERS,
+            RETRIEVAL_HEDGE_ENABLED,
+            RETRIEVAL_HEDGE_PERCENTILE,
+            RETRIEVAL_HEDGE_MIN_SAMPLES,
+            RETRIEVAL_HEDGE_DEFAULT_DELAY_SECONDS,
+            RETRIEVAL_HEDGE_MIN_DELAY_SECONDS,
+            RETRIEVAL_MAX_SPARE_IN_FLIGHT,
+            RETRIEVAL_LATENCY_WINDOW,
+            BREAKER_WINDOW,
+            BREAKER_MIN_CALLS,
+            BREAKER_ERROR_RATE,
+            BREAKER_CONSECUTIVE_FAILURES,
+            BREAKER_OPEN_SECONDS,
+            RETRIEVAL_DEGRADED_CACHE_SIZE,
+        )
+
+try:
+    from tools.instrumentation.instrumentation_tools import percentile, registry
+except ImportError:
+    try:
+        from rag.tools.instrumentation.instrumentation_tools import percentile, registry
+    except ImportError:
+        from ..instrumentation.instrumentation_tools import percentile, registry
+
+# google-api-core ships with the Vertex AI SDK; without it only timeouts count as failures
+try:
+    from google.api_core import exceptions as google_exceptions
+    _TRANSIENT_ERRORS: Tuple[type, ...] = (
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.InternalServerError,
+    )
+except ImportError:
+    _TRANSIENT_ERRORS = ()
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is rejected because its circuit breaker is open."""
+
+
+class CallTimeoutError(TimeoutError):
+    """Raised when neither the call nor its hedge answered within the timeout."""
+
+
+def is_breaker_failure(error: BaseException) -> bool:
+    """
+    Whether an error says the backend is unhealthy: a timeout or a transient / server error
+    (unavailable, deadline exceeded, resource exhausted, internal). Client errors such as
+    NotFound or InvalidArgument would fail again on any healthy backend, so they do not count.
+    """
+    return isinstance(error, (TimeoutError, ConnectionError) + _TRANSIENT_ERRORS)
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies with nearest-rank percentiles."""
+
+    def __init__(self, window: int = RETRIEVAL_LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            ordered = sorted(self._samples)
+        return percentile(ordered, pct) if ordered else None
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker over the last `window` outcomes.
+
+    closed    -> calls pass; opens once at least `min_calls` outcomes are recorded and the
+                 share of failures reaches `error_rate`, or after `consecutive_failures`
+                 failures in a row (so a long run of earlier successes cannot mask an outage)
+    open      -> calls are rejected for `open_seconds`
+    half_open -> one probe call passes; success closes the breaker, failure re-opens it
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        window: int = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        error_rate: float = BREAKER_ERROR_RATE,
+        consecutive_failures: int = BREAKER_CONSECUTIVE_FAILURES,
+        open_seconds: float = BREAKER_OPEN_SECONDS
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.consecutive_failures = consecutive_failures
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._outcomes: deque = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._failure_streak = 0
+        self.state = self.CLOSED
+        self.opens = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                if success:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                    self._failure_streak = 0
+                    logger.info(f"Circuit breaker {self.name} closed")
+                else:
+                    self._open()
+                return
+            self._outcomes.append(success)
+            self._failure_streak = 0 if success else self._failure_streak + 1
+            failures = sum(1 for ok in self._outcomes if not ok)
+            if self.state == self.CLOSED and (
+                self._failure_streak >= self.consecutive_failures
+                or (len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate)
+            ):
+                self._open()
+
+    def release(self) -> None:
+        """Ends a call without recording an outcome (e.g. a client error); frees a half-open probe."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._failure_streak = 0
+        self.opens += 1
+        logger.warning(f"Circuit breaker {self.name} opened for {self.open_seconds}s")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            failures = sum(1 for ok in self._outcomes if not ok)
+            return {
+                "state": self.state,
+                "opens": self.opens,
+                "recent_calls": len(self._outcomes),
+                "recent_error_rate": round(failures / len(self._outcomes), 3) if self._outcomes else 0.0,
+            }
+
+
+class ResilientCaller:
+    """
+    Runs blocking calls with a timeout, one latency-based hedge and a circuit breaker per key.
+
+    `call()` returns `(result, degraded)`; `degraded` is True when the breaker was open and the
+    last good result for the same `cache_key` was served instead of calling out.
+
+    Attempts that can no longer be cancelled once the call is decided (timed out, or lost to the
+    other attempt) keep their worker until they return. Together with running hedges they are
+    the "spare" attempts; no hedge is sent while `max_spare_in_flight` of them are running, so
+    hedging cannot take over the pool.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int = RETRIEVAL_MAX_WORKERS,
+        max_spare_in_flight: int = RETRIEVAL_MAX_SPARE_IN_FLIGHT
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_spare_in_flight = max_spare_in_flight
+        self._spare: set = set()
+        self.latency = LatencyTracker()
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._cache: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.counts = {
+            "requests": 0,
+            "hedges_sent": 0,
+            "hedges_skipped": 0,
+            "hedge_wins": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "client_errors": 0,
+            "short_circuited": 0,
+            "degraded_responses": 0,
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] += 1
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"rag-{self.name}")
+                atexit.register(self.shutdown)
+            return self._pool
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(f"{self.name}:{key}")
+            return breaker
+
+    def hedge_delay(self) -> float:
+        """Current hedge delay: the recent latency percentile, or the default until enough samples exist."""
+        if len(self.latency) < RETRIEVAL_HEDGE_MIN_SAMPLES:
+            return RETRIEVAL_HEDGE_DEFAULT_DELAY_SECONDS
+        return max(RETRIEVAL_HEDGE_MIN_DELAY_SECONDS, self.latency.percentile(RETRIEVAL_HEDGE_PERCENTILE))
+
+    # -- degraded-answer cache
+    def _cache_put(self, cache_key: Hashable, result: Any) -> None:
+        value = copy.deepcopy(result)
+        with self._lock:
+            self._cache[cache_key] = value
+            self._cache.move_to_end(cache_key)
+            while len(self._cache) > RETRIEVAL_DEGRADED_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def _cache_get(self, cache_key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._cache.get(cache_key)
+        return copy.deepcopy(value) if value is not None else None
+
+    # -- execution
+    def _attempt(self, func: Callable, args: Tuple, kwargs: Dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.latency.record(time.perf_counter() - started)
+        return result
+
+    def _submit(self, func: Callable, args: Tuple, kwargs: Dict[str, Any]):
+        # Each attempt runs in its own copy of the caller's context (metrics attribution etc.)
+        return self._get_pool().submit(contextvars.copy_context().run, self._attempt, func, args, kwargs)
+
+    def _track_spare(self, future) -> None:
+        with self._lock:
+            self._spare.add(future)
+        # Runs at once if the attempt already finished, so it must not be called under the lock
+        future.add_done_callback(self._untrack_spare)
+
+    def _untrack_spare(self, future) -> None:
+        with self._lock:
+            self._spare.discard(future)
+
+    def _abandon(self, futures) -> None:
+        # Attempts already running cannot be cancelled; they keep a worker until they return
+        for future in futures:
+            if not future.cancel():
+                self._track_spare(future)
+
+    def _hedged(self, func: Callable, args: Tuple, kwargs: Dict[str, Any], timeout: Optional[float]) -> Any:
+        deadline = time.monotonic() + timeout if timeout else None
+        primary = self._submit(func, args, kwargs)
+        pending = {primary}
+
+        if RETRIEVAL_HEDGE_ENABLED:
+            delay = self.hedge_delay()
+            if deadline is not None:
+                delay = min(delay, max(0.0, deadline - time.monotonic()))
+            done, _ = wait(pending, timeout=delay)
+            if not done and (deadline is None or time.monotonic() < deadline):
+                with self._lock:
+                    spare_full = len(self._spare) >= self.max_spare_in_flight
+                if spare_full:
+                    self._count("hedges_skipped")
+                else:
+                    hedge = self._submit(func, args, kwargs)
+                    self._track_spare(hedge)
+                    pending.add(hedge)
+                    self._count("hedges_sent")
+
+        error: Optional[BaseException] = None
+        while pending:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self._count("hedge_wins")
+                    self._abandon(pending)
+                    return future.result()
+                error = future.exception()
+        if pending:
+            # The worker threads finish (or hang) in the background; their results are discarded
+            self._abandon(pending)
+            self._count("timeouts")
+            raise CallTimeoutError(f"{self.name} timed out after {timeout} seconds")
+        raise error
+
+    def call(
+        self,
+        key: str,
+        cache_key: Hashable,
+        func: Callable,
+        *args,
+        timeout: Optional[float] = RETRIEVAL_TIMEOUT_SECONDS,
+        **kwargs
+    ) -> Tuple[Any, bool]:
+        self._count("requests")
+        breaker = self.breaker(key)
+        if not breaker.allow():
+            self._count("short_circuited")
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                self._count("degraded_responses")
+                return cached, True
+            raise CircuitOpenError(f"Circuit breaker open for {key}; failing fast after repeated errors")
+
+        try:
+            result = self._hedged(func, args, kwargs, timeout)
+        except BaseException as e:
+            if not is_breaker_failure(e):
+                # The backend answered; the request itself was wrong
+                self._count("client_errors")
+                breaker.release()
+                raise
+            self._count("errors")
+            breaker.record(False)
+            raise
+        breaker.record(True)
+        self._cache_put(cache_key, result)
+        return result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self.counts)
+            counts["spare_in_flight"] = len(self._spare)
+            breakers = list(self._breakers.items())
+        counts["hedge_delay_seconds"] = round(self.hedge_delay(), 4)
+        counts["latency_samples"] = len(self.latency)
+        counts["breakers"] = {key: breaker.stats() for key, breaker in breakers}
+        return counts
+
+
+_callers: Dict[str, ResilientCaller] = {}
+_callers_lock = threading.Lock()
+
+
+def get_resilient_caller(name: str) -> ResilientCaller:
+    """Returns the process-wide resilient caller `name`, creating it on first use."""
+    with _callers_lock:
+        caller = _callers.get(name)
+        if caller is None:
+            caller = _callers[name] = ResilientCaller(name)
+        return caller
+
+
+def get_resilience_stats() -> Dict[str, Dict[str, Any]]:
+    """Hedge, timeout and circuit breaker statistics of every resilient caller."""
+    with _callers_lock:
+        callers = list(_callers.values())
+    return {caller.name: caller.stats() for caller in callers}
+
+
+registry.describe("rag_resilience_requests_total", "counter", "Calls made through a resilient caller")
+registry.describe("rag_resilience_hedges_total", "counter", "Hedged duplicate requests sent after the latency percentile elapsed")
+registry.describe("rag_resilience_hedges_skipped_total", "counter", "Hedges not sent because the spare-attempt cap was reached")
+registry.describe("rag_resilience_hedge_wins_total", "counter", "Calls answered first by the hedged duplicate")
+registry.describe("rag_resilience_timeouts_total", "counter", "Calls where neither attempt answered within the timeout")
+registry.describe("rag_resilience_errors_total", "counter", "Calls that failed with a timeout or transient / server error (counted by the breaker)")
+registry.describe("rag_resilience_client_errors_total", "counter", "Calls that failed with a client error (not counted by the breaker)")
+registry.describe("rag_resilience_short_circuited_total", "counter", "Calls rejected by an open circuit breaker")
+registry.describe("rag_resilience_degraded_total", "counter", "Calls answered from the last good result while a breaker was open")
+registry.describe("rag_resilience_spare_in_flight", "gauge", "Hedged and abandoned attempts still holding a worker")
+registry.describe("rag_resilience_hedge_delay_seconds", "gauge", "Current hedge delay (recent latency percentile)")
+registry.describe("rag_circuit_breaker_state", "gauge", "Circuit breaker state per key (0 closed, 1 half-open, 2 open)")
+registry.describe("rag_circuit_breaker_opens_total", "counter", "Times a circuit breaker opened")
+registry.describe("rag_circuit_breaker_error_rate", "gauge", "Error rate over the breaker's recent window")
+
+_BREAKER_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+
+def _collect_metrics() -> None:
+    for target, stats in get_resilience_stats().items():
+        labels = {"target": target}
+        for name, key in (
+            ("rag_resilience_requests_total", "requests"),
+            ("rag_resilience_hedges_total", "hedges_sent"),
+            ("rag_resilience_hedges_skipped_total", "hedges_skipped"),
+            ("rag_resilience_hedge_wins_total", "hedge_wins"),
+            ("rag_resilience_timeouts_total", "timeouts"),
+            ("rag_resilience_errors_total", "errors"),
+            ("rag_resilience_client_errors_total", "client_errors"),
+            ("rag_resilience_short_circuited_total", "short_circuited"),
+            ("rag_resilience_degraded_total", "degraded_responses"),
+        ):
+            registry.set_counter(name, stats[key], labels)
+        registry.set_gauge("rag_resilience_spare_in_flight", stats["spare_in_flight"], labels)
+        registry.set_gauge("rag_resilience_hedge_delay_seconds", stats["hedge_delay_seconds"], labels)
+        for key, breaker in stats["breakers"].items():
+            breaker_labels = {"target": target, "key": key}
+            registry.set_gauge("rag_circuit_breaker_state", _BREAKER_STATE_VALUES[breaker["state"]], breaker_labels)
+            registry.set_counter("rag_circuit_breaker_opens_total", breaker["opens"], breaker_labels)
+            registry.set_gauge("rag_circuit_breaker_error_rate", breaker["recent_error_rate"], breaker_labels)
+
+
+registry.register_collector(_collect_metrics)
@@ -0,0 +1,142 @@
+# ====================== SINGLE FLIGHT =====================
+#
+# Request coalescing: concurrent callers asking for the same key share one in-flight call.
+# Used around Vertex AI retrievals and listings so that several sessions (or evaluation
+# workers) asking the same question of the same corpus at the same moment cost one RPC.
+
+import os
+import sys
+import copy
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Ensure parent directory is in path to allow imports if running as script or module
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+try:
+    from tools.instrumentation.instrumentation_tools import registry
+except ImportError:
+    try:
+        from rag.tools.instrumentation.instrumentation_tools import registry
+    except ImportError:
+        from ..instrumentation.instrumentation_tools import registry
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Executes at most one call per key at a time; callers arriving while a call for their key
+    is running wait for it and receive its result (or exception) instead of issuing their own.
+
+    Nothing is cached: once a call finishes, the next caller with the same key starts a new one.
+    Waiters receive a deep copy of the result so that callers which post-process results in
+    place do not see each other's changes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.requests = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            self.requests += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                del self._calls[key]
+            call.error = e
+            call.done.set()
+            raise
+
+        with self._lock:
+            # No caller can join once the key is removed, so `waiters` is final here
+            del self._calls[key]
+            waiters = call.waiters
+        if waiters:
+            call.result = copy.deepcopy(result)
+            logger.debug(f"{self.name}: {waiters} request(s) coalesced into one call")
+        call.done.set()
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Returns the process-wide coalescing group `name`, creating it on first use."""
+    with _groups_lock:
+        group = _groups.get(name)
+        if group is None:
+            group = _groups[name] = SingleFlight(name)
+        return group
+
+
+def get_single_flight_stats() -> Dict[str, Dict[str, int]]:
+    """Request, execution and coalesced counts of every coalescing group."""
+    with _groups_lock:
+        groups = list(_groups.values())
+    return {group.name: group.stats() for group in groups}
+
+
+registry.describe("rag_singleflight_requests_total", "counter", "Requests entering a coalescing group")
+registry.describe("rag_singleflight_executions_total", "counter", "Downstream calls actually made by a coalescing group")
+registry.describe("rag_singleflight_coalesced_total", "counter", "Requests served by another caller's in-flight call")
+registry.describe("rag_singleflight_in_flight", "gauge", "Distinct calls currently in flight per coalescing group")
+
+
+def _collect_metrics() -> None:
+    for group, stats in get_single_flight_stats().items():
+        labels = {"group": group}
+        registry.set_counter("rag_singleflight_requests_total", stats["requests"], labels)
+        registry.set_counter("rag_singleflight_executions_total", stats["executions"], labels)
+        registry.set_counter("rag_singleflight_coalesced_total", stats["coalesced"], labels)
+        registry.set_gauge("rag_singleflight_in_flight", stats["in_flight"], labels)
+
+
+registry.register_collector(_collect_metrics)
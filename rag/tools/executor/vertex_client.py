@@ -0,0 +1,266 @@
+# ====================== VERTEX CLIENT =====================
+#
+# Process-wide Vertex AI connection state. vertexai.init only records configuration, so without
+# a warm-up the first retrieval after a deploy or scale-up also pays for the credential lookup,
+# the OAuth token fetch, DNS and the TLS / HTTP2 handshake.
+#
+# VertexClient owns the credentials passed to vertexai.init (every SDK call uses that object) and
+# keeps one RAG data-service and one retrieval-service client open for the life of the process.
+# The SDK builds a client per call, but with the same channel arguments, so its channels reuse
+# the gRPC connections these clients keep open. warm_up() fetches the token, opens both channels
+# and makes one cheap metadata call; a background thread then renews the token well before
+# google-auth would refresh it inside a request.
+
+import os
+import sys
+import time
+import logging
+import threading
+import datetime
+from typing import Any, Dict, Optional
+
+import vertexai
+
+# Ensure parent directory is in path to allow imports if running as script or module
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+try:
+    from config import (
+        PROJECT_ID,
+        LOCATION,
+        VERTEX_TOKEN_REFRESH_MARGIN_SECONDS,
+        VERTEX_TOKEN_RETRY_SECONDS,
+    )
+except ImportError:
+    try:
+        from rag.config import (
+            PROJECT_ID,
+            LOCATION,
+            VERTEX_TOKEN_REFRESH_MARGIN_SECONDS,
+            VERTEX_TOKEN_RETRY_SECONDS,
+        )
+    except ImportError:
+        from ...config import (
+            PROJECT_ID,
+            LOCATION,
+            VERTEX_TOKEN_REFRESH_MARGIN_SECONDS,
+            VERTEX_TOKEN_RETRY_SECONDS,
+        )
+
+try:
+    from tools.instrumentation.instrumentation_tools import registry
+except ImportError:
+    try:
+        from rag.tools.instrumentation.instrumentation_tools import registry
+    except ImportError:
+        from ..instrumentation.instrumentation_tools import registry
+
+logger = logging.getLogger(__name__)
+
+_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+
+class VertexClient:
+    """
+    Credentials, long-lived RAG clients and warm-up for one project / location.
+
+    initialize() is cheap and idempotent (credential lookup + vertexai.init). warm_up() does the
+    network work and may be called again, e.g. after a long idle period. start() runs the warm-up
+    and the token refresher on daemon threads so that callers are never blocked by them.
+    """
+
+    def __init__(
+        self,
+        project: str = PROJECT_ID,
+        location: str = LOCATION,
+        refresh_margin_seconds: float = VERTEX_TOKEN_REFRESH_MARGIN_SECONDS,
+        retry_seconds: float = VERTEX_TOKEN_RETRY_SECONDS,
+    ):
+        self.project = project
+        self.location = location
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.retry_seconds = retry_seconds
+        self.credentials: Any = None
+        self.data_client: Any = None
+        self.retrieval_client: Any = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._warm = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+        self._initialized = False
+        self.warm_up_steps: Dict[str, float] = {}
+        self.warm_up_error: Optional[str] = None
+        self.token_refreshes = 0
+        self.token_refresh_failures = 0
+        self.last_refresh_error: Optional[str] = None
+
+    # ------------------------------------------------------------ setup
+
+    def initialize(self) -> None:
+        """Loads the application default credentials and initialises the Vertex AI SDK with them."""
+        with self._lock:
+            if self._initialized:
+                return
+            try:
+                import google.auth
+                self.credentials, _ = google.auth.default(scopes=_SCOPES)
+            except Exception as e:
+                # Keep the SDK's lazy credential lookup; warm-up and refresh are skipped
+                logger.warning(f"Vertex AI credentials not available, skipping warm-up: {e}")
+                self.credentials = None
+            vertexai.init(project=self.project, location=self.location, credentials=self.credentials)
+            self._initialized = True
+
+    def _refresh_token(self) -> None:
+        from google.auth.transport.requests import Request
+        with self._refresh_lock:
+            self.credentials.refresh(Request())
+            self.token_refreshes += 1
+
+    def _open_clients(self) -> None:
+        # Built exactly like the SDK's per-call clients, so their channels share the connection
+        from vertexai.preview.rag.utils import _gapic_utils
+        self.data_client = _gapic_utils.create_rag_data_service_client()
+        self.retrieval_client = _gapic_utils.create_rag_service_client()
+
+    def _metadata_call(self) -> None:
+        # One small unary call: resolves DNS and completes the TLS / HTTP2 handshake
+        parent = f"projects/{self.project}/locations/{self.location}"
+        self.data_client.list_rag_corpora(request={"parent": parent, "page_size": 1})
+
+    def warm_up(self) -> Dict[str, Any]:
+        """
+        Fetches an access token, opens the RAG clients and makes one metadata call.
+
+        Returns:
+            The per-step durations in seconds, or the error that stopped the warm-up.
+        """
+        self.initialize()
+        if self.credentials is None:
+            return self.stats()
+        steps = self.warm_up_steps = {}
+        try:
+            for step, action in (
+                ("token", self._refresh_token),
+                ("channel", self._open_clients),
+                ("metadata_call", self._metadata_call),
+            ):
+                started = time.perf_counter()
+                action()
+                steps[step] = round(time.perf_counter() - started, 4)
+            self.warm_up_error = None
+            self._warm.set()
+            logger.info(f"Vertex AI warm-up finished: {steps}")
+        except Exception as e:
+            self.warm_up_error = str(e)
+            logger.warning(f"Vertex AI warm-up failed after {steps}: {e}")
+        return self.stats()
+
+    # ------------------------------------------------------------ background refresh
+
+    def _seconds_to_expiry(self) -> Optional[float]:
+        expiry = getattr(self.credentials, "expiry", None)
+        if expiry is None:
+            return None
+        # google-auth stores expiry as a naive UTC datetime
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return (expiry - now).total_seconds()
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.is_set():
+            remaining = self._seconds_to_expiry()
+            if remaining is not None and remaining > self.refresh_margin_seconds:
+                self._stop.wait(remaining - self.refresh_margin_seconds)
+                continue
+            try:
+                self._refresh_token()
+                self.last_refresh_error = None
+                if self._seconds_to_expiry() is None:
+                    # Credentials without an expiry never need a proactive refresh
+                    return
+            except Exception as e:
+                self.token_refresh_failures += 1
+                self.last_refresh_error = str(e)
+                logger.warning(f"Vertex AI token refresh failed, retrying in {self.retry_seconds}s: {e}")
+                self._stop.wait(self.retry_seconds)
+
+    def start(self, warm_up: bool = True) -> None:
+        """Initialises the SDK and starts the warm-up and token refresher threads (once)."""
+        self.initialize()
+        with self._lock:
+            if self.credentials is None or self._refresher is not None:
+                return
+
+            def run() -> None:
+                if warm_up:
+                    self.warm_up()
+                self._refresh_loop()
+
+            self._refresher = threading.Thread(target=run, name="vertex-token-refresher", daemon=True)
+            self._refresher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def wait_until_warm(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until a warm-up has succeeded (or the timeout passes); returns whether it did."""
+        return self._warm.wait(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        remaining = self._seconds_to_expiry() if self.credentials is not None else None
+        return {
+            "project": self.project,
+            "location": self.location,
+            "credentials": type(self.credentials).__name__ if self.credentials is not None else None,
+            "warm": self._warm.is_set(),
+            "warm_up_steps": dict(self.warm_up_steps),
+            "warm_up_error": self.warm_up_error,
+            "token_expires_in_seconds": round(remaining, 1) if remaining is not None else None,
+            "token_refreshes": self.token_refreshes,
+            "token_refresh_failures": self.token_refresh_failures,
+            "last_refresh_error": self.last_refresh_error,
+            "refresher_running": bool(self._refresher and self._refresher.is_alive()),
+        }
+
+
+_client: Optional[VertexClient] = None
+_client_lock = threading.Lock()
+
+
+def get_vertex_client() -> VertexClient:
+    """Returns the process-wide Vertex AI client holder, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = VertexClient()
+        return _client
+
+
+def get_vertex_client_stats() -> Dict[str, Any]:
+    """Warm-up timings and token state of the process-wide Vertex AI client."""
+    return get_vertex_client().stats()
+
+
+registry.describe("rag_vertex_warm", "gauge", "1 once the Vertex AI warm-up (token, channels, metadata call) has succeeded")
+registry.describe("rag_vertex_warm_up_seconds", "gauge", "Duration of each Vertex AI warm-up step")
+registry.describe("rag_vertex_token_expiry_seconds", "gauge", "Seconds until the Vertex AI access token expires")
+registry.describe("rag_vertex_token_refreshes_total", "counter", "Access token refreshes made by the warm-up and the background refresher")
+registry.describe("rag_vertex_token_refresh_failures_total", "counter", "Failed background access token refreshes")
+
+
+def _collect_metrics() -> None:
+    stats = get_vertex_client_stats()
+    registry.set_gauge("rag_vertex_warm", 1 if stats["warm"] else 0)
+    for step, seconds in stats["warm_up_steps"].items():
+        registry.set_gauge("rag_vertex_warm_up_seconds", seconds, {"step": step})
+    if stats["token_expires_in_seconds"] is not None:
+        registry.set_gauge("rag_vertex_token_expiry_seconds", stats["token_expires_in_seconds"])
+    registry.set_counter("rag_vertex_token_refreshes_total", stats["token_refreshes"])
+    registry.set_counter("rag_vertex_token_refresh_failures_total", stats["token_refresh_failures"])
+
+
+registry.register_collector(_collect_metrics)
@@ -0,0 +1,10 @@
+from .instrumentation_tools import (
+    registry,
+    instrument_tool,
+    instrument_downstream,
+    install_downstream_instrumentation,
+    export_prometheus_text,
+    start_metrics_server,
+    start_configured_exporters,
+    FileExporter,
+)
@@ -0,0 +1,481 @@
+# ====================== INSTRUMENTATION TOOLS =====================
+
+import os
+import sys
+import json
+import math
+import atexit
+import time
+import bisect
+import logging
+import threading
+import functools
+import contextvars
+import inspect
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, List, Sequence, Tuple, Callable
+
+# Ensure parent directory is in path to allow imports if running as script or module
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+try:
+    from config import (
+        METRICS_EXPORT_DIR,
+        METRICS_EXPORT_INTERVAL_SECONDS,
+        METRICS_HTTP_PORT,
+        METRICS_LATENCY_BUCKETS,
+        METRICS_PAYLOAD_BUCKETS,
+        EVAL_SHARD_WORKER,
+    )
+except ImportError:
+    try:
+        from rag.config import (
+            METRICS_EXPORT_DIR,
+            METRICS_EXPORT_INTERVAL_SECONDS,
+            METRICS_HTTP_PORT,
+            METRICS_LATENCY_BUCKETS,
+            METRICS_PAYLOAD_BUCKETS,
+            EVAL_SHARD_WORKER,
+            )
+    except ImportError:
+        from ...config import (
+            METRICS_EXPORT_DIR,
+            METRICS_EXPORT_INTERVAL_SECONDS,
+            METRICS_HTTP_PORT,
+            METRICS_LATENCY_BUCKETS,
+            METRICS_PAYLOAD_BUCKETS,
+            EVAL_SHARD_WORKER,
+            )
+
+logger = logging.getLogger(__name__)
+
+# Name of the agent tool currently executing in this thread / task, used to attribute downstream calls
+_current_tool: contextvars.ContextVar = contextvars.ContextVar("rag_current_tool", default=None)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted sequence: the smallest value with at least
+    `pct` percent of the values at or below it (0.0 for an empty sequence).
+    """
+    if not sorted_values:
+        return 0.0
+    # pct * n first keeps exact products such as 95 * 20 / 100 from rounding up
+    rank = min(len(sorted_values), max(1, math.ceil(pct * len(sorted_values) / 100.0)))
+    return sorted_values[rank - 1]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    items = list(key) + sorted((extra or {}).items())
+    if not items:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in items)
+    return "{" + body + "}"
+
+
+class _Histogram:
+    """Fixed-bucket histogram compatible with the Prometheus exposition format."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Thread-safe in-process store of counters, gauges and histograms.
+    Other modules register their own metrics here so that a single exporter covers everything;
+    modules that keep their own statistics register a collector that copies them in before
+    every export (set_counter for running totals, set_gauge for current values).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._histogram_buckets: Dict[str, Tuple[float, ...]] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def describe(self, name: str, metric_type: str, help_text: str) -> None:
+        self._help[name] = (metric_type, help_text)
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 1.0) -> None:
+        key = _label_key(labels or {})
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_counter(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        """Sets a counter to a monotonic total kept by another module (e.g. from a collector)."""
+        key = _label_key(labels or {})
+        with self._lock:
+            self._counters.setdefault(name, {})[key] = value
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        key = _label_key(labels or {})
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        labels: Optional[Dict[str, str]] = None,
+        buckets: Tuple[float, ...] = METRICS_LATENCY_BUCKETS
+    ) -> None:
+        key = _label_key(labels or {})
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = _Histogram(self._histogram_buckets.setdefault(name, tuple(buckets)))
+            hist.observe(value)
+
+    def register_collector(self, collector: Callable[[], None]) -> None:
+        """Registers a callback run before every export, e.g. to refresh gauges from another module."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def _collect(self) -> None:
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns all metrics as a JSON-serialisable dict."""
+        self._collect()
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "counters": {
+                    name: [{"labels": dict(k), "value": v} for k, v in series.items()]
+                    for name, series in self._counters.items()
+                },
+                "gauges": {
+                    name: [{"labels": dict(k), "value": v} for k, v in series.items()]
+                    for name, series in self._gauges.items()
+                },
+                "histograms": {
+                    name: [
+                        {
+                            "labels": dict(k),
+                            "buckets": list(h.buckets),
+                            "counts": list(h.counts),
+                            "sum": h.sum,
+                            "count": h.count,
+                        }
+                        for k, h in series.items()
+                    ]
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format (version 0.0.4)."""
+        self._collect()
+        lines: List[str] = []
+        with self._lock:
+            for kind, store in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(store.items()):
+                    metric_type, help_text = self._help.get(name, (kind, name))
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {metric_type}")
+                    for key, value in series.items():
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                _, help_text = self._help.get(name, ("histogram", name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in series.items():
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, {'le': repr(float(bound))})} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {hist.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {hist.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+registry = MetricsRegistry()
+
+registry.describe("rag_tool_calls_total", "counter", "Agent tool invocations by outcome")
+registry.describe("rag_tool_errors_total", "counter", "Agent tool invocations that raised or returned status=error")
+registry.describe("rag_tool_latency_seconds", "histogram", "Agent tool wall-clock latency")
+registry.describe("rag_tool_request_bytes", "histogram", "Size of the JSON-encoded tool arguments")
+registry.describe("rag_tool_response_bytes", "histogram", "Size of the JSON-encoded tool result")
+registry.describe("rag_tool_downstream_calls_total", "counter", "Downstream (Vertex, LLM, GCS) calls made while a tool ran")
+registry.describe("rag_downstream_latency_seconds", "histogram", "Downstream call latency")
+registry.describe("rag_downstream_errors_total", "counter", "Downstream calls that raised")
+def _payload_size(payload: Any) -> int:
+    try:
+        return len(json.dumps(payload, default=str))
+    except Exception:
+        return len(str(payload))
+
+
+def _is_error_result(result: Any) -> bool:
+    return isinstance(result, dict) and result.get("status") == "error"
+
+
+def _record_tool_call(name: str, started: float, arguments: Dict[str, Any], result: Any, error: bool) -> None:
+    labels = {"tool": name}
+    registry.observe("rag_tool_latency_seconds", time.perf_counter() - started, labels)
+    registry.observe("rag_tool_request_bytes", _payload_size(arguments), labels, buckets=METRICS_PAYLOAD_BUCKETS)
+    if result is not None:
+        registry.observe("rag_tool_response_bytes", _payload_size(result), labels, buckets=METRICS_PAYLOAD_BUCKETS)
+    registry.inc("rag_tool_calls_total", {"tool": name, "status": "error" if error else "success"})
+    if error:
+        registry.inc("rag_tool_errors_total", labels)
+
+
+def _loggable_arguments(bound: inspect.BoundArguments) -> Dict[str, Any]:
+    # ToolContext is not serialisable and not part of the model-visible payload
+    return {k: v for k, v in bound.arguments.items() if k != "tool_context"}
+
+
+def instrument_tool(func: Callable) -> Callable:
+    """
+    Wraps an agent tool so that every call records latency, outcome, payload sizes and
+    the downstream calls made on its behalf. The wrapper keeps the original signature and
+    docstring, so ADK builds the same function declaration for it.
+    """
+    if getattr(func, "__rag_instrumented__", False):
+        return func
+    name = func.__name__
+    signature = inspect.signature(func)
+
+    def _arguments(args, kwargs) -> Dict[str, Any]:
+        try:
+            return _loggable_arguments(signature.bind_partial(*args, **kwargs))
+        except TypeError:
+            return {"args": args, "kwargs": kwargs}
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            token = _current_tool.set(name)
+            started = time.perf_counter()
+            result = None
+            error = True
+            try:
+                result = await func(*args, **kwargs)
+                error = _is_error_result(result)
+                return result
+            finally:
+                _current_tool.reset(token)
+                _record_tool_call(name, started, _arguments(args, kwargs), result, error)
+
+        async_wrapper.__rag_instrumented__ = True
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current_tool.set(name)
+        started = time.perf_counter()
+        result = None
+        error = True
+        try:
+            result = func(*args, **kwargs)
+            error = _is_error_result(result)
+            return result
+        finally:
+            _current_tool.reset(token)
+            _record_tool_call(name, started, _arguments(args, kwargs), result, error)
+
+    wrapper.__rag_instrumented__ = True
+    return wrapper
+
+
+def _wrap_downstream(func: Callable, target: str) -> Callable:
+    if getattr(func, "__rag_instrumented__", False):
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            registry.inc("rag_downstream_errors_total", {"target": target})
+            raise
+        finally:
+            registry.observe("rag_downstream_latency_seconds", time.perf_counter() - started, {"target": target})
+            registry.inc("rag_tool_downstream_calls_total", {"tool": _current_tool.get() or "none", "target": target})
+
+    wrapper.__rag_instrumented__ = True
+    return wrapper
+
+
+def instrument_downstream(owner: Any, attribute: str, target: str) -> bool:
+    """
+    Replaces `owner.attribute` (module function or class method) with a counting wrapper.
+    Returns False if the attribute does not exist.
+    """
+    func = getattr(owner, attribute, None)
+    if func is None or not callable(func):
+        return False
+    setattr(owner, attribute, _wrap_downstream(func, target))
+    return True
+
+
+_downstream_installed = False
+
+
+def install_downstream_instrumentation() -> None:
+    """
+    Instruments the Vertex RAG, LiteLLM and Cloud Storage entry points used by the tools.
+    Safe to call more than once.
+    """
+    global _downstream_installed
+    if _downstream_installed:
+        return
+    _downstream_installed = True
+
+    try:
+        from vertexai.preview import rag
+        for attribute in (
+            "create_corpus", "update_corpus", "list_corpora", "get_corpus", "delete_corpus",
+            "import_files", "list_files", "get_file", "delete_file", "retrieval_query",
+        ):
+            instrument_downstream(rag, attribute, f"vertex_rag.{attribute}")
+    except ImportError:
+        logger.warning("vertexai not available; Vertex RAG calls are not instrumented")
+
+    try:
+        import litellm
+        instrument_downstream(litellm, "completion", "litellm.completion")
+    except ImportError:
+        logger.warning("litellm not available; LLM calls are not instrumented")
+
+    try:
+        from google.cloud import storage
+        instrument_downstream(storage.Client, "list_blobs", "gcs.list_blobs")
+        for attribute in ("exists", "create"):
+            instrument_downstream(storage.Bucket, attribute, f"gcs.bucket_{attribute}")
+        for attribute in ("upload_from_string", "upload_from_file", "download_as_bytes", "exists", "delete"):
+            instrument_downstream(storage.Blob, attribute, f"gcs.blob_{attribute}")
+    except ImportError:
+        logger.warning("google-cloud-storage not available; GCS calls are not instrumented")
+
+
+def export_prometheus_text() -> str:
+    """Returns the current metrics in Prometheus text format."""
+    return registry.render_prometheus()
+
+
+class FileExporter:
+    """
+    Periodically writes metrics to a local directory for offline runs:
+    `metrics.prom` (latest Prometheus text) and `metrics.jsonl` (one JSON snapshot per interval).
+    """
+
+    def __init__(self, directory: str, interval_seconds: float = METRICS_EXPORT_INTERVAL_SECONDS):
+        self.directory = directory
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def export(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        prom_path = os.path.join(self.directory, "metrics.prom")
+        tmp_path = prom_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(registry.render_prometheus())
+        os.replace(tmp_path, prom_path)
+        with open(os.path.join(self.directory, "metrics.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(registry.snapshot()) + "\n")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.export()
+            except Exception as e:
+                logger.warning(f"Failed to export metrics to {self.directory}: {e}")
+
+    def start(self) -> "FileExporter":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="rag-metrics-file-exporter", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        try:
+            self.export()
+        except Exception as e:
+            logger.warning(f"Failed to export metrics to {self.directory}: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        return
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serves Prometheus text metrics on http://<host>:<port>/metrics from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="rag-metrics-http", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+_exporters_started = False
+
+
+def start_configured_exporters() -> None:
+    """Starts the exporters enabled in config (RAG_METRICS_EXPORT_DIR / RAG_METRICS_HTTP_PORT)."""
+    global _exporters_started
+    # Shard workers would clash with the parent's exporters (same port, same files)
+    if _exporters_started or EVAL_SHARD_WORKER:
+        return
+    _exporters_started = True
+    if METRICS_EXPORT_DIR:
+        exporter = FileExporter(METRICS_EXPORT_DIR).start()
+        atexit.register(exporter.stop)
+        logger.info(f"Exporting metrics to {METRICS_EXPORT_DIR}")
+    if METRICS_HTTP_PORT:
+        try:
+            start_metrics_server(METRICS_HTTP_PORT)
+        except OSError as e:
+            logger.warning(f"Failed to start metrics server on port {METRICS_HTTP_PORT}: {e}")
@@ -1,3 +1,10 @@
 from .lifecycle_main import (
     automated_evaluation_testcase
 )
+from .chunk_sweep import (
+    run_chunking_sweep,
+)
+from .testcase_reader import (
+    open_testcases,
+    TestCase,
+)
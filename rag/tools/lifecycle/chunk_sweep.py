@@ -0,0 +1,357 @@
+# ====================== CHUNKING SWEEP =====================
+#
+# Measures the chunk size / overlap trade-off offline. The document set is re-chunked under every
+# (chunk_size, chunk_overlap) setting into a local stand-in corpus and the regression sheet is run
+# against each one through the regular evaluation loop (_evaluate_case), so the answer prompt,
+# context budgeting and LLM judge are the ones used by automated_evaluation_testcase.
+#
+# Stand-in corpora embed chunks with the hashed bag-of-words vectors of the routing index instead of
+# the Vertex AI embedding model, so absolute pass rates differ from a real corpus; chunk counts,
+# embedding calls (one per chunk, as Vertex AI issues them on import) and the relative effect of
+# the settings are what the sweep is for. Generator and judge completions go through a persistent
+# cache keyed by model and messages: identical prompts, e.g. when two settings retrieve the same
+# context, or when a sweep is re-run, are answered from the cache.
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Ensure parent directory is in path to allow imports if running as script or module
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+try:
+    from tools.lifecycle import lifecycle_main
+    from tools.lifecycle.testcase_reader import open_testcases
+    from tools.preprocess.preprocess_tools import _Tokenizer, _download, chunk_tokens, extract_text
+    from tools.corpus.routing_index import embed_terms, tokenize
+    from tools.corpus.retrieval_results import RetrievalHits
+    from tools.instrumentation.instrumentation_tools import percentile
+    from config import (
+        RAG_DEFAULT_CHUNK_SIZE,
+        RAG_DEFAULT_CHUNK_OVERLAP,
+        RAG_DEFAULT_TOP_K,
+        LOCAL_STATE_DIR,
+        SWEEP_CHUNK_SIZES,
+        SWEEP_CHUNK_OVERLAPS,
+    )
+except ImportError:
+    try:
+        from rag.tools.lifecycle import lifecycle_main
+        from rag.tools.lifecycle.testcase_reader import open_testcases
+        from rag.tools.preprocess.preprocess_tools import _Tokenizer, _download, chunk_tokens, extract_text
+        from rag.tools.corpus.routing_index import embed_terms, tokenize
+        from rag.tools.corpus.retrieval_results import RetrievalHits
+        from rag.tools.instrumentation.instrumentation_tools import percentile
+        from rag.config import (
+            RAG_DEFAULT_CHUNK_SIZE,
+            RAG_DEFAULT_CHUNK_OVERLAP,
+            RAG_DEFAULT_TOP_K,
+            LOCAL_STATE_DIR,
+            SWEEP_CHUNK_SIZES,
+            SWEEP_CHUNK_OVERLAPS,
+        )
+    except ImportError:
+        from . import lifecycle_main
+        from .testcase_reader import open_testcases
+        from ...tools.preprocess.preprocess_tools import _Tokenizer, _download, chunk_tokens, extract_text
+        from ...tools.corpus.routing_index import embed_terms, tokenize
+        from ...tools.corpus.retrieval_results import RetrievalHits
+        from ...tools.instrumentation.instrumentation_tools import percentile
+        from ...config import (
+            RAG_DEFAULT_CHUNK_SIZE,
+            RAG_DEFAULT_CHUNK_OVERLAP,
+            RAG_DEFAULT_TOP_K,
+            LOCAL_STATE_DIR,
+            SWEEP_CHUNK_SIZES,
+            SWEEP_CHUNK_OVERLAPS,
+        )
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_PATH = os.path.join(LOCAL_STATE_DIR, "llm_cache.sqlite3")
+
+
+class CachedCompletion:
+    """
+    litellm.completion-compatible callable that answers repeated requests from SQLite.
+
+    The key covers the model, messages and response format. Only successful completions are
+    stored; cached answers report zero token usage, since nothing was spent on them.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, completion_fn: Optional[Callable[..., Any]] = None):
+        self.path = path
+        self.completion_fn = completion_fn
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, model TEXT, content TEXT, created_at REAL)"
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(model: Optional[str], messages: Any, response_format: Any) -> str:
+        payload = json.dumps([model, messages, response_format], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def __call__(self, model: Optional[str] = None, messages: Any = None, response_format: Any = None, **kwargs: Any) -> Any:
+        key = self._key(model, messages, response_format)
+        with self._lock:
+            row = self._db.execute("SELECT content FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.hits += 1
+        if row is not None:
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=row[0]))],
+                usage=SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0),
+            )
+        # Looked up at call time so that a replaced lifecycle_main.litellm (tests, benchmarks) is used
+        completion_fn = self.completion_fn or lifecycle_main.litellm.completion
+        kwargs_with_format = dict(kwargs, response_format=response_format) if response_format is not None else kwargs
+        completion = completion_fn(model=model, messages=messages, **kwargs_with_format)
+        with self._lock:
+            self.misses += 1
+            self._db.execute(
+                "INSERT OR REPLACE INTO completions (key, model, content, created_at) VALUES (?, ?, ?, ?)",
+                (key, model, completion.choices[0].message.content, time.time()),
+            )
+            self._db.commit()
+        return completion
+
+
+class LocalCorpus:
+    """Chunked document set with hashed bag-of-words vectors; a stand-in for a Vertex AI RAG corpus."""
+
+    def __init__(self, chunk_texts: List[str], source_uris: List[str], top_k: int = RAG_DEFAULT_TOP_K):
+        started = time.perf_counter()
+        self.texts = chunk_texts
+        self.source_uris = [sys.intern(uri) for uri in source_uris]
+        self.top_k = top_k
+        self.vectors = (
+            np.vstack([embed_terms(tokenize(text)) for text in chunk_texts])
+            if chunk_texts else np.zeros((0, 1), dtype=np.float32)
+        )
+        self.build_seconds = time.perf_counter() - started
+        self.query_seconds: List[float] = []
+
+    @property
+    def index_bytes(self) -> int:
+        return int(self.vectors.nbytes) + sum(len(text.encode("utf-8")) for text in self.texts)
+
+    def retrieve(self, corpus_id: str, query: str) -> RetrievalHits:
+        """retrieve()-compatible: the top_k chunks by cosine similarity (distance = 1 - similarity)."""
+        started = time.perf_counter()
+        if not self.texts:
+            self.query_seconds.append(time.perf_counter() - started)
+            return RetrievalHits.empty()
+        similarity = self.vectors @ embed_terms(tokenize(query))
+        k = min(self.top_k, len(similarity))
+        top = np.argpartition(-similarity, k - 1)[:k]
+        top = top[np.argsort(-similarity[top], kind="stable")]
+        hits = RetrievalHits(
+            [self.texts[i] for i in top],
+            [self.source_uris[i] for i in top],
+            (1.0 - similarity[top]).astype(np.float64),
+        )
+        self.query_seconds.append(time.perf_counter() - started)
+        return hits
+
+
+def _expand_documents(documents: List[str]) -> List[str]:
+    """Local files, local directories (walked) and gs:// URIs, in a stable order."""
+    expanded = []
+    for item in documents:
+        if item.startswith("gs://") or os.path.isfile(item):
+            expanded.append(item)
+        elif os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                expanded.extend(os.path.join(root, name) for name in sorted(files))
+        else:
+            raise ValueError(f"Document not found: {item}")
+    return expanded
+
+
+def _load_documents(documents: List[str]) -> Tuple[List[Tuple[str, List[Any]]], List[Dict[str, str]]]:
+    """Extracts and tokenizes every document once; returns [(uri, tokens)] and the skipped files."""
+    tokenizer = _Tokenizer()
+    loaded, skipped = [], []
+    for uri in _expand_documents(documents):
+        try:
+            if uri.startswith("gs://"):
+                data = _download(lifecycle_main.storage_client, uri)
+            else:
+                with open(uri, "rb") as f:
+                    data = f.read()
+            text = extract_text(uri, data)
+        except Exception as e:
+            skipped.append({"uri": uri, "reason": str(e)})
+            continue
+        tokens = tokenizer.encode(text)
+        if tokens:
+            loaded.append((uri, tokens))
+    return loaded, skipped
+
+
+def _chunk_documents(
+    documents: List[Tuple[str, List[Any]]],
+    chunk_size: int,
+    chunk_overlap: int,
+    tokenizer: _Tokenizer
+) -> Tuple[List[str], List[str], int]:
+    texts, uris, tokens_embedded = [], [], 0
+    for uri, tokens in documents:
+        for start, end, _ in chunk_tokens(tokens, chunk_size, chunk_overlap):
+            texts.append(tokenizer.decode(tokens[start:end]))
+            uris.append(uri)
+            tokens_embedded += end - start
+    return texts, uris, tokens_embedded
+
+
+def _latency_ms(seconds: List[float]) -> Dict[str, float]:
+    if not seconds:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0}
+    ordered = sorted(seconds)
+    return {
+        "mean": round(1000 * sum(ordered) / len(ordered), 3),
+        "p50": round(1000 * percentile(ordered, 50), 3),
+        "p95": round(1000 * percentile(ordered, 95), 3),
+    }
+
+
+def run_chunking_sweep(
+    documents: List[str],
+    excel_path: str,
+    chunk_sizes: Optional[List[int]] = None,
+    chunk_overlaps: Optional[List[int]] = None,
+    top_k: int = RAG_DEFAULT_TOP_K,
+    max_rows: Optional[int] = None,
+    cache_path: str = LLM_CACHE_PATH,
+    completion_fn: Optional[Callable[..., Any]] = None
+) -> Dict[str, Any]:
+    """
+    Runs the regression sheet against local stand-in corpora chunked with every size / overlap pair.
+
+    Args:
+        documents: Local files or directories and/or gs:// URIs of the documents to chunk
+        excel_path: Local path of the regression sheet (Query / Ground Truth columns)
+        chunk_sizes: Chunk sizes in tokens (default: SWEEP_CHUNK_SIZES)
+        chunk_overlaps: Chunk overlaps in tokens (default: SWEEP_CHUNK_OVERLAPS); pairs with
+            overlap >= size are skipped
+        top_k: Chunks retrieved per query
+        max_rows: Evaluate only the first `max_rows` rows of the sheet
+        cache_path: SQLite file of the LLM completion cache (":memory:" for a throw-away cache)
+        completion_fn: Completion callable used on cache misses (default: litellm.completion)
+
+    Returns:
+        Per configuration: chunk count, tokens embedded, embedding calls, index size, retrieval
+        latency, pass rate, mean score and LLM calls made / answered from the cache. `best` is
+        the configuration with the highest pass rate (fewest embedding calls on ties).
+    """
+    try:
+        started = time.perf_counter()
+        chunk_sizes = list(chunk_sizes or SWEEP_CHUNK_SIZES)
+        chunk_overlaps = list(chunk_overlaps if chunk_overlaps is not None else SWEEP_CHUNK_OVERLAPS)
+        grid = [(size, overlap) for size in chunk_sizes for overlap in chunk_overlaps if 0 <= overlap < size]
+        invalid = [(size, overlap) for size in chunk_sizes for overlap in chunk_overlaps if not 0 <= overlap < size]
+        if not grid:
+            raise ValueError("No valid (chunk_size, chunk_overlap) pair: the overlap must be smaller than the size")
+
+        loaded, skipped = _load_documents(documents)
+        if not loaded:
+            raise ValueError("None of the documents could be read as text")
+        testcases = open_testcases(excel_path)
+        cases = []
+        for case in testcases:
+            if max_rows is not None and len(cases) >= max_rows:
+                break
+            cases.append(case)
+        if not cases:
+            raise ValueError(f"No test cases found in {excel_path}")
+
+        tokenizer = _Tokenizer()
+        cache = CachedCompletion(cache_path, completion_fn=completion_fn)
+        generator_model = os.getenv("AZURE", "azure/gpt-4o")
+        configs = []
+        for chunk_size, chunk_overlap in grid:
+            texts, uris, tokens_embedded = _chunk_documents(loaded, chunk_size, chunk_overlap, tokenizer)
+            corpus = LocalCorpus(texts, uris, top_k=top_k)
+            corpus_id = f"sweep-{chunk_size}-{chunk_overlap}"
+            hits_before, misses_before = cache.hits, cache.misses
+
+            evaluated_at = time.perf_counter()
+            rows = [
+                lifecycle_main._evaluate_case(
+                    case, testcases.columns, corpus_id, generator_model,
+                    retriever=corpus.retrieve, completion_fn=cache
+                )
+                for case in cases
+            ]
+            passed = sum(1 for row in rows if row["status"] == "PASS")
+            configs.append({
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+                "is_default": (chunk_size, chunk_overlap) == (RAG_DEFAULT_CHUNK_SIZE, RAG_DEFAULT_CHUNK_OVERLAP),
+                "chunks": len(texts),
+                "tokens_embedded": tokens_embedded,
+                "embedding_calls": len(texts),
+                "index_bytes": corpus.index_bytes,
+                "index_build_seconds": round(corpus.build_seconds, 4),
+                "retrieval_latency_ms": _latency_ms(corpus.query_seconds),
+                "rows": len(rows),
+                "passed": passed,
+                "pass_rate": round(passed / len(rows), 4),
+                "mean_score": round(sum(float(row["score"] or 0) for row in rows) / len(rows), 4),
+                "mean_context_tokens": round(sum(row["context_tokens"] for row in rows) / len(rows), 1),
+                "llm_calls": cache.misses - misses_before,
+                "llm_cached": cache.hits - hits_before,
+                "llm_prompt_tokens": sum(row["llm_prompt_tokens"] for row in rows),
+                "evaluation_seconds": round(time.perf_counter() - evaluated_at, 3),
+            })
+            logger.info(
+                f"Chunking sweep {chunk_size}/{chunk_overlap}: {len(texts)} chunks, "
+                f"pass rate {configs[-1]['pass_rate']:.1%}"
+            )
+
+        best = min(
+            configs,
+            key=lambda c: (-c["pass_rate"], c["embedding_calls"], c["retrieval_latency_ms"]["p95"])
+        )
+        return {
+            "status": "success",
+            "configs": configs,
+            "best": {"chunk_size": best["chunk_size"], "chunk_overlap": best["chunk_overlap"], "pass_rate": best["pass_rate"]},
+            "documents": len(loaded),
+            "document_tokens": sum(len(tokens) for _, tokens in loaded),
+            "skipped_documents": skipped,
+            "skipped_configs": [{"chunk_size": s, "chunk_overlap": o} for s, o in invalid],
+            "rows": len(cases),
+            "llm_calls": cache.misses,
+            "llm_cached": cache.hits,
+            "wall_seconds": round(time.perf_counter() - started, 3),
+            "message": (
+                f"Evaluated {len(configs)} chunking settings on {len(cases)} rows; best "
+                f"{best['chunk_size']}/{best['chunk_overlap']} with pass rate {best['pass_rate']:.1%} "
+                f"({cache.hits} of {cache.hits + cache.misses} LLM calls answered from the cache)"
+            ),
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": str(e),
+            "message": f"Chunking sweep failed: {str(e)}"
+        }
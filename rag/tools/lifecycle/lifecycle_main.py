@@ -3,14 +3,17 @@ import hashlib
 import json
 import io
 import time
-from typing import Any, Optional, List, Dict
+import random
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional, List, Dict, Tuple
 import pandas as pd 
 import datetime
 import pg8000
 from google.cloud.sql.connector import Connector, IPTypes
 import logging
 from google.cloud import storage
-from google.adk.tools import FunctionTool, ToolContext
 import litellm
 import sys
 from google.cloud.sql.connector import Connector, IPTypes
@@ -20,7 +23,7 @@ from dotenv import load_dotenv
 try:
     from tools.corpus.corpus_tools import (
         get_corpus_id_by_display_name,
-        query_corpus,
+        retrieve,
         import_files,
         delete_file_from_corpus,
         create_corpus,
@@ -29,16 +32,25 @@ try:
         list_files
     )
     from tools.storage.storage_tools import create_gcs_bucket, list_blobs
+    from tools.context.context_tools import build_context, count_tokens
+    from tools.lifecycle.testcase_reader import open_testcases
+    from tools.lifecycle.shard_worker import run_shard, shard_worker_environment
     from config import (
         PROJECT_ID, 
         LOCATION, 
         EVAL_BUCKET_NAME,
+        EVAL_ROW_DELAY_SECONDS,
+        EVAL_MAX_SHARDS,
+        EVAL_SHARD_START_METHOD,
+        EVAL_SHARD_WORKER,
+        EVAL_INCREMENTAL_SAMPLE_RATE,
+        LOCAL_STATE_DIR,
     )
 except ImportError:
     try:
         from rag.tools.corpus.corpus_tools import (
             get_corpus_id_by_display_name,
-            query_corpus,
+            retrieve,
             import_files,
             delete_file_from_corpus,
             create_corpus,
@@ -47,15 +59,24 @@ except ImportError:
             list_files
         )
         from rag.tools.storage.storage_tools import create_gcs_bucket, list_blobs
+        from rag.tools.context.context_tools import build_context, count_tokens
+        from rag.tools.lifecycle.testcase_reader import open_testcases
+        from rag.tools.lifecycle.shard_worker import run_shard, shard_worker_environment
         from rag.config import (
             PROJECT_ID, 
             LOCATION, 
             EVAL_BUCKET_NAME,
+            EVAL_ROW_DELAY_SECONDS,
+            EVAL_MAX_SHARDS,
+            EVAL_SHARD_START_METHOD,
+            EVAL_SHARD_WORKER,
+            EVAL_INCREMENTAL_SAMPLE_RATE,
+            LOCAL_STATE_DIR,
         )
     except ImportError:
         from ...tools.corpus.corpus_tools import (
             get_corpus_id_by_display_name,
-            query_corpus,
+            retrieve,
             import_files,
             delete_file_from_corpus,
             create_corpus,
@@ -64,12 +85,39 @@ except ImportError:
             list_files
         )
         from ...tools.storage.storage_tools import create_gcs_bucket, list_blobs
+        from ...tools.context.context_tools import build_context, count_tokens
+        from ...tools.lifecycle.testcase_reader import open_testcases
+        from ...tools.lifecycle.shard_worker import run_shard, shard_worker_environment
         from ...config import (
             PROJECT_ID, 
             LOCATION, 
             EVAL_BUCKET_NAME,
+            EVAL_ROW_DELAY_SECONDS,
+            EVAL_MAX_SHARDS,
+            EVAL_SHARD_START_METHOD,
+            EVAL_SHARD_WORKER,
+            EVAL_INCREMENTAL_SAMPLE_RATE,
+            LOCAL_STATE_DIR,
         )
 
+try:
+    from tools.instrumentation.instrumentation_tools import percentile
+except ImportError:
+    try:
+        from rag.tools.instrumentation.instrumentation_tools import percentile
+    except ImportError:
+        from ...tools.instrumentation.instrumentation_tools import percentile
+
+if EVAL_SHARD_WORKER:
+    # Shard workers only run the evaluation loop; do not load ADK just for the tool annotation
+    ToolContext = Any
+else:
+    from google.adk.tools import ToolContext
+
+# Logger setup
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
 ### storage client initi
 # Initialize Storage Client
 try:
@@ -78,14 +126,29 @@ except Exception as e:
     logger.error(f"Failed to initialize storage client: {e}")
     storage_client = None
 
+def _add_usage(usage: Optional[Dict[str, int]], completion: Any) -> None:
+    """
+    Adds the provider-reported token usage of a LiteLLM completion to `usage` (if given).
+    """
+    if usage is None:
+        return
+    reported = getattr(completion, "usage", None)
+    if reported is None:
+        return
+    for key in ("prompt_tokens", "completion_tokens"):
+        value = reported.get(key) if isinstance(reported, dict) else getattr(reported, key, None)
+        usage[key] = usage.get(key, 0) + int(value or 0)
 
-# Logger setup
-logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
-
-def _evaluate_with_llm(query: str, response: str, ground_truth: str) -> Dict[str, Any]:
+def _evaluate_with_llm(
+    query: str,
+    response: str,
+    ground_truth: str,
+    usage: Optional[Dict[str, int]] = None,
+    completion_fn: Optional[Callable[..., Any]] = None
+) -> Dict[str, Any]:
     """
     Evaluates RAG response against ground truth using LiteLLM (matching Agent's config).
+    Token usage is added to `usage` if given. `completion_fn` replaces litellm.completion (e.g. a cache).
     """
     try:
         model_name = os.getenv("AZURE", "azure/gpt-4o")
@@ -109,7 +172,7 @@ def _evaluate_with_llm(query: str, response: str, ground_truth: str) -> Dict[str
         }}
         """
         
-        completion = litellm.completion(
+        completion = (completion_fn or litellm.completion)(
             model=model_name,
             messages=[
                 {"role": "system", "content": "You are a helpful assistant designed to output JSON."},
@@ -117,20 +180,18 @@ def _evaluate_with_llm(query: str, response: str, ground_truth: str) -> Dict[str
             ],
             response_format={ "type": "json_object" }
         )
+        _add_usage(usage, completion)
         
         content = completion.choices[0].message.content
         return json.loads(content)
     except Exception as e:
         return {"score": 0.0, "reason": f"Evaluation failed: {str(e)}"}
 
-def _generate_answer(query: str, context: str) -> str:
+def _build_answer_prompt(query: str, context: str) -> str:
     """
-    Generates an answer based on the query and retrieved context using the LLM.
+    Builds the user prompt sent to the generator for a query and its retrieved context.
     """
-    try:
-        model_name = os.getenv("AZURE", "azure/gpt-4o")
-        
-        prompt = f"""
+    return f"""
         You are a helpful assistant. Answer the user's query based ONLY on the provided context.
         If the answer is not in the context, say "I cannot answer this based on the provided information."
         
@@ -142,53 +203,567 @@ def _generate_answer(query: str, context: str) -> str:
         
         Answer:
         """
+
+def _generate_answer(
+    query: str,
+    context: str,
+    usage: Optional[Dict[str, int]] = None,
+    completion_fn: Optional[Callable[..., Any]] = None
+) -> str:
+    """
+    Generates an answer based on the query and retrieved context using the LLM.
+    Token usage is added to `usage` if given. `completion_fn` replaces litellm.completion (e.g. a cache).
+    """
+    try:
+        model_name = os.getenv("AZURE", "azure/gpt-4o")
+        
+        prompt = _build_answer_prompt(query, context)
         
-        completion = litellm.completion(
+        completion = (completion_fn or litellm.completion)(
             model=model_name,
             messages=[
                 {"role": "system", "content": "You are a helpful assistant."},
                 {"role": "user", "content": prompt}
             ]
         )
+        _add_usage(usage, completion)
         
         return completion.choices[0].message.content.strip()
     except Exception as e:
         return f"Generation failed: {str(e)}"
 
+CHECKPOINT_EVERY_ROWS = 5
+PASS_THRESHOLD = 0.7
+
+# Per-row wall time columns (seconds); None when the stage did not run for the row
+STAGE_COLUMNS = {
+    "read": "t_read_s",
+    "query": "t_query_s",
+    "generate": "t_generate_s",
+    "judge": "t_judge_s",
+    "checkpoint": "t_checkpoint_s",
+}
+# Kept on the in-memory rows for the summary only. A checkpoint's duration is known only after
+# the rows were written, so a persisted value would be missing from every checkpoint file (and
+# from runs resumed from one); results files never contain it instead.
+UNPERSISTED_COLUMNS = ["t_checkpoint_s"]
+
+def _save_rows_to_gcs(current_rows: List[Dict[str, Any]], blob_path: str, is_temp: bool = True) -> None:
+    """
+    Writes result rows as an Excel workbook to the evaluation bucket.
+    """
+    if not storage_client: return
+    try:
+        temp_df = pd.DataFrame(current_rows).drop(columns=UNPERSISTED_COLUMNS, errors="ignore")
+        output = io.BytesIO()
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            temp_df.to_excel(writer, index=False)
+        output_bytes = output.getvalue()
+        
+        bucket = storage_client.bucket(EVAL_BUCKET_NAME)
+        blob = bucket.blob(blob_path)
+        blob.upload_from_string(
+            data=output_bytes,
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        if not is_temp:
+            logger.info(f"Saved results to gs://{EVAL_BUCKET_NAME}/{blob_path}")
+    except Exception as e:
+        logger.warning(f"Failed to save progress to {blob_path}: {e}")
+
+def _delete_blobs(blob_paths: List[str]) -> None:
+    if not storage_client: return
+    bucket = storage_client.bucket(EVAL_BUCKET_NAME)
+    for blob_path in blob_paths:
+        try:
+            blob = bucket.blob(blob_path)
+            if blob.exists():
+                blob.delete()
+                logger.info(f"Deleted temporary working file: {blob_path}")
+        except Exception as e:
+            logger.warning(f"Failed to delete temp file {blob_path}: {e}")
+
+# Result columns written by _evaluate_case (carried forward as-is by incremental runs)
+RESULT_COLUMNS = [
+    'rag_response', 'chunk_1', 'citations', 'score', 'status', 'reason',
+    'context_tokens', 'context_tokens_saved', 'prompt_tokens',
+]
+_NUMERIC_RESULT_COLUMNS = {'score': float, 'context_tokens': int, 'context_tokens_saved': int, 'prompt_tokens': int}
+SOURCE_SEPARATOR = "\n"
+
+def _source_key(uri_or_name: str) -> str:
+    """
+    Normalises a source URI, file display name or file path to the file name used to match
+    retrieved sources against changed corpus files.
+    """
+    return str(uri_or_name).strip().rstrip("/").split("/")[-1].lower()
+
+def _corpus_state(files: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Dict[str, str]]]:
+    """
+    Fingerprints the corpus file listing. Returns the state ID and the manifest
+    (display name -> file id / create time) it was computed from.
+    """
+    manifest = {
+        f.get("display_name") or f["id"]: {"id": f["id"], "create_time": f.get("create_time", "")}
+        for f in files
+    }
+    digest = hashlib.sha1()
+    for name in sorted(manifest):
+        digest.update(f"{name}|{manifest[name]['id']}|{manifest[name]['create_time']}\n".encode("utf-8"))
+    return digest.hexdigest()[:16], manifest
+
+def _manifest_path(corpus_id: str, state: str) -> str:
+    return os.path.join(LOCAL_STATE_DIR, "eval_manifests", f"{corpus_id}_{state}.json")
+
+def _save_manifest(corpus_id: str, state: str, manifest: Dict[str, Dict[str, str]]) -> None:
+    path = _manifest_path(corpus_id, state)
+    if os.path.exists(path):
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+    except Exception as e:
+        logger.warning(f"Failed to save corpus manifest {path}: {e}")
+
+def _changed_files_between(corpus_id: str, previous_state: str, manifest: Dict[str, Dict[str, str]]) -> Optional[List[str]]:
+    """
+    Files imported, deleted or re-imported between a previous corpus state and the current manifest.
+    Returns None if the previous manifest is not available locally.
+    """
+    path = _manifest_path(corpus_id, previous_state)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    return sorted(name for name in set(previous) | set(manifest) if previous.get(name) != manifest.get(name))
+
+def _load_previous_results(results_uri: str) -> Dict[int, Dict[str, Any]]:
+    """
+    Reads a previous results file (gs:// URI or local path) into {row_id: row}.
+    """
+    local_path = results_uri
+    temp_path = None
+    if results_uri.startswith("gs://"):
+        if not storage_client:
+            raise ValueError("Storage client is not available to download previous results")
+        bucket_name, _, blob_path = results_uri[len("gs://"):].partition("/")
+        handle, temp_path = tempfile.mkstemp(suffix=os.path.splitext(blob_path)[1] or ".xlsx")
+        os.close(handle)
+        storage_client.bucket(bucket_name).blob(blob_path).download_to_filename(temp_path)
+        local_path = temp_path
+    try:
+        previous = {}
+        with open_testcases(local_path) as reader:
+            if "row_id" not in reader.columns:
+                raise ValueError(f"{results_uri} is not an evaluation results file (no row_id column)")
+            for case in reader:
+                row = case.as_dict(reader.columns)
+                previous[int(row["row_id"])] = row
+        return previous
+    finally:
+        if temp_path:
+            os.remove(temp_path)
+
+def _carry_forward(out_row: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    for column in RESULT_COLUMNS:
+        value = previous.get(column)
+        cast = _NUMERIC_RESULT_COLUMNS.get(column)
+        if cast:
+            try:
+                value = cast(value)
+            except (TypeError, ValueError):
+                value = cast(0)
+        out_row[column] = value if value is not None else ""
+
+def _incremental_decision(case: Any, query_column: str, sources: List[str], incremental: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Decides how an incremental run handles a row: "new" (no comparable previous row, or one
+    without a PASS / FAIL verdict), "affected" (retrieved sources changed or touch a changed
+    file), "sampled" (unaffected but picked for the safety sample) or "carried_forward".
+    """
+    previous = incremental["previous"].get(case.row_id)
+    if previous is None or str(previous.get(query_column) or "") != case.query:
+        return "new", previous
+    if str(previous.get("status") or "").strip().upper() not in ("PASS", "FAIL"):
+        # Nothing to carry forward: the row would count as neither passed nor failed
+        return "new", previous
+    previous_sources = [s for s in str(previous.get("retrieved_sources") or "").split(SOURCE_SEPARATOR) if s]
+    if set(previous_sources) != set(sources):
+        return "affected", previous
+    if incremental["changed"] & {_source_key(s) for s in sources}:
+        return "affected", previous
+    if random.Random(f"{incremental['seed']}:{case.row_id}").random() < incremental["sample_rate"]:
+        return "sampled", previous
+    return "carried_forward", previous
+
+def _evaluate_case(
+    case: Any,
+    columns: List[str],
+    corpus_id: str,
+    generator_model: str,
+    corpus_state: str = "",
+    row_delay: float = 0,
+    incremental: Optional[Dict[str, Any]] = None,
+    retriever: Optional[Callable[[str, str], Any]] = None,
+    completion_fn: Optional[Callable[..., Any]] = None
+) -> Dict[str, Any]:
+    """
+    Runs retrieval, answer generation and LLM judging for one test case and returns its output row.
+
+    In incremental mode the retrieval is compared with the previous run first; unaffected rows
+    skip generation and judging and carry their previous results forward. `retriever(corpus_id,
+    query)` and `completion_fn` replace retrieve / litellm.completion (used by the chunking sweep).
+    """
+    query_text = case.query
+    # Missing ground truth cells are already mapped to "N/A" by the reader
+    ground_truth = case.ground_truth
+    
+    timings = {column: None for column in STAGE_COLUMNS.values()}
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
+
+    # Query RAG
+    started = time.perf_counter()
+    try:
+        hits = (retriever or retrieve)(corpus_id, query_text)
+        succeeded = True
+    except Exception as e:
+        logger.warning(f"Retrieval failed for row {case.row_id}: {e}")
+        hits, succeeded = None, False
+    timings["t_query_s"] = round(time.perf_counter() - started, 4)
+    sources = hits.unique_sources() if succeeded else []
+
+    # Construct Output Row:
+    # 1. Start with original row data to preserve structure and values (already sanitised)
+    out_row = case.as_dict(columns)
+
+    run_mode, previous = "full", None
+    if incremental is not None:
+        run_mode, previous = _incremental_decision(case, columns[incremental["query_index"]], sources, incremental) if succeeded else ("affected", incremental["previous"].get(case.row_id))
+        if run_mode == "carried_forward":
+            _carry_forward(out_row, previous)
+            out_row['retrieved_sources'] = SOURCE_SEPARATOR.join(sources)
+            out_row['corpus_state'] = corpus_state
+            out_row['run_mode'] = run_mode
+            out_row['previous_score'] = out_row['score']
+            out_row.update(timings)
+            out_row['llm_prompt_tokens'] = 0
+            out_row['llm_completion_tokens'] = 0
+            out_row['row_id'] = case.row_id
+            return out_row
+
+    # Add delay to avoid hitting rate limits (LLM/Vertex AI quotas)
+    time.sleep(row_delay)
+
+    response_text = "No response"
+    citations = []
+    chunks = []
+    context_stats = {"tokens_after": 0, "tokens_saved": 0}
+    prompt_tokens = 0
+    if succeeded:
+         if len(hits):
+             # Get top 1 chunks
+             top_results = hits.head(5).to_dicts()
+             
+             # Prepare context from chunks: merge overlapping neighbours, drop near-duplicates
+             # and fit the generator's token budget
+             context_stats = build_context(top_results, model=generator_model)
+             context_text = context_stats["context"]
+             chunks = [r.get("text", "") for r in top_results]
+             prompt_tokens = count_tokens(_build_answer_prompt(query_text, context_text), generator_model)
+             
+             # Generate Answer using LLM
+             started = time.perf_counter()
+             response_text = _generate_answer(query_text, context_text, usage=usage, completion_fn=completion_fn)
+             timings["t_generate_s"] = round(time.perf_counter() - started, 4)
+             
+             # Extract citations (source_uri)
+             citations = sources
+    
+    # Evaluate
+    started = time.perf_counter()
+    eval_result = _evaluate_with_llm(query_text, response_text, ground_truth, usage=usage, completion_fn=completion_fn)
+    timings["t_judge_s"] = round(time.perf_counter() - started, 4)
+    score = eval_result.get("score", 0.0)
+    is_pass = score >= PASS_THRESHOLD
+    
+    # 2. Append new results columns
+    out_row['rag_response'] = response_text[:1000] + "..." if len(response_text) > 1000 else response_text
+    
+    # Add top 1 chunk
+    for i in range(1):
+        out_row[f'chunk_{i+1}'] = chunks[i] if i < len(chunks) else ""
+
+    out_row['citations'] = ", ".join(citations)
+    out_row['score'] = score
+    out_row['status'] = "PASS" if is_pass else "FAIL"
+    out_row['reason'] = eval_result.get("reason", "")
+    out_row['context_tokens'] = context_stats["tokens_after"]
+    out_row['context_tokens_saved'] = context_stats["tokens_saved"]
+    out_row['prompt_tokens'] = prompt_tokens
+    out_row['retrieved_sources'] = SOURCE_SEPARATOR.join(sources)
+    out_row['corpus_state'] = corpus_state
+    if incremental is not None:
+        out_row['run_mode'] = run_mode
+        out_row['previous_score'] = float(previous.get('score') or 0) if previous else None
+    out_row.update(timings)
+    out_row['llm_prompt_tokens'] = usage["prompt_tokens"]
+    out_row['llm_completion_tokens'] = usage["completion_tokens"]
+    out_row['row_id'] = case.row_id
+    return out_row
+
+def _evaluate_cases(
+    testcases: Any,
+    corpus_id: str,
+    generator_model: str,
+    checkpoint_blob_path: str,
+    row_delay: float,
+    row_range: Optional[Tuple[int, int]] = None,
+    corpus_state: str = "",
+    incremental: Optional[Dict[str, Any]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Evaluates the test cases of a reader (optionally only row_ids within `row_range`, inclusive),
+    checkpointing to `checkpoint_blob_path` every CHECKPOINT_EVERY_ROWS rows. `row_delay` is
+    applied before every row that calls the LLMs.
+
+    Returns the evaluated rows and an error message if the run was interrupted.
+    """
+    evaluated_rows = []
+    try:
+        cases = iter(testcases)
+        read_seconds = 0.0
+        while True:
+            # Time spent streaming the row from the sheet (including skipped rows before it)
+            started = time.perf_counter()
+            case = next(cases, None)
+            read_seconds += time.perf_counter() - started
+            if case is None:
+                break
+            if row_range:
+                if case.row_id < row_range[0]:
+                    continue
+                if case.row_id > row_range[1]:
+                    break
+            out_row = _evaluate_case(
+                case, testcases.columns, corpus_id, generator_model,
+                corpus_state=corpus_state, row_delay=row_delay, incremental=incremental
+            )
+            out_row["t_read_s"] = round(read_seconds, 4)
+            read_seconds = 0.0
+            evaluated_rows.append(out_row)
+
+            # Checkpoint every 5 rows
+            if len(evaluated_rows) % CHECKPOINT_EVERY_ROWS == 0:
+                started = time.perf_counter()
+                _save_rows_to_gcs(evaluated_rows, checkpoint_blob_path, is_temp=True)
+                # Summary only (UNPERSISTED_COLUMNS): the file above was written before it was known
+                out_row["t_checkpoint_s"] = round(time.perf_counter() - started, 4)
+    except Exception as e:
+        logger.error(f"Regression test interrupted: {e}")
+        # Try to save whatever we have so far
+        _save_rows_to_gcs(evaluated_rows, checkpoint_blob_path, is_temp=True)
+        return evaluated_rows, str(e)
+    finally:
+        testcases.close()
+    return evaluated_rows, None
+
+def _run_shard(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Evaluates one contiguous row range of the sheet in a shard worker (see shard_worker.run_shard).
+    """
+    rows, error = _evaluate_cases(
+        open_testcases(spec["excel_path"]),
+        spec["corpus_id"],
+        spec["generator_model"],
+        spec["checkpoint_blob_path"],
+        spec["row_delay"],
+        row_range=(spec["first_row_id"], spec["last_row_id"]),
+        corpus_state=spec["corpus_state"],
+        incremental=spec["incremental"],
+    )
+    return {"shard": spec["shard"], "rows": rows, "error": error, "checkpoint_blob_path": spec["checkpoint_blob_path"]}
+
+def _plan_shards(excel_path: str, shards: int) -> List[Tuple[int, int]]:
+    """
+    Splits the sheet into at most `shards` contiguous row_id ranges with equal numbers of test cases.
+    """
+    row_ids = [case.row_id for case in open_testcases(excel_path)]
+    shards = max(1, min(shards, len(row_ids)))
+    ranges = []
+    for k in range(shards):
+        lo = k * len(row_ids) // shards
+        hi = (k + 1) * len(row_ids) // shards
+        if hi > lo:
+            ranges.append((row_ids[lo], row_ids[hi - 1]))
+    return ranges
+
+def _evaluate_sharded(
+    excel_path: str,
+    corpus_id: str,
+    generator_model: str,
+    shards: int,
+    checkpoint_prefix: str,
+    corpus_state: str = "",
+    incremental: Optional[Dict[str, Any]] = None
+) -> Tuple[List[Dict[str, Any]], List[str], List[str]]:
+    """
+    Evaluates the sheet in a process pool, one row range per process. Every shard gets
+    1/shards of the row rate (so the combined rate matches a serial run) and its own checkpoint.
+
+    Returns the merged rows (in row order), the errors of interrupted shards and the shard
+    checkpoint blob paths.
+    """
+    ranges = _plan_shards(excel_path, shards)
+    specs = [
+        {
+            "shard": k,
+            "excel_path": excel_path,
+            "corpus_id": corpus_id,
+            "generator_model": generator_model,
+            "checkpoint_blob_path": f"{checkpoint_prefix}_shard{k}_working.xlsx",
+            "row_delay": EVAL_ROW_DELAY_SECONDS * len(ranges),
+            "first_row_id": first,
+            "last_row_id": last,
+            "corpus_state": corpus_state,
+            "incremental": incremental,
+        }
+        for k, (first, last) in enumerate(ranges)
+    ]
+    logger.info(f"Evaluating {excel_path} in {len(specs)} shards: {ranges}")
+
+    context = multiprocessing.get_context(EVAL_SHARD_START_METHOD)
+    with ProcessPoolExecutor(max_workers=len(specs), mp_context=context) as pool:
+        # Workers start while the tasks are submitted; they import only the evaluation code
+        with shard_worker_environment():
+            results = pool.map(run_shard, specs)
+        outputs = list(results)
+
+    rows = [row for output in sorted(outputs, key=lambda o: o["shard"]) for row in output["rows"]]
+    rows.sort(key=lambda r: r["row_id"])
+    errors = [f"shard {o['shard']}: {o['error']}" for o in outputs if o["error"]]
+    return rows, errors, [spec["checkpoint_blob_path"] for spec in specs]
+
+def _summarize_timing(evaluated_rows: List[Dict[str, Any]], wall_seconds: Optional[float]) -> Dict[str, Any]:
+    """
+    p50 / p95 / max / total wall time per stage over the rows where the stage ran,
+    plus overall rows per second.
+    """
+    stages = {}
+    for stage, column in STAGE_COLUMNS.items():
+        values = sorted(r[column] for r in evaluated_rows if r.get(column) is not None)
+        stages[stage] = {
+            "rows": len(values),
+            "p50_s": round(percentile(values, 50), 4),
+            "p95_s": round(percentile(values, 95), 4),
+            "max_s": round(values[-1], 4) if values else 0.0,
+            "total_s": round(float(sum(values)), 3),
+        }
+    timing = {"stages": stages}
+    if wall_seconds is not None:
+        timing["wall_seconds"] = round(wall_seconds, 3)
+        timing["rows_per_second"] = round(len(evaluated_rows) / wall_seconds, 3) if wall_seconds > 0 else 0.0
+    return timing
+
+def _summarize_rows(evaluated_rows: List[Dict[str, Any]], wall_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Builds the run summary from the result rows (in row order), so serial and sharded runs agree.
+    `wall_seconds` (the run's elapsed time) is used for the rows-per-second figure.
+    """
+    total_rows = len(evaluated_rows)
+    total_score = sum(r["score"] for r in evaluated_rows)
+    avg_score = total_score / total_rows if total_rows > 0 else 0
+    failures = [r["row_id"] for r in evaluated_rows if r["status"] == "FAIL"]
+    passed = [r["row_id"] for r in evaluated_rows if r["status"] == "PASS"]
+
+    context_tokens_after = sum(r["context_tokens"] for r in evaluated_rows)
+    context_tokens_before = context_tokens_after + sum(r["context_tokens_saved"] for r in evaluated_rows)
+    logger.info(f"Context builder saved {context_tokens_before - context_tokens_after} of {context_tokens_before} generator context tokens")
+
+    summary = {
+        "total_queries": total_rows,
+        "passed": len(passed),
+        "failed": len(failures),
+        "average_score": round(avg_score, 2),
+        "failed_row_ids": failures,
+        "passed_row_ids": passed,
+        "context_tokens": {
+            "retrieved": context_tokens_before,
+            "sent_to_generator": context_tokens_after,
+            "saved": context_tokens_before - context_tokens_after,
+            "saved_pct": round(100.0 * (context_tokens_before - context_tokens_after) / context_tokens_before, 1) if context_tokens_before else 0.0,
+            "generator_prompt_tokens": sum(r["prompt_tokens"] for r in evaluated_rows),
+        },
+        "corpus_state": evaluated_rows[0]["corpus_state"] if evaluated_rows else None,
+        "timing": _summarize_timing(evaluated_rows, wall_seconds),
+        "llm_usage": {
+            "prompt_tokens": sum(r["llm_prompt_tokens"] for r in evaluated_rows),
+            "completion_tokens": sum(r["llm_completion_tokens"] for r in evaluated_rows),
+            "total_tokens": sum(r["llm_prompt_tokens"] + r["llm_completion_tokens"] for r in evaluated_rows),
+        },
+    }
+
+    if evaluated_rows and "run_mode" in evaluated_rows[0]:
+        modes = {mode: 0 for mode in ("affected", "new", "sampled", "carried_forward")}
+        for r in evaluated_rows:
+            modes[r["run_mode"]] += 1
+        # Sampled rows were unaffected by the corpus change; a changed verdict means carrying forward was unsafe
+        sample_changes = [
+            r["row_id"] for r in evaluated_rows
+            if r["run_mode"] == "sampled" and (r["previous_score"] >= PASS_THRESHOLD) != (r["status"] == "PASS")
+        ]
+        summary["incremental"] = {
+            "evaluated": total_rows - modes["carried_forward"],
+            **modes,
+            "sampled_status_changes": len(sample_changes),
+            "sampled_status_changed_row_ids": sample_changes,
+            "llm_calls_saved": 2 * modes["carried_forward"],
+        }
+    return summary
+
 # =================MAIN PROCESS =====================
 # =================MAIN PROCESS =====================
 def automated_evaluation_testcase(
     tool_context : ToolContext,
     candidate_corpus: str,
     excel_path:str,
+    shards: int = 1,
+    previous_results_uri: Optional[str] = None,
+    changed_files: Optional[List[str]] = None,
+    sample_rate: Optional[float] = None,
 
 ) -> Dict[str,Any]:
 
     """
     Plan:
 
-    1. Read the Excel file using pandas .
-    2. Iterate through the rows.
-    3. For each row, execute a RAG query using query_corpus .
+    1. Stream the test sheet (.xlsx, .csv or .parquet) row by row.
+    2. Iterate through the rows (with shards > 1: split into row ranges run in a process pool).
+    3. For each row, execute a RAG query (corpus_tools.retrieve).
     4.  Compare the result with the ground truth using an LLM as a judge ().
-    5. Update the pandas DataFrame with the results (RAG response, Score, Pass/Fail status).
-    6. Return the final DataFrame (as a dict/list of records) and summary statistics.
+    5. Write the result rows (RAG response, Score, Pass/Fail status) to an Excel file in GCS.
+    6. Return the results file URI and summary statistics.
+
+    Every row records the source URIs it retrieved (`retrieved_sources`) and the corpus state
+    it ran against (`corpus_state`, a fingerprint of the corpus file listing).
+
+    Incremental mode (`previous_results_uri` = results file of an earlier run): every row is
+    retrieved again, but only rows whose retrieved sources changed or include a changed file,
+    new rows, and a random `sample_rate` share of the rest are generated and judged; the
+    remaining rows carry their previous results forward. `changed_files` (file names or GCS
+    URIs imported / deleted since that run) defaults to the difference between the corpus
+    listing recorded for the previous run and the current one.
 
     """
 
-    # Read Excel 
-    df = pd.read_excel(excel_path)
-    
-    # Identify columns (flexible) by checking lowercase stripped versions but keeping original headers
-    # Create a mapping for easy lookup
-    col_map = {str(c).lower().strip(): c for c in df.columns}
-    
-    # Find actual column names in the dataframe
-    query_col_name = next((c for c in col_map.keys() if c in ['query', 'question', 'input', 'user query']), list(col_map.keys())[0])
-    truth_col_name = next((c for c in col_map.keys() if c in ['ground_truth', 'ground truth', 'groundtruth', 'expected', 'truth', 'answer', 'correct answer']), None)
-    
-    query_col = col_map[query_col_name]
-    truth_col = col_map[truth_col_name] if truth_col_name else None
+    # Open the sheet for streaming (xlsx / csv / parquet); columns are detected once from the header
+    try:
+        testcases = open_testcases(excel_path)
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Failed to read test cases from {excel_path}: {str(e)}"
+        }
 
     # Resolve Corpus ID
     corpus_id = candidate_corpus
@@ -197,23 +772,62 @@ def automated_evaluation_testcase(
         corpus_id = resolved_id
 
     # Check if corpus has files
-    files_res = list_files(corpus_id)
+    files_res = list_files(corpus_id, page_size=0, fields=["id", "display_name", "create_time"])
     if files_res.get("status") != "success":
+        testcases.close()
         return {
              "status": "error", 
              "message": f"Failed to list files for corpus {candidate_corpus} (ID: {corpus_id}): {files_res.get('message')}"
          }
 
     if not files_res.get("files"):
+         testcases.close()
          return {
              "status": "error", 
              "message": f"Corpus {candidate_corpus} (ID: {corpus_id}) is empty. Please ensure 'create_candidate_corpus' completed successfully and files were imported."
          }
 
-    # Loop and Validate
-    total_score = 0
-    pass_count = 0
-    evaluated_rows = []
+    generator_model = os.getenv("AZURE", "azure/gpt-4o")
+    shards = max(1, min(int(shards or 1), EVAL_MAX_SHARDS))
+
+    # Fingerprint the corpus listing; the manifest lets a later incremental run work out what changed
+    corpus_state, manifest = _corpus_state(files_res["files"])
+    _save_manifest(corpus_id, corpus_state, manifest)
+
+    incremental = None
+    incremental_info = None
+    if previous_results_uri:
+        try:
+            previous = _load_previous_results(previous_results_uri)
+        except Exception as e:
+            testcases.close()
+            return {
+                "status": "error",
+                "message": f"Failed to read previous results from {previous_results_uri}: {str(e)}"
+            }
+        previous_states = sorted({str(r.get("corpus_state")) for r in previous.values() if r.get("corpus_state")})
+        changed_source = "argument"
+        if changed_files is None:
+            changed_files = _changed_files_between(corpus_id, previous_states[0], manifest) if len(previous_states) == 1 else None
+            changed_source = "corpus_manifest"
+            if changed_files is None:
+                changed_files = []
+                changed_source = "unavailable"
+                logger.warning("No corpus manifest for the previous run; only rows whose retrieved sources changed are re-evaluated")
+        incremental = {
+            "previous": previous,
+            "changed": {_source_key(f) for f in changed_files},
+            "sample_rate": EVAL_INCREMENTAL_SAMPLE_RATE if sample_rate is None else max(0.0, min(1.0, float(sample_rate))),
+            "seed": corpus_state,
+            "query_index": testcases.query_index,
+        }
+        incremental_info = {
+            "previous_results_uri": previous_results_uri,
+            "previous_corpus_state": previous_states[0] if len(previous_states) == 1 else previous_states,
+            "changed_files": sorted(changed_files),
+            "changed_files_source": changed_source,
+            "sample_rate": incremental["sample_rate"],
+        }
 
     # Setup for continuous save
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -224,27 +838,6 @@ def automated_evaluation_testcase(
     temp_blob_path = f"temp_processing/{base_name}_{timestamp}_working.xlsx"
     final_blob_path = f"eval_results/{date_folder}/{base_name}_results_{timestamp}.xlsx"
 
-    # Helper to save current progress to GCS
-    def save_progress_to_gcs(current_rows, blob_path, is_temp=True):
-        if not storage_client: return
-        try:
-            temp_df = pd.DataFrame(current_rows)
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                temp_df.to_excel(writer, index=False)
-            output_bytes = output.getvalue()
-            
-            bucket = storage_client.bucket(EVAL_BUCKET_NAME)
-            blob = bucket.blob(blob_path)
-            blob.upload_from_string(
-                data=output_bytes,
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            if not is_temp:
-                logger.info(f"Saved results to gs://{EVAL_BUCKET_NAME}/{blob_path}")
-        except Exception as e:
-            logger.warning(f"Failed to save progress to {blob_path}: {e}")
-
     # 1. Upload initial file to temp location
     try:
         if storage_client:
@@ -258,106 +851,58 @@ def automated_evaluation_testcase(
             logger.info(f"Uploaded working copy to gs://{EVAL_BUCKET_NAME}/{temp_blob_path}")
     except Exception as e:
         logger.warning(f"Failed to upload initial working copy: {e}")
-    
-    try:
-        for index, row in df.iterrows():
-            # Add delay to avoid hitting rate limits (LLM/Vertex AI quotas)
-            time.sleep(2)
-            
-            query_text = str(row[query_col])
-            # Use the identified truth column, but keep strict N/A handling for evaluation
-            ground_truth = str(row[truth_col]) if truth_col and truth_col in df.columns else "N/A"
-            if ground_truth.lower() == 'nan': ground_truth = "N/A"
-            
-            # Query RAG
-            rag_result = query_corpus(corpus_id=corpus_id, query=query_text)
-            
-            response_text = "No response"
-            citations = []
-            chunks = []
-            if rag_result.get("status") == "success":
-                 if "results" in rag_result and rag_result["results"]:
-                     # Get top 1 chunks
-                     top_results = rag_result["results"][:5]
-                     
-                     # Prepare context from chunks
-                     context_text = "\n\n".join([r.get("text", "") for r in top_results])
-                     chunks = [r.get("text", "") for r in top_results]
-                     
-                     # Generate Answer using LLM
-                     response_text = _generate_answer(query_text, context_text)
-                     
-                     # Extract citations (source_uri)
-                     citations = list(set([r.get("source_uri", "Unknown") for r in rag_result["results"] if r.get("source_uri")]))
-            
-            # Evaluate
-            eval_result = _evaluate_with_llm(query_text, response_text, ground_truth)
-            score = eval_result.get("score", 0.0)
-            
-            is_pass = score >= 0.7
-            if is_pass: pass_count += 1
-            total_score += score
-            
-            # Construct Output Row:
-            # 1. Start with original row data to preserve structure and values
-            out_row = row.to_dict()
-            
-            # 2. Append new results columns
-            out_row['rag_response'] = response_text[:1000] + "..." if len(response_text) > 1000 else response_text
-            
-            # Add top 1 chunk
-            for i in range(1):
-                out_row[f'chunk_{i+1}'] = chunks[i] if i < len(chunks) else ""
-
-            out_row['citations'] = ", ".join(citations)
-            out_row['score'] = score
-            out_row['status'] = "PASS" if is_pass else "FAIL"
-            out_row['reason'] = eval_result.get("reason", "")
-            out_row['row_id'] = index + 1
-            
-            # Sanitize for JSON/LiteLLM compatibility (handle NaN, Timestamp, etc.)
-            for k, v in out_row.items():
-                if pd.isna(v):  # Handles NaN, None, NaT
-                    out_row[k] = None
-                elif isinstance(v, (pd.Timestamp, datetime.datetime, datetime.date)):
-                    out_row[k] = str(v)
-            
-            evaluated_rows.append(out_row)
 
-            # Checkpoint every 5 rows
-            if (index + 1) % 5 == 0:
-                save_progress_to_gcs(evaluated_rows, temp_blob_path, is_temp=True)
-
-    except Exception as e:
-        logger.error(f"Regression test interrupted: {e}")
-        # Try to save whatever we have so far
-        save_progress_to_gcs(evaluated_rows, temp_blob_path, is_temp=True)
-        return {
-            "status": "error", 
-            "message": f"Regression test failed/interrupted: {str(e)}", 
-            "partial_results_uri": f"gs://{EVAL_BUCKET_NAME}/{temp_blob_path}"
-        }
+    # 2. Evaluate rows
+    run_started = time.perf_counter()
+    if shards > 1:
+        testcases.close()
+        try:
+            evaluated_rows, errors, shard_blob_paths = _evaluate_sharded(
+                excel_path, corpus_id, generator_model, shards,
+                checkpoint_prefix=f"temp_processing/{base_name}_{timestamp}",
+                corpus_state=corpus_state, incremental=incremental
+            )
+        except Exception as e:
+            logger.error(f"Sharded regression test failed: {e}")
+            return {
+                "status": "error",
+                "message": f"Regression test failed/interrupted: {str(e)}"
+            }
+        if errors:
+            return {
+                "status": "error",
+                "message": f"Regression test failed/interrupted: {'; '.join(errors)}",
+                "partial_results_uris": [f"gs://{EVAL_BUCKET_NAME}/{p}" for p in shard_blob_paths]
+            }
+        temp_blob_paths = [temp_blob_path] + shard_blob_paths
+    else:
+        evaluated_rows, error = _evaluate_cases(
+            testcases, corpus_id, generator_model, temp_blob_path, EVAL_ROW_DELAY_SECONDS,
+            corpus_state=corpus_state, incremental=incremental
+        )
+        if error:
+            return {
+                "status": "error", 
+                "message": f"Regression test failed/interrupted: {error}", 
+                "partial_results_uri": f"gs://{EVAL_BUCKET_NAME}/{temp_blob_path}"
+            }
+        temp_blob_paths = [temp_blob_path]
 
-    avg_score = total_score / len(df) if len(df) > 0 else 0
-    failures = [r["row_id"] for r in evaluated_rows if r["status"] == "FAIL"]
+    summary = _summarize_rows(evaluated_rows, wall_seconds=time.perf_counter() - run_started)
+    if incremental_info:
+        summary["incremental"] = {**incremental_info, **summary.get("incremental", {})}
     
     # Save results directly to GCS
     results_gcs_uri = ""
     try:
         # Save final to output folder
-        save_progress_to_gcs(evaluated_rows, final_blob_path, is_temp=False)
+        started = time.perf_counter()
+        _save_rows_to_gcs(evaluated_rows, final_blob_path, is_temp=False)
+        summary["timing"]["final_upload_seconds"] = round(time.perf_counter() - started, 3)
         results_gcs_uri = f"gs://{EVAL_BUCKET_NAME}/{final_blob_path}"
 
-        # Clean up temp file
-        if storage_client:
-            try:
-                bucket = storage_client.bucket(EVAL_BUCKET_NAME)
-                blob = bucket.blob(temp_blob_path)
-                if blob.exists():
-                    blob.delete()
-                    logger.info(f"Deleted temporary working file: {temp_blob_path}")
-            except Exception as e:
-                logger.warning(f"Failed to delete temp file {temp_blob_path}: {e}")
+        # Clean up temp files
+        _delete_blobs(temp_blob_paths)
 
     except Exception as e:
         logger.error(f"Failed to save/upload regression results: {e}")
@@ -367,13 +912,6 @@ def automated_evaluation_testcase(
         "status": "success",
         "project_id": PROJECT_ID,
         "results_file_uri": results_gcs_uri,
-        "summary": {
-            "total_queries": len(df),
-            "passed": pass_count,
-            "failed": len(failures),
-            "average_score": round(avg_score, 2),
-            "failed_row_ids": failures,
-            "passed_row_ids": [r["row_id"] for r in evaluated_rows if r["status"] == "PASS"]
-        },
+        "summary": summary,
         # "details": evaluated_rows  # Removed to prevent LLM token limit errors. Full results are in the Excel file.
     }
@@ -0,0 +1,63 @@
+# ====================== SHARD WORKER =====================
+#
+# Entry point of the sharded evaluation worker processes. The workers are spawned, so each one
+# imports the `rag` package afresh. Processes started inside shard_worker_environment() carry
+# EVAL_SHARD_WORKER_ENV, which makes rag/__init__.py skip the agent, the Vertex AI warm-up
+# threads and the metrics exporters: a worker loads only the evaluation code it runs, and does
+# not start a second exporter on the parent's metrics port.
+
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+# Ensure parent directory is in path to allow imports if running as script or module
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+try:
+    from config import EVAL_SHARD_WORKER_ENV
+except ImportError:
+    try:
+        from rag.config import EVAL_SHARD_WORKER_ENV
+    except ImportError:
+        from ...config import EVAL_SHARD_WORKER_ENV
+
+_environ_lock = threading.Lock()
+
+
+@contextmanager
+def shard_worker_environment() -> Iterator[None]:
+    """
+    Marks the processes started inside the block as shard workers. Spawned processes copy the
+    environment when they start, so the pool's workers must be started within the block.
+    """
+    with _environ_lock:
+        previous = os.environ.get(EVAL_SHARD_WORKER_ENV)
+        os.environ[EVAL_SHARD_WORKER_ENV] = "1"
+        try:
+            yield
+        finally:
+            if previous is None:
+                os.environ.pop(EVAL_SHARD_WORKER_ENV, None)
+            else:
+                os.environ[EVAL_SHARD_WORKER_ENV] = previous
+
+
+def run_shard(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Process-pool worker: evaluates one contiguous row range of the sheet (see
+    lifecycle_main._evaluate_sharded for the spec).
+    """
+    # Imported here: the parent imports this module from lifecycle_main
+    try:
+        from tools.lifecycle import lifecycle_main
+    except ImportError:
+        try:
+            from rag.tools.lifecycle import lifecycle_main
+        except ImportError:
+            from . import lifecycle_main
+    return lifecycle_main._run_shard(spec)
@@ -0,0 +1,179 @@
+import os
+import csv
+import math
+import datetime
+import logging
+from typing import Any, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUERY_COLUMN_NAMES = ['query', 'question', 'input', 'user query']
+TRUTH_COLUMN_NAMES = ['ground_truth', 'ground truth', 'groundtruth', 'expected', 'truth', 'answer', 'correct answer']
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+CSV_EXTENSIONS = ('.csv',)
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+PARQUET_BATCH_SIZE = 1024
+
+
+class TestCase:
+    """
+    One regression test row. `values` holds the sanitised cells in header order
+    (NaN -> None, dates -> ISO strings), so the original row can be written back as-is.
+    """
+
+    __slots__ = ("row_id", "query", "ground_truth", "values")
+
+    def __init__(self, row_id: int, query: str, ground_truth: str, values: Tuple[Any, ...]):
+        self.row_id = row_id
+        self.query = query
+        self.ground_truth = ground_truth
+        self.values = values
+
+    def as_dict(self, columns: List[str]) -> dict:
+        return dict(zip(columns, self.values))
+
+
+def _sanitize(value: Any) -> Any:
+    # Cells are mostly str / int / None, so test those first
+    if value is None or isinstance(value, (str, int)):
+        return value
+    if isinstance(value, float):
+        return None if math.isnan(value) else value
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return str(value)
+    return value
+
+
+def _detect_column(columns: List[str], candidates: List[str]) -> Optional[int]:
+    lowered = [str(c).lower().strip() for c in columns]
+    for i, name in enumerate(lowered):
+        if name in candidates:
+            return i
+    return None
+
+
+class TestCaseReader:
+    """
+    Streams test cases from an .xlsx, .csv or .parquet sheet without loading it into memory.
+
+    The header is read once on open: `columns` holds the column names and the query / ground
+    truth columns are detected by name (query falls back to the first column). Iterating yields
+    TestCase records; fully empty rows are skipped but still counted in `row_id`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._closers = []
+        extension = os.path.splitext(path)[1].lower()
+        if extension in EXCEL_EXTENSIONS:
+            self._rows = self._excel_rows()
+        elif extension in CSV_EXTENSIONS:
+            self._rows = self._csv_rows()
+        elif extension in PARQUET_EXTENSIONS:
+            self._rows = self._parquet_rows()
+        else:
+            raise ValueError(f"Unsupported test case file type '{extension}'. Use .xlsx, .csv or .parquet")
+
+        try:
+            header = next(self._rows)
+        except StopIteration:
+            header = ()
+        self.columns = [
+            str(c) if c is not None and str(c) != "" else f"Unnamed: {i}"
+            for i, c in enumerate(header)
+        ]
+        if not self.columns:
+            self.close()
+            raise ValueError(f"Test case file {path} has no header row")
+
+        query_index = _detect_column(self.columns, QUERY_COLUMN_NAMES)
+        self.query_index = query_index if query_index is not None else 0
+        self.truth_index = _detect_column(self.columns, TRUTH_COLUMN_NAMES)
+        self.query_column = self.columns[self.query_index]
+        self.truth_column = self.columns[self.truth_index] if self.truth_index is not None else None
+        self.rows_read = 0
+
+    # -- format readers: each yields the header first, then raw row tuples
+    def _excel_rows(self) -> Iterator[Tuple[Any, ...]]:
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(self.path, read_only=True, data_only=True)
+        self._closers = [workbook.close]
+        return workbook.worksheets[0].iter_rows(values_only=True)
+
+    def _csv_rows(self) -> Iterator[Tuple[Any, ...]]:
+        handle = open(self.path, "r", encoding="utf-8-sig", newline="")
+        self._closers = [handle.close]
+
+        def rows():
+            for row in csv.reader(handle):
+                yield tuple(v if v != "" else None for v in row)
+
+        return rows()
+
+    def _parquet_rows(self) -> Iterator[Tuple[Any, ...]]:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Reading .parquet test cases requires pyarrow (pip install pyarrow)")
+
+        parquet_file = pq.ParquetFile(self.path)
+        self._closers = [getattr(parquet_file, "close", lambda: None)]
+
+        def rows():
+            yield tuple(parquet_file.schema_arrow.names)
+            for batch in parquet_file.iter_batches(batch_size=PARQUET_BATCH_SIZE):
+                yield from zip(*(column.to_pylist() for column in batch.columns))
+
+        return rows()
+
+    def __iter__(self) -> Iterator[TestCase]:
+        width = len(self.columns)
+        query_index = self.query_index
+        truth_index = self.truth_index
+        row_id = 0
+        try:
+            for raw in self._rows:
+                row_id += 1
+                if not any(v is not None for v in raw):
+                    continue
+                values = tuple(_sanitize(v) for v in raw[:width])
+                if len(values) < width:
+                    values = values + (None,) * (width - len(values))
+
+                query = values[query_index]
+                truth = values[truth_index] if truth_index is not None else None
+                self.rows_read += 1
+                yield TestCase(
+                    row_id,
+                    str(query) if query is not None else "",
+                    str(truth) if truth is not None else "N/A",
+                    values,
+                )
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        for closer in self._closers:
+            try:
+                closer()
+            except Exception as e:
+                logger.warning(f"Failed to close {self.path}: {e}")
+        self._closers = []
+
+    def __enter__(self) -> "TestCaseReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_testcases(path: str) -> TestCaseReader:
+    """
+    Opens a regression test sheet for streaming. Raises ValueError for unsupported or empty files.
+    """
+    if not os.path.exists(path):
+        raise ValueError(f"Test case file not found: {path}")
+    return TestCaseReader(path)
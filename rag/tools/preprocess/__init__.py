@@ -0,0 +1,7 @@
+from .preprocess_tools import (
+    MinHasher,
+    MinHashLSH,
+    chunk_count,
+    extract_text,
+    prechunk_files,
+)
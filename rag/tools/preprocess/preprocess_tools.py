@@ -0,0 +1,415 @@
+# ====================== PREPROCESS TOOLS =====================
+#
+# Local pre-chunking with near-duplicate elimination before files are imported into a corpus.
+#
+# Policy documents share a lot of boilerplate (disclaimers, T&Cs). Vertex AI would embed every
+# copy. Here each document is extracted and chunked locally (in a process pool) with the same
+# chunk size / overlap the import uses, every chunk gets a MinHash signature, and an LSH index
+# drops chunks that near-duplicate a chunk seen earlier in the batch. The remaining text of each
+# document is staged as a .txt file and imported instead of the original.
+
+import io
+import os
+import re
+import sys
+import html
+import math
+import time
+import contextvars
+import zlib
+import logging
+import datetime
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from google.cloud import storage
+
+# Ensure parent directory is in path to allow imports if running as script or module
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+try:
+    from config import (
+        STAGING_BUCKET_NAME,
+        RAG_DEFAULT_CHUNK_SIZE,
+        RAG_DEFAULT_CHUNK_OVERLAP,
+        PRECHUNK_MAX_WORKERS,
+        PRECHUNK_DOWNLOAD_WORKERS,
+        PRECHUNK_START_METHOD,
+        PRECHUNK_MIN_BYTES_PER_WORKER,
+        PRECHUNK_TOKENIZER,
+        PRECHUNK_SHINGLE_WORDS,
+        PRECHUNK_MINHASH_PERMUTATIONS,
+        PRECHUNK_LSH_BANDS,
+        PRECHUNK_DUPLICATE_THRESHOLD,
+        PRECHUNK_STAGING_PREFIX,
+    )
+except ImportError:
+    try:
+        from rag.config import (
+            STAGING_BUCKET_NAME,
+            RAG_DEFAULT_CHUNK_SIZE,
+            RAG_DEFAULT_CHUNK_OVERLAP,
+            PRECHUNK_MAX_WORKERS,
+            PRECHUNK_DOWNLOAD_WORKERS,
+            PRECHUNK_START_METHOD,
+            PRECHUNK_MIN_BYTES_PER_WORKER,
+            PRECHUNK_TOKENIZER,
+            PRECHUNK_SHINGLE_WORDS,
+            PRECHUNK_MINHASH_PERMUTATIONS,
+            PRECHUNK_LSH_BANDS,
+            PRECHUNK_DUPLICATE_THRESHOLD,
+            PRECHUNK_STAGING_PREFIX,
+        )
+    except ImportError:
+        from ...config import (
+            STAGING_BUCKET_NAME,
+            RAG_DEFAULT_CHUNK_SIZE,
+            RAG_DEFAULT_CHUNK_OVERLAP,
+            PRECHUNK_MAX_WORKERS,
+            PRECHUNK_DOWNLOAD_WORKERS,
+            PRECHUNK_START_METHOD,
+            PRECHUNK_MIN_BYTES_PER_WORKER,
+            PRECHUNK_TOKENIZER,
+            PRECHUNK_SHINGLE_WORDS,
+            PRECHUNK_MINHASH_PERMUTATIONS,
+            PRECHUNK_LSH_BANDS,
+            PRECHUNK_DUPLICATE_THRESHOLD,
+            PRECHUNK_STAGING_PREFIX,
+        )
+
+logger = logging.getLogger(__name__)
+
+TEXT_EXTENSIONS = ('.txt', '.md', '.csv', '.json', '.xml')
+HTML_EXTENSIONS = ('.html', '.htm')
+PDF_EXTENSIONS = ('.pdf',)
+
+# Prime just above 2**32: (a * h + b) stays below 2**64 for 32-bit hashes and 31-bit coefficients
+_MINHASH_PRIME = np.uint64(4294967311)
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_TAG_RE = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.IGNORECASE | re.DOTALL)
+
+
+# ---------------------------------------------------------------- extraction and chunking
+
+def extract_text(filename: str, data: bytes) -> str:
+    """
+    Extracts plain text from a document. Raises ValueError for unsupported types
+    (those files are imported unchanged and chunked by Vertex AI).
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in TEXT_EXTENSIONS:
+        return data.decode("utf-8", errors="replace")
+    if extension in HTML_EXTENSIONS:
+        return html.unescape(_TAG_RE.sub(" ", data.decode("utf-8", errors="replace")))
+    if extension in PDF_EXTENSIONS:
+        try:
+            import pypdf
+        except ImportError:
+            raise ValueError("Pre-chunking .pdf files requires pypdf (pip install pypdf)")
+        reader = pypdf.PdfReader(io.BytesIO(data))
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    raise ValueError(f"Unsupported file type '{extension}' for local pre-chunking")
+
+
+class _Tokenizer:
+    """tiktoken encoding if available, whitespace words otherwise."""
+
+    def __init__(self, name: str = PRECHUNK_TOKENIZER):
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(name)
+        except Exception:
+            self._encoding = None
+
+    def encode(self, text: str) -> List[Any]:
+        if self._encoding is not None:
+            return self._encoding.encode(text, disallowed_special=())
+        return text.split()
+
+    def decode(self, tokens: List[Any]) -> str:
+        if self._encoding is not None:
+            return self._encoding.decode(tokens)
+        return " ".join(tokens)
+
+
+def chunk_count(tokens: int, chunk_size: int, chunk_overlap: int) -> int:
+    """Number of fixed-size windows (stride chunk_size - chunk_overlap) needed to cover `tokens` tokens."""
+    if tokens <= 0:
+        return 0
+    stride = max(1, chunk_size - chunk_overlap)
+    return 1 + max(0, math.ceil((tokens - chunk_size) / stride))
+
+
+def chunk_tokens(tokens: List[Any], chunk_size: int, chunk_overlap: int) -> List[Tuple[int, int, int]]:
+    """
+    Splits a token sequence into overlapping windows. Returns (start, end, core_end) per chunk,
+    where [start, core_end) is the part not repeated by the next chunk's overlap.
+    """
+    stride = max(1, chunk_size - chunk_overlap)
+    chunks = []
+    for start in range(0, max(1, len(tokens)), stride):
+        end = min(start + chunk_size, len(tokens))
+        last = end >= len(tokens)
+        chunks.append((start, end, end if last else start + stride))
+        if last:
+            break
+    return chunks
+
+
+# ---------------------------------------------------------------- MinHash / LSH
+
+class MinHasher:
+    """MinHash signatures over word shingles, computed with one vectorised pass per text."""
+
+    def __init__(self, num_perm: int = PRECHUNK_MINHASH_PERMUTATIONS, shingle_words: int = PRECHUNK_SHINGLE_WORDS, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        self._a = rng.randint(1, 2**31 - 1, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 2**31 - 1, size=num_perm).astype(np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        words = _WORD_RE.findall(text.lower())
+        k = self.shingle_words
+        shingles = {" ".join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((np.outer(hashes, self._a) + self._b) % _MINHASH_PRIME).min(axis=0).astype(np.uint32)
+
+
+class MinHashLSH:
+    """
+    Banded LSH over MinHash signatures. `add_if_new` keeps the first chunk of every
+    near-duplicate group: candidates sharing a band are verified by estimated Jaccard similarity.
+    """
+
+    def __init__(self, num_perm: int = PRECHUNK_MINHASH_PERMUTATIONS, bands: int = PRECHUNK_LSH_BANDS, threshold: float = PRECHUNK_DUPLICATE_THRESHOLD):
+        self.rows = max(1, num_perm // bands)
+        self.bands = num_perm // self.rows
+        self.threshold = threshold
+        self._tables: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._signatures: List[np.ndarray] = []
+
+    def add_if_new(self, signature: np.ndarray) -> Optional[int]:
+        """Returns the index of the matching earlier chunk, or None after adding this one."""
+        keys = [signature[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+        checked = set()
+        for table, key in zip(self._tables, keys):
+            for candidate in table.get(key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if float(np.mean(self._signatures[candidate] == signature)) >= self.threshold:
+                    return candidate
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for table, key in zip(self._tables, keys):
+            table.setdefault(key, []).append(index)
+        return None
+
+
+# ---------------------------------------------------------------- pipeline
+
+def _prepare_document(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Process-pool worker: extracts and chunks one document and signs every chunk.
+    Returns per chunk the non-overlapping "core" text (used to rebuild the document) and its
+    token count, plus the MinHash signatures of the full chunks.
+    """
+    try:
+        text = extract_text(spec["name"], spec["data"])
+    except Exception as e:
+        return {"uri": spec["uri"], "error": str(e)}
+    tokenizer = _Tokenizer()
+    hasher = MinHasher()
+    tokens = tokenizer.encode(text)
+    cores, core_tokens, signatures = [], [], []
+    for start, end, core_end in chunk_tokens(tokens, spec["chunk_size"], spec["chunk_overlap"]):
+        cores.append(tokenizer.decode(tokens[start:core_end]))
+        core_tokens.append(core_end - start)
+        signatures.append(hasher.signature(tokenizer.decode(tokens[start:end])))
+    return {
+        "uri": spec["uri"],
+        "error": None,
+        "tokens": len(tokens),
+        "cores": cores,
+        "core_tokens": core_tokens,
+        "signatures": np.vstack(signatures) if signatures else np.zeros((0, PRECHUNK_MINHASH_PERMUTATIONS), dtype=np.uint32),
+    }
+
+
+def _split_gcs_uri(uri: str) -> Tuple[str, str]:
+    if not uri.startswith("gs://"):
+        raise ValueError(f"Expected a gs:// URI, got '{uri}'")
+    bucket_name, _, blob_path = uri[len("gs://"):].partition("/")
+    return bucket_name, blob_path
+
+
+def staged_blob_path(corpus_id: str, run_id: str, uri: str) -> str:
+    """
+    Staging blob of a pre-chunked source file. The source bucket and path are kept, so files
+    with the same name in different folders do not overwrite each other.
+    """
+    bucket_name, blob_path = _split_gcs_uri(uri)
+    return f"{PRECHUNK_STAGING_PREFIX}/{corpus_id}/{run_id}/{bucket_name}/{blob_path}.txt"
+
+
+def source_uri_of_staged(uri: str) -> Optional[str]:
+    """The gs:// URI a staged pre-chunked copy was made from, or None if `uri` is not a staged copy."""
+    prefix = f"gs://{STAGING_BUCKET_NAME}/{PRECHUNK_STAGING_PREFIX}/"
+    if not uri.startswith(prefix) or not uri.endswith(".txt"):
+        return None
+    # <corpus_id>/<run_id>/<source bucket>/<source path>
+    parts = uri[len(prefix):-len(".txt")].split("/", 3)
+    if len(parts) < 4 or not parts[3]:
+        return None
+    return f"gs://{parts[2]}/{parts[3]}"
+
+
+def _download(client: Any, uri: str) -> bytes:
+    bucket_name, blob_path = _split_gcs_uri(uri)
+    return client.bucket(bucket_name).blob(blob_path).download_as_bytes()
+
+
+def prechunk_files(
+    gcs_uris: List[str],
+    corpus_id: str,
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+    upload: bool = True,
+    max_workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Chunks the given GCS files locally, drops near-duplicate chunks across the whole batch
+    (first occurrence wins) and stages the remaining text of each file for import.
+
+    Args:
+        gcs_uris: gs:// URIs of the files to import
+        corpus_id: The target corpus (used for the staging path)
+        chunk_size: Chunk size in tokens (default: RAG_DEFAULT_CHUNK_SIZE), same as the import
+        chunk_overlap: Chunk overlap in tokens (default: RAG_DEFAULT_CHUNK_OVERLAP)
+        upload: If False, only estimate the savings without staging anything
+        max_workers: Processes for extraction / chunking (default: PRECHUNK_MAX_WORKERS); batches
+            below PRECHUNK_MIN_BYTES_PER_WORKER per worker use fewer processes or none
+
+    Returns:
+        A dictionary with `import_uris` (staged files plus unsupported files passed through
+        unchanged) and statistics, including the embedding requests saved.
+    """
+    chunk_size = chunk_size or RAG_DEFAULT_CHUNK_SIZE
+    chunk_overlap = RAG_DEFAULT_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+    try:
+        client = storage.Client()
+        timings = {}
+
+        # 1. Download (I/O bound, threads)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, min(PRECHUNK_DOWNLOAD_WORKERS, len(gcs_uris)))) as pool:
+            # Downloads run in copies of the caller's context, so GCS calls are attributed to the calling tool
+            futures = [pool.submit(contextvars.copy_context().run, _download, client, uri) for uri in gcs_uris]
+            contents = [future.result() for future in futures]
+        timings["download_seconds"] = round(time.perf_counter() - started, 3)
+
+        # 2. Extract, chunk and sign (CPU bound, processes)
+        started = time.perf_counter()
+        specs = [
+            {"uri": uri, "name": uri.rstrip("/").split("/")[-1], "data": data, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+            for uri, data in zip(gcs_uris, contents)
+        ]
+        total_bytes = sum(len(data) for data in contents)
+        workers = max(1, min(max_workers or PRECHUNK_MAX_WORKERS, len(specs), total_bytes // PRECHUNK_MIN_BYTES_PER_WORKER))
+        if workers == 1:
+            documents = [_prepare_document(spec) for spec in specs]
+        else:
+            context = multiprocessing.get_context(PRECHUNK_START_METHOD)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                documents = list(pool.map(_prepare_document, specs))
+        del contents, specs
+        timings["chunk_seconds"] = round(time.perf_counter() - started, 3)
+
+        # 3. Near-duplicate elimination across the batch, in input order
+        started = time.perf_counter()
+        lsh = MinHashLSH()
+        chunks_before = chunks_dropped = tokens_before = tokens_after = 0
+        embedding_before = embedding_after = 0
+        staged_texts: List[Tuple[str, str]] = []
+        passthrough, fully_duplicate, per_file = [], [], []
+        for doc in documents:
+            if doc["error"]:
+                logger.info(f"Importing {doc['uri']} without pre-chunking: {doc['error']}")
+                passthrough.append(doc["uri"])
+                per_file.append({"uri": doc["uri"], "prechunked": False, "reason": doc["error"]})
+                continue
+            kept_parts, kept_tokens, dropped, gap = [], 0, 0, False
+            for core, n_tokens, signature in zip(doc["cores"], doc["core_tokens"], doc["signatures"]):
+                if lsh.add_if_new(signature) is not None:
+                    dropped += 1
+                    gap = True
+                    continue
+                if gap and kept_parts:
+                    kept_parts.append("\n\n")
+                kept_parts.append(core)
+                kept_tokens += n_tokens
+                gap = False
+            n_chunks = len(doc["cores"])
+            chunks_before += n_chunks
+            chunks_dropped += dropped
+            tokens_before += doc["tokens"]
+            tokens_after += kept_tokens
+            embedding_before += chunk_count(doc["tokens"], chunk_size, chunk_overlap)
+            embedding_after += chunk_count(kept_tokens, chunk_size, chunk_overlap)
+            per_file.append({"uri": doc["uri"], "prechunked": True, "chunks": n_chunks, "dropped": dropped})
+            if kept_tokens == 0:
+                fully_duplicate.append(doc["uri"])
+                continue
+            staged_texts.append((doc["uri"], "".join(kept_parts)))
+        timings["dedup_seconds"] = round(time.perf_counter() - started, 3)
+
+        # 4. Stage the deduplicated documents
+        started = time.perf_counter()
+        staged_uris = []
+        if upload:
+            run_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            bucket = client.bucket(STAGING_BUCKET_NAME)
+            for uri, text in staged_texts:
+                blob_path = staged_blob_path(corpus_id, run_id, uri)
+                bucket.blob(blob_path).upload_from_string(text, content_type="text/plain; charset=utf-8")
+                staged_uris.append(f"gs://{STAGING_BUCKET_NAME}/{blob_path}")
+        timings["upload_seconds"] = round(time.perf_counter() - started, 3)
+
+        saved = embedding_before - embedding_after
+        return {
+            "status": "success",
+            "import_uris": staged_uris + passthrough if upload else [],
+            "staged_uris": staged_uris,
+            "passthrough_uris": passthrough,
+            "fully_duplicate_uris": fully_duplicate,
+            "stats": {
+                "files": len(gcs_uris),
+                "files_prechunked": len(gcs_uris) - len(passthrough),
+                "files_passthrough": len(passthrough),
+                "files_fully_duplicate": len(fully_duplicate),
+                "chunks_before": chunks_before,
+                "chunks_dropped": chunks_dropped,
+                "tokens_before": tokens_before,
+                "tokens_after": tokens_after,
+                "embedding_requests_before": embedding_before,
+                "embedding_requests_after": embedding_after,
+                "embedding_requests_saved": saved,
+                "saved_pct": round(100.0 * saved / embedding_before, 1) if embedding_before else 0.0,
+                "workers": workers,
+                **timings,
+            },
+            "files": per_file,
+            "message": f"Pre-chunked {len(gcs_uris) - len(passthrough)} of {len(gcs_uris)} files: dropped {chunks_dropped} of {chunks_before} chunks as near-duplicates, saving ~{saved} embedding requests"
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": str(e),
+            "message": f"Failed to pre-chunk files: {str(e)}"
+        }
@@ -0,0 +1,44 @@
+# ====================== ASYNC STORAGE TOOLS =====================
+#
+# Async-native versions of the storage tools. google-cloud-storage has no async client,
+# so calls run on the managed executor with a configured per-tool timeout (see rag/tools/executor).
+
+from typing import Dict, Any, Optional
+
+try:
+    from tools.storage import storage_tools
+    from tools.executor.managed_executor import run_tool
+except ImportError:
+    try:
+        from rag.tools.storage import storage_tools
+        from rag.tools.executor.managed_executor import run_tool
+    except ImportError:
+        from . import storage_tools
+        from ...tools.executor.managed_executor import run_tool
+
+
+async def create_gcs_bucket(
+    tool_context: Any,
+    bucket_name: str,
+    location: str
+) -> Dict[str, Any]:
+    """
+    Creates a Google Cloud Storage bucket if it doesn't exist.
+    """
+    return await run_tool(
+        "create_gcs_bucket", storage_tools.create_gcs_bucket,
+        tool_context=tool_context, bucket_name=bucket_name, location=location,
+    )
+
+
+async def list_blobs(
+    bucket_name: str,
+    prefix: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Lists blobs in a Google Cloud Storage bucket.
+    """
+    return await run_tool(
+        "list_blobs", storage_tools.list_blobs,
+        bucket_name=bucket_name, prefix=prefix,
+    )
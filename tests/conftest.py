@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Local state (caches, outbox, checkpoints) must not land in the working tree; set before any rag import
+os.environ.setdefault("RAG_STATE_DIR", tempfile.mkdtemp(prefix="rag-tests-"))
+# No Vertex warm-up or token refresher threads making network calls during the suite
+os.environ.setdefault("RAG_VERTEX_WARM_UP", "0")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+@pytest.fixture(scope="session")
+def backends():
+    """The in-process fakes from benchmarks/fakes.py, wired into the rag tool modules."""
+    from benchmarks.fakes import FakeBackends
+
+    return FakeBackends(seed=0).install()
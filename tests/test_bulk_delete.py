@@ -0,0 +1,43 @@
+import pytest
+
+
+@pytest.fixture
+def corpus(backends):
+    """A fresh corpus holding terms.pdf from two product folders plus a pre-chunked copy."""
+    from rag.config import STAGING_BUCKET_NAME
+    from rag.tools.preprocess.preprocess_tools import staged_blob_path
+
+    corpus = backends.rag.create_corpus(display_name="bulk-delete-test")
+    staged = staged_blob_path(corpus.name.split("/")[-1], "20260101_000000", "gs://b/productA/faq.md")
+    for uri in ("gs://b/productA/terms.pdf", "gs://b/productB/terms.pdf", f"gs://{STAGING_BUCKET_NAME}/{staged}"):
+        backends.rag._add_file(corpus.name, uri)
+    yield corpus.name.split("/")[-1]
+    backends.rag.delete_corpus(name=corpus.name)
+
+
+def _sources(backends, corpus_id):
+    return sorted(f.source_uri for f in backends.rag.files[corpus_id])
+
+
+def test_gcs_prefix_only_deletes_files_imported_from_that_prefix(backends, corpus):
+    from rag.tools.corpus.corpus_tools import bulk_delete_files
+
+    preview = bulk_delete_files(corpus, gcs_prefix="gs://b/productA/", dry_run=True)
+    assert preview["status"] == "success", preview
+    assert sorted(r["display_name"] for r in preview["results"]) == ["faq.md.txt", "terms.pdf"]
+
+    result = bulk_delete_files(corpus, gcs_prefix="gs://b/productA/")
+    assert (result["deleted"], result["failed"]) == (2, 0)
+    remaining = _sources(backends, corpus)
+    # productB's file with the same name is kept
+    assert remaining == ["gs://b/productB/terms.pdf"]
+
+
+def test_gcs_prefix_without_matches_is_reported(backends, corpus):
+    from rag.tools.corpus.corpus_tools import bulk_delete_files
+
+    result = bulk_delete_files(corpus, gcs_prefix="gs://b/productC/")
+    assert result["matched"] == 0
+    assert result["unmatched_selectors"] == ["gcs_prefix:gs://b/productC/"]
+    assert len(_sources(backends, corpus)) == 3
+    assert bulk_delete_files(corpus, gcs_prefix="b/productA/")["status"] == "error"
@@ -0,0 +1,190 @@
+import pytest
+
+from rag.tools.context.context_tools import (
+    assemble_context,
+    build_context,
+    count_tokens,
+    extract_snippets,
+    truncate_to_tokens,
+)
+
+
+def _hit(text, source_uri="gs://bucket/a.pdf", distance=0.2):
+    return {"text": text, "source_uri": source_uri, "distance": distance}
+
+
+def test_assemble_context_merges_overlapping_chunks_of_one_source():
+    # The chunks share a sentence longer than MIN_OVERLAP_CHARS, as overlapping imports do
+    shared = "Late claims need a written reason from the policy holder."
+    first = f"Claims must be filed within thirty days. {shared}"
+    second = f"{shared} Approved claims are paid within ten days."
+    result = assemble_context([_hit(first), _hit(second)])
+
+    assert len(result["spans"]) == 1
+    assert result["merged_chunks"] == 1
+    span = result["spans"][0]
+    assert span["chunk_count"] == 2
+    assert span["text"].count(shared) == 1
+    assert span["text"].startswith("Claims must be filed") and span["text"].endswith("within ten days.")
+
+
+def test_assemble_context_keeps_overlapping_chunks_of_different_sources_apart():
+    text = "Claims must be filed within thirty days. Late claims need a written reason."
+    other = "Late claims need a written reason. Approved claims are paid within ten days."
+    result = assemble_context([_hit(text, "gs://bucket/a.pdf"), _hit(other, "gs://bucket/b.pdf")])
+
+    assert [span["source_uri"] for span in result["spans"]] == ["gs://bucket/a.pdf", "gs://bucket/b.pdf"]
+    assert result["merged_chunks"] == 0
+
+
+def test_assemble_context_drops_near_duplicates_from_other_sources():
+    text = "The policy covers water damage caused by burst pipes but not by gradual leaks or flooding."
+    result = assemble_context([_hit(text, "gs://bucket/a.pdf"), _hit(text, "gs://bucket/copy.pdf")], separator="\n---\n")
+
+    assert result["dropped_duplicates"] == 1
+    assert result["context"] == text
+    assert result["tokens_saved"] > 0
+
+
+def test_assemble_context_absorbs_a_chunk_contained_in_a_span():
+    text = "Section 4. Windscreen damage is covered without an excess when the glass is repaired rather than replaced."
+    result = assemble_context([_hit(text), _hit("Windscreen damage is covered without an excess")])
+
+    assert len(result["spans"]) == 1
+    assert result["spans"][0]["text"] == text
+    assert result["spans"][0]["chunk_count"] == 2
+    assert result["merged_chunks"] == 1
+
+
+def test_assemble_context_bridges_spans_joined_by_a_later_chunk():
+    # The first two chunks are disjoint; the third overlaps both and joins them into one span
+    a = "Part one describes the cover for fire and smoke damage in the home."
+    b = "Part three describes the cover for theft of items left in a locked car."
+    bridge = "the cover for fire and smoke damage in the home. Part two lists exclusions. Part three describes the cover for theft"
+    result = assemble_context([_hit(a), _hit(b), _hit(bridge)])
+
+    assert len(result["spans"]) == 1
+    span = result["spans"][0]
+    assert span["chunk_count"] == 3
+    assert span["text"] == a + " Part two lists exclusions. " + b
+
+
+def test_assemble_context_drops_a_near_duplicate_with_small_differences():
+    words = " ".join(f"clause{i}" for i in range(40))
+    original = f"{words} ends here."
+    edited = f"{words} ends here!"
+    result = assemble_context([_hit(original, "gs://bucket/v1.pdf"), _hit(edited, "gs://bucket/v2.pdf", 0.25)])
+
+    assert result["dropped_duplicates"] == 1
+    assert [span["source_uri"] for span in result["spans"]] == ["gs://bucket/v1.pdf"]
+    assert result["input_chunks"] == 2
+
+
+def test_assemble_context_keeps_distinct_chunks_in_rank_order():
+    result = assemble_context([_hit("Alpha cover applies."), _hit("Beta cover applies.", "gs://bucket/b.pdf")], separator=" | ")
+
+    assert result["context"] == "Alpha cover applies. | Beta cover applies."
+    assert (result["merged_chunks"], result["dropped_duplicates"]) == (0, 0)
+
+
+def test_truncate_to_tokens_cuts_at_a_sentence_boundary():
+    text = "First sentence is short. Second sentence is a little longer than the first. Third one."
+    budget = count_tokens("First sentence is short.") + 2
+
+    assert truncate_to_tokens(text, budget) == "First sentence is short."
+    assert truncate_to_tokens(text, 10_000) == text
+    assert truncate_to_tokens(text, 0) == ""
+
+
+def test_truncate_to_tokens_hard_cuts_text_without_sentence_punctuation():
+    table = " | ".join(f"row {i} premium {i * 13} deductible {i * 7}" for i in range(200))
+    truncated = truncate_to_tokens(table, 50)
+
+    assert truncated
+    assert table.startswith(truncated)
+    assert count_tokens(truncated) <= 50
+
+
+def test_build_context_respects_the_budget_and_keeps_rank_order():
+    results = [
+        _hit("Alpha covers fire damage. " * 20, "gs://bucket/alpha.pdf", 0.4),
+        _hit("Beta covers theft of bicycles.", "gs://bucket/beta.pdf", 0.1),
+        _hit("Gamma covers glass breakage. " * 20, "gs://bucket/gamma.pdf", 0.3),
+    ]
+    budget = 120
+    result = build_context(results, token_budget=budget)
+
+    assert result["context_tokens"] <= budget
+    assert result["token_budget"] == budget
+    sources = [span["source_uri"] for span in result["spans"]]
+    assert "gs://bucket/beta.pdf" in sources
+    # Selection is by relevance per token, output order is the retrieval rank
+    assert sources == sorted(sources, key=[r["source_uri"] for r in results].index)
+    assert result["dropped_over_budget"] + len(result["spans"]) == 3
+
+
+def test_build_context_returns_everything_that_fits():
+    results = [_hit("Short answer one.", "gs://bucket/a.pdf"), _hit("Short answer two.", "gs://bucket/b.pdf")]
+    result = build_context(results, token_budget=1000, separator="\n")
+
+    assert result["context"] == "Short answer one.\nShort answer two."
+    assert result["dropped_over_budget"] == 0
+    assert result["truncated_spans"] == 0
+
+
+def test_extract_snippets_picks_the_sentences_matching_the_query():
+    text = (
+        "Our office is open on weekdays. "
+        "Windscreen repairs are covered without an excess. "
+        "Replacement windscreens carry a small excess. "
+        "Parking is available behind the building."
+    )
+    snippets = extract_snippets([_hit(text)], "Is windscreen repair covered?", max_sentences=2)
+
+    assert len(snippets) == 1
+    snippet = snippets[0]
+    assert "Windscreen repairs are covered" in snippet["text"]
+    assert "Parking" not in snippet["text"]
+    assert text[snippet["snippet_start"]:snippet["snippet_end"]] == snippet["text"]
+    assert snippet["chunk_chars"] == len(text)
+    assert snippet["snippet_score"] > 0
+    assert snippet["source_uri"] == "gs://bucket/a.pdf"
+
+
+def test_extract_snippets_without_matching_terms_keeps_the_leading_sentences():
+    text = "One. Two. Three. Four."
+    snippet = extract_snippets([_hit(text)], "unrelated question", max_sentences=2)[0]
+
+    assert snippet["snippet_start"] == 0
+    assert snippet["text"] == "One. Two."
+    assert snippet["snippet_score"] == 0
+
+
+def test_extract_snippets_drops_repeated_snippets_of_the_same_source():
+    text = "Roadside assistance is included. It covers towing up to fifty miles."
+    snippets = extract_snippets([_hit(text), _hit(text), _hit(text, "gs://bucket/b.pdf")], "roadside towing")
+
+    assert [s["source_uri"] for s in snippets] == ["gs://bucket/a.pdf", "gs://bucket/b.pdf"]
+
+
+@pytest.mark.parametrize("model", [None, "azure/gpt-4o"])
+def test_unmerged_chunks_report_no_savings(model):
+    text = "保険金の請求は事故発生日から三十日以内に行ってください。遅延した請求には書面による理由の説明が必要です。" * 4
+    results = [_hit(text), _hit("Theft of bicycles is covered up to 500 EUR.", "gs://bucket/b.pdf")]
+
+    assembled = assemble_context(results, model=model)
+    assert assembled["tokens_saved"] == 0
+    assert assembled["tokens_before"] == assembled["tokens_after"] == count_tokens(assembled["context"], model)
+
+    built = build_context(results, model=model, token_budget=10_000)
+    assert built["tokens_saved"] == 0
+    assert built["tokens_before"] == built["context_tokens"]
+
+
+def test_savings_count_only_removed_text():
+    shared = "Late claims need a written reason from the policy holder."
+    results = [_hit(f"Claims must be filed within thirty days. {shared}"), _hit(f"{shared} Approved claims are paid within ten days.")]
+    assembled = assemble_context(results, model="azure/gpt-4o")
+
+    assert assembled["tokens_saved"] == assembled["tokens_before"] - assembled["tokens_after"] > 0
+    assert assembled["tokens_saved"] <= count_tokens(shared, "azure/gpt-4o") + 2
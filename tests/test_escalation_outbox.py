@@ -0,0 +1,140 @@
+import time
+
+import pytest
+
+from benchmarks.fakes import FakeHandoffService
+from rag.tools.escalation.escalation_outbox import EscalationOutbox, EscalationSink, HttpSink
+
+
+class RecordingSink(EscalationSink):
+    """Accepts everything except the ticket IDs in `reject`; raises while `fail_next` > 0."""
+
+    name = "recording"
+
+    def __init__(self, reject=(), fail_next=0):
+        self.reject = set(reject)
+        self.fail_next = fail_next
+        self.batches = []
+
+    def deliver(self, records):
+        self.batches.append([record["ticket_id"] for record in records])
+        if self.fail_next:
+            self.fail_next -= 1
+            raise ConnectionError("hand-off service unavailable")
+        return [record["ticket_id"] for record in records if record["ticket_id"] not in self.reject]
+
+
+def _outbox(tmp_path, sink, **options):
+    options.setdefault("retry_base_seconds", 0)
+    return EscalationOutbox(path=str(tmp_path / "outbox.sqlite3"), sink=sink, **options)
+
+
+def _enqueue(outbox, *ticket_ids):
+    for ticket_id in ticket_ids:
+        outbox.enqueue({"ticket_id": ticket_id, "reason": "User request"})
+
+
+def test_claim_leases_rows_so_they_are_not_claimed_twice(tmp_path):
+    outbox = _outbox(tmp_path, RecordingSink(), batch_size=2)
+    _enqueue(outbox, "T1", "T2", "T3")
+
+    first = outbox._claim()
+    second = outbox._claim()
+    assert [entry["ticket_id"] for entry in first] == ["T1", "T2"]
+    assert [entry["ticket_id"] for entry in second] == ["T3"]
+    assert second[0]["record"] == {"ticket_id": "T3", "reason": "User request"}
+    assert outbox._claim() == []
+
+    # Settling releases the lease; nothing is due any more once delivered
+    outbox._settle(first + second, None, None)
+    assert outbox._claim() == []
+    assert outbox.stats()["delivered"] == 3
+
+
+def test_dispatch_delivers_in_enqueue_order(tmp_path):
+    sink = RecordingSink()
+    outbox = _outbox(tmp_path, sink, batch_size=10)
+    _enqueue(outbox, "T1", "T2")
+
+    assert outbox.dispatch_once() == 2
+    assert sink.batches == [["T1", "T2"]]
+    record = outbox.get("T1")
+    assert (record["state"], record["attempts"], record["last_error"]) == ("delivered", 1, None)
+    assert outbox.get("missing") is None
+    assert outbox.dispatch_once() == 0
+
+
+def test_failed_batch_is_retried_after_backoff(tmp_path):
+    sink = RecordingSink(fail_next=1)
+    outbox = _outbox(tmp_path, sink)
+    _enqueue(outbox, "T1")
+
+    assert outbox.dispatch_once() == 1
+    record = outbox.get("T1")
+    assert (record["state"], record["attempts"]) == ("pending", 1)
+    assert "ConnectionError" in record["last_error"]
+
+    assert outbox.dispatch_once() == 1
+    record = outbox.get("T1")
+    assert (record["state"], record["attempts"], record["last_error"]) == ("delivered", 2, None)
+    stats = outbox.stats()
+    assert (stats["failed_attempts_total"], stats["delivered_total"], stats["batches_sent"]) == (1, 1, 2)
+
+
+def test_backoff_delays_the_next_attempt(tmp_path):
+    outbox = _outbox(tmp_path, RecordingSink(fail_next=1), retry_base_seconds=60)
+    _enqueue(outbox, "T1")
+
+    assert outbox.dispatch_once() == 1
+    assert outbox.dispatch_once() == 0
+    assert 30 <= outbox._next_due_in() <= 60
+
+
+def test_rejected_records_are_retried_alone_and_end_dead(tmp_path):
+    sink = RecordingSink(reject={"T2"})
+    outbox = _outbox(tmp_path, sink, max_attempts=2)
+    _enqueue(outbox, "T1", "T2")
+
+    outbox.dispatch_once()
+    assert outbox.get("T1")["state"] == "delivered"
+    assert outbox.get("T2")["state"] == "pending"
+
+    outbox.dispatch_once()
+    assert sink.batches[-1] == ["T2"]
+    record = outbox.get("T2")
+    assert (record["state"], record["attempts"]) == ("dead", 2)
+    assert outbox.stats()["dead"] == 1
+    assert outbox.dispatch_once() == 0
+
+
+def test_records_survive_a_restart(tmp_path):
+    _enqueue(_outbox(tmp_path, RecordingSink()), "T1")
+    sink = RecordingSink()
+    reopened = _outbox(tmp_path, sink)
+
+    assert reopened.dispatch_once() == 1
+    assert sink.batches == [["T1"]]
+
+
+def test_dispatcher_delivers_over_http_with_retries(tmp_path):
+    with FakeHandoffService() as service:
+        service.fail_next = 1
+        outbox = _outbox(tmp_path, HttpSink(service.url, timeout_seconds=5)).start()
+        try:
+            _enqueue(outbox, "T1", "T2")
+            deadline = time.monotonic() + 10
+            while outbox.stats()["delivered"] < 2 and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            outbox.stop(timeout=5)
+
+    assert sorted(record["ticket_id"] for record in service.received) == ["T1", "T2"]
+    assert service.failures == 1
+    assert outbox.get("T1")["state"] == "delivered"
+    assert not outbox.stats()["dispatcher_running"]
+
+
+@pytest.mark.parametrize("record", [{}, {"reason": "no ticket"}])
+def test_enqueue_requires_a_ticket_id(tmp_path, record):
+    with pytest.raises(KeyError):
+        _outbox(tmp_path, RecordingSink()).enqueue(record)
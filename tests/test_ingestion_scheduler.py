@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+from rag.tools.executor.ingestion_scheduler import IngestionScheduler
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.01)
+
+
+def test_hotfix_is_admitted_before_an_earlier_backfill():
+    scheduler = IngestionScheduler(project_rpm=600, max_concurrent_jobs=1, min_rpm=10)
+    release = threading.Event()
+    started = []
+
+    def run_batch(label):
+        def run(batch, rpm):
+            started.append(label)
+            if label == "blocker":
+                release.wait(5)
+            return len(batch)
+        return run
+
+    def submit(label, priority):
+        thread = threading.Thread(target=scheduler.run, args=(label, [[1, 2]], run_batch(label), priority))
+        thread.start()
+        return thread
+
+    threads = [submit("blocker", "normal")]
+    _wait_for(lambda: started == ["blocker"])
+    threads.append(submit("backfill", "backfill"))
+    _wait_for(lambda: scheduler.stats()["queue_depth"] == 1)
+    threads.append(submit("hotfix", "hotfix"))
+    _wait_for(lambda: scheduler.stats()["queue_depth"] == 2)
+    assert [job["priority"] for job in scheduler.stats()["queued"]] == ["hotfix", "backfill"]
+
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert started == ["blocker", "hotfix", "backfill"]
+    stats = scheduler.stats()
+    assert (stats["jobs_completed"], stats["queue_depth"], stats["running_jobs"]) == (3, 0, 0)
+
+
+def test_rate_cap_and_results():
+    scheduler = IngestionScheduler(project_rpm=600, max_concurrent_jobs=2, min_rpm=10)
+    result = scheduler.run("capped", [[1, 2], [3]], lambda batch, rpm: (len(batch), rpm), rate_cap=50)
+
+    assert result["results"] == [(2, 50), (1, 50)]
+    assert result["job"]["state"] == "completed"
+
+
+def test_failed_batch_marks_the_job_failed():
+    scheduler = IngestionScheduler(project_rpm=600, max_concurrent_jobs=1, min_rpm=10)
+
+    def fail(batch, rpm):
+        raise RuntimeError("quota exceeded")
+
+    with pytest.raises(RuntimeError):
+        scheduler.run("broken", [[1]], fail)
+    with pytest.raises(ValueError):
+        scheduler.run("unknown", [[1]], fail, priority="urgent")
+    stats = scheduler.stats()
+    assert stats["jobs_failed"] == 1
+    assert stats["recent"][0]["state"] == "failed"
+    # The failed job released its slot
+    assert scheduler.run("next", [[1]], lambda batch, rpm: "ok")["results"] == ["ok"]
@@ -0,0 +1,32 @@
+import pytest
+
+from rag.tools.instrumentation.instrumentation_tools import percentile
+
+
+@pytest.mark.parametrize("values, pct, expected", [
+    ([1, 2], 50, 1),
+    (list(range(1, 11)), 50, 5),
+    (list(range(1, 11)), 90, 9),
+    (list(range(1, 11)), 91, 10),
+    (list(range(1, 21)), 95, 19),
+    (list(range(1, 101)), 99, 99),
+    ([7], 50, 7),
+    ([1, 2, 3], 0, 1),
+    ([1, 2, 3], 100, 3),
+    ([], 50, 0.0),
+])
+def test_percentile_is_nearest_rank(values, pct, expected):
+    assert percentile(values, pct) == expected
+
+
+def test_latency_tracker_and_outbox_use_the_same_percentile():
+    from rag.tools.escalation.escalation_outbox import _percentiles
+    from rag.tools.executor.resilience import LatencyTracker
+
+    tracker = LatencyTracker(window=10)
+    for value in range(10, 0, -1):
+        tracker.record(float(value))
+
+    assert tracker.percentile(50) == 5.0
+    assert LatencyTracker().percentile(50) is None
+    assert _percentiles([2.0, 1.0]) == {"p50": 1.0, "p95": 2.0, "max": 2.0}
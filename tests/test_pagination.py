@@ -0,0 +1,76 @@
+import pytest
+
+from rag.tools.corpus.corpus_tools import _paginate, _page_token_filter
+
+
+def test_paginate_walks_all_records_once():
+    records = list(range(7))
+    key = _page_token_filter("files", "1000", None, None, None)
+    pages, token = [], None
+    while True:
+        page, token = _paginate(records, 3, token, key)
+        pages.append(page)
+        if token is None:
+            break
+
+    assert pages == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_paginate_rejects_tokens_of_another_filter():
+    key = _page_token_filter("files", "1000", None, None, None)
+    _, token = _paginate(list(range(5)), 2, None, key)
+
+    with pytest.raises(ValueError, match="different filter"):
+        _paginate(list(range(5)), 2, token, _page_token_filter("files", "1000", "policy", None, None))
+    with pytest.raises(ValueError, match="Invalid page_token"):
+        _paginate(list(range(5)), 2, "not-a-token", key)
+
+
+def test_page_size_zero_returns_the_rest():
+    key = _page_token_filter("corpora", None, None, None)
+    _, token = _paginate(list(range(5)), 2, None, key)
+
+    assert _paginate(list(range(5)), 0, token, key) == ([2, 3, 4], None)
+
+
+def test_list_files_pages_through_a_corpus(backends):
+    from rag.tools.corpus.corpus_tools import list_files
+
+    seen, token = [], None
+    while True:
+        result = list_files("1000", page_size=8, page_token=token, fields=["id", "display_name"])
+        assert result["status"] == "success", result
+        assert result["total_count"] == 20
+        seen.extend(f["display_name"] for f in result["files"])
+        token = result.get("next_page_token")
+        if token is None:
+            break
+
+    assert len(seen) == len(set(seen)) == 20
+    assert set(result["files"][0]) == {"id", "display_name"}
+
+
+def test_list_files_token_is_tied_to_corpus_and_filters(backends):
+    from rag.tools.corpus.corpus_tools import list_files
+
+    token = list_files("1000", page_size=5)["next_page_token"]
+
+    assert list_files("1001", page_size=5, page_token=token)["status"] == "error"
+    assert list_files("1000", page_size=5, page_token=token, display_name_prefix="policy_000")["status"] == "error"
+    assert list_files("1000", page_size=5, page_token=token)["status"] == "success"
+
+
+def test_list_corpora_filters_by_display_name_prefix(backends):
+    from rag.tools.corpus.corpus_tools import list_corpora
+
+    first = list_corpora(page_size=2, display_name_prefix="BENCH-corpus")
+    assert first["total_count"] == 3
+    assert first["count"] == 2
+    rest = list_corpora(page_size=2, page_token=first["next_page_token"], display_name_prefix="BENCH-corpus")
+    assert rest["count"] == 1
+    assert "next_page_token" not in rest
+    ids = [c["id"] for c in first["corpora"] + rest["corpora"]]
+    assert sorted(ids) == ["1000", "1001", "1002"]
+
+    assert list_corpora(display_name_prefix="nothing-")["total_count"] == 0
+    assert list_corpora(created_after="not a date")["status"] == "error"
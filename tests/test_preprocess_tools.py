@@ -0,0 +1,36 @@
+from benchmarks.fakes import synthetic_text
+
+
+def test_files_with_the_same_name_in_different_folders_are_staged_separately(backends):
+    from rag.config import STAGING_BUCKET_NAME
+    from rag.tools.preprocess.preprocess_tools import prechunk_files, source_uri_of_staged
+
+    sources = {
+        "productA/terms.txt": synthetic_text("terms-product-a", words=400),
+        "productB/terms.txt": synthetic_text("terms-product-b", words=400),
+    }
+    backends.storage_client.objects["policy-docs"] = {path: text.encode("utf-8") for path, text in sources.items()}
+    uris = [f"gs://policy-docs/{path}" for path in sources]
+
+    result = prechunk_files(uris, "1000", chunk_size=64, chunk_overlap=8, max_workers=1)
+
+    assert result["status"] == "success", result
+    staged = result["staged_uris"]
+    assert len(staged) == len(set(staged)) == 2
+    assert [source_uri_of_staged(uri) for uri in staged] == uris
+    assert all(uri.rsplit("/", 1)[-1] == "terms.txt.txt" for uri in staged)
+    staging = backends.storage_client.objects[STAGING_BUCKET_NAME]
+    for uri, path in zip(staged, sources):
+        blob_path = uri[len(f"gs://{STAGING_BUCKET_NAME}/"):]
+        # Both documents survive: each staged copy starts with its own source's text
+        assert staging[blob_path].decode("utf-8")[:200] == sources[path][:200]
+
+
+def test_source_uri_of_staged_ignores_other_uris():
+    from rag.config import STAGING_BUCKET_NAME
+    from rag.tools.preprocess.preprocess_tools import source_uri_of_staged, staged_blob_path
+
+    path = staged_blob_path("1000", "20260101_000000", "gs://docs/a/b/c.pdf")
+    assert source_uri_of_staged(f"gs://{STAGING_BUCKET_NAME}/{path}") == "gs://docs/a/b/c.pdf"
+    assert source_uri_of_staged("gs://docs/a/b/c.pdf") is None
+    assert source_uri_of_staged(f"gs://{STAGING_BUCKET_NAME}/prechunked/1000/run/c.txt") is None
@@ -0,0 +1,156 @@
+import threading
+import time
+
+import pytest
+
+from rag.tools.executor import resilience
+from rag.tools.executor.resilience import (
+    CallTimeoutError,
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilientCaller,
+    is_breaker_failure,
+)
+
+
+def _breaker(**overrides):
+    options = dict(window=10, min_calls=4, error_rate=0.5, consecutive_failures=3, open_seconds=0.05)
+    options.update(overrides)
+    return CircuitBreaker("test", **options)
+
+
+def _fail(error):
+    def func(*args, **kwargs):
+        raise error
+    return func
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_once():
+    breaker = _breaker()
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["opens"] == 1
+
+
+def test_breaker_opens_on_error_rate_once_min_calls_are_seen():
+    breaker = _breaker(consecutive_failures=100)
+    for success in (True, False, True):
+        breaker.record(success)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_failed_probe_reopens_and_release_frees_the_probe():
+    breaker = _breaker(consecutive_failures=1)
+    breaker.record(False)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats()["opens"] == 2
+
+
+def test_only_transient_errors_count_as_breaker_failures():
+    assert is_breaker_failure(TimeoutError())
+    assert is_breaker_failure(CallTimeoutError())
+    assert is_breaker_failure(ConnectionError())
+    assert not is_breaker_failure(ValueError("bad request"))
+    assert not is_breaker_failure(KeyError("not found"))
+
+
+def test_caller_returns_result_and_serves_cached_answer_when_open():
+    caller = ResilientCaller("test", max_workers=4)
+    caller._breakers["corpus"] = _breaker(consecutive_failures=1, open_seconds=60)
+    try:
+        assert caller.call("corpus", "query", lambda q: [q.upper()], "hello", timeout=5) == (["HELLO"], False)
+        with pytest.raises(ConnectionError):
+            caller.call("corpus", "query", _fail(ConnectionError("unavailable")), timeout=5)
+        assert caller.breaker("corpus").state == CircuitBreaker.OPEN
+
+        assert caller.call("corpus", "query", lambda: ["never called"], timeout=5) == (["HELLO"], True)
+        with pytest.raises(CircuitOpenError):
+            caller.call("corpus", "other query", lambda: ["never called"], timeout=5)
+
+        counts = caller.stats()
+        assert (counts["errors"], counts["short_circuited"], counts["degraded_responses"]) == (1, 2, 1)
+    finally:
+        caller.shutdown()
+
+
+def test_caller_client_errors_do_not_open_the_breaker():
+    caller = ResilientCaller("test", max_workers=4)
+    caller._breakers["corpus"] = _breaker(consecutive_failures=1, open_seconds=60)
+    try:
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                caller.call("corpus", "query", _fail(ValueError("invalid corpus")), timeout=5)
+        assert caller.breaker("corpus").state == CircuitBreaker.CLOSED
+        assert caller.stats()["client_errors"] == 3
+        assert caller.stats()["errors"] == 0
+    finally:
+        caller.shutdown()
+
+
+def test_caller_times_out_and_counts_a_breaker_failure():
+    caller = ResilientCaller("test", max_workers=4)
+    release = threading.Event()
+    try:
+        with pytest.raises(CallTimeoutError):
+            caller.call("corpus", "query", release.wait, 5, timeout=0.1)
+        stats = caller.stats()
+        assert stats["timeouts"] == 1
+        assert stats["breakers"]["corpus"]["recent_error_rate"] == 1.0
+        assert stats["spare_in_flight"] >= 1
+    finally:
+        release.set()
+        caller.shutdown()
+
+
+def test_caller_hedges_slow_calls_within_the_spare_cap(monkeypatch):
+    monkeypatch.setattr(resilience, "RETRIEVAL_HEDGE_DEFAULT_DELAY_SECONDS", 0.05)
+    release = threading.Event()
+    attempts = []
+
+    def first_attempt_hangs():
+        attempts.append(1)
+        if len(attempts) == 1:
+            release.wait(5)
+            return "primary"
+        return "hedge"
+
+    caller = ResilientCaller("test", max_workers=4, max_spare_in_flight=4)
+    try:
+        assert caller.call("corpus", "query", first_attempt_hangs, timeout=5) == ("hedge", False)
+        stats = caller.stats()
+        assert (stats["hedges_sent"], stats["hedge_wins"]) == (1, 1)
+    finally:
+        release.set()
+        caller.shutdown()
+
+    attempts.clear()
+    release.clear()
+    capped = ResilientCaller("capped", max_workers=4, max_spare_in_flight=0)
+    try:
+        with pytest.raises(CallTimeoutError):
+            capped.call("corpus", "query", first_attempt_hangs, timeout=0.3)
+        stats = capped.stats()
+        assert (stats["hedges_sent"], stats["hedges_skipped"]) == (0, 1)
+        assert len(attempts) == 1
+    finally:
+        release.set()
+        capped.shutdown()
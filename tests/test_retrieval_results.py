@@ -0,0 +1,74 @@
+import math
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from rag.tools.corpus.retrieval_results import RetrievalHits
+
+
+def _hits(distances, corpus_id=None):
+    texts = [f"chunk {i}" for i in range(len(distances))]
+    uris = [f"gs://bucket/{i}.pdf" for i in range(len(distances))]
+    hits = RetrievalHits(texts, uris, np.asarray(distances, dtype=np.float64))
+    return hits.with_corpus_id(corpus_id) if corpus_id else hits
+
+
+def test_similarity_scores_are_one_minus_distance_clipped():
+    hits = _hits([0.0, 0.25, 1.0, 1.7, -0.2, math.nan]).with_similarity_scores()
+
+    assert hits.scores.tolist() == pytest.approx([1.0, 0.75, 0.0, 0.0, 1.0, 0.0])
+    # Distances are left untouched
+    assert np.isnan(hits.distances[-1])
+    assert hits.distances[3] == 1.7
+
+
+def test_similarity_scores_do_not_depend_on_the_other_hits():
+    alone = _hits([0.3]).with_similarity_scores()
+    together = _hits([0.3, 0.31, 0.9]).with_similarity_scores()
+
+    assert alone.scores[0] == together.scores[0] == pytest.approx(0.7)
+
+
+def test_top_k_ranks_by_distance_with_missing_distances_last():
+    hits = RetrievalHits.concat([_hits([0.5, math.nan], "a"), _hits([0.1, 0.3], "b")]).with_similarity_scores()
+    best = hits.top_k(3)
+
+    assert best.distances.tolist() == [0.1, 0.3, 0.5]
+    assert best.corpus_ids == ["b", "b", "a"]
+
+
+def test_top_k_keeps_the_order_of_equal_distances():
+    hits = RetrievalHits.concat([_hits([0.4, 0.2], "a"), _hits([0.2, 0.4], "b")])
+    best = hits.top_k(4)
+
+    assert best.distances.tolist() == [0.2, 0.2, 0.4, 0.4]
+    assert best.corpus_ids == ["a", "b", "a", "b"]
+    assert best.scores is None
+
+
+def test_split_by_corpus_keeps_order_within_each_corpus():
+    hits = RetrievalHits.concat([_hits([0.2, 0.4], "a"), _hits([0.1], "b")]).take([2, 1, 0])
+    groups = hits.split_by_corpus()
+
+    assert sorted(groups) == ["a", "b"]
+    assert groups["a"].distances.tolist() == [0.4, 0.2]
+    assert len(groups["b"]) == 1
+    assert _hits([0.1]).split_by_corpus() == {}
+
+
+def test_from_contexts_and_to_dicts_round_trip():
+    contexts = [
+        SimpleNamespace(text="first", source_uri="gs://bucket/a.pdf", distance=0.2),
+        SimpleNamespace(text="second", source_uri=None, distance=None),
+    ]
+    hits = RetrievalHits.from_contexts(contexts).with_similarity_scores().as_stale()
+    dicts = hits.to_dicts()
+
+    assert [d["text"] for d in dicts] == ["first", "second"]
+    assert dicts[0]["score"] == pytest.approx(0.8)
+    assert dicts[1]["source_uri"] == ""
+    assert all(d["stale"] for d in dicts)
+    assert len(hits.to_dicts(limit=1)) == 1
+    assert hits.mean_distance() == pytest.approx(0.6)
+    assert hits.unique_sources() == ["gs://bucket/a.pdf"]
@@ -0,0 +1,42 @@
+def _retrieval_requests():
+    from rag.tools.corpus import corpus_tools
+
+    return corpus_tools._retrieval_caller.stats()["requests"]
+
+
+def test_import_does_not_probe_retrieval_while_routing_is_off(backends, monkeypatch):
+    from rag.tools.corpus import corpus_tools
+
+    monkeypatch.setattr(corpus_tools, "ROUTING_DEFAULT_TOP_N", 0)
+    started = []
+    monkeypatch.setattr(corpus_tools, "update_routing_index", lambda *args: started.append(args))
+
+    result = corpus_tools.import_files("1001", ["gs://bench-bucket/corpus-1/new_policy.pdf"])
+    assert result["status"] == "success", result
+    assert started == []
+
+
+def test_import_refreshes_routing_when_enabled(backends, monkeypatch):
+    import threading
+    from rag.tools.corpus import corpus_tools
+
+    monkeypatch.setattr(corpus_tools, "ROUTING_DEFAULT_TOP_N", 2)
+    refreshed = threading.Event()
+    monkeypatch.setattr(corpus_tools, "update_routing_index", lambda *args: refreshed.set())
+
+    corpus_tools.import_files("1001", ["gs://bench-bucket/corpus-1/another_policy.pdf"])
+    assert refreshed.wait(5)
+
+
+def test_routing_probes_bypass_the_resilient_caller(backends):
+    from rag.tools.corpus import corpus_tools
+
+    before = _retrieval_requests()
+    calls_before = backends.rag.calls.get("retrieval_query", 0)
+    uris = [f.source_uri for f in backends.rag.files["1002"][:3]]
+
+    result = corpus_tools.update_routing_index("1002", uris)
+    assert result["status"] == "success", result
+    assert result["sampled_chunks"] > 0
+    assert backends.rag.calls["retrieval_query"] - calls_before == 3
+    assert _retrieval_requests() == before
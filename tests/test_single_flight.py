@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from rag.tools.executor.single_flight import SingleFlight
+
+
+def _run_concurrently(flight, key, func, callers):
+    results, errors = [None] * callers, [None] * callers
+
+    def call(i):
+        try:
+            results[i] = flight.do(key, func)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return {"hits": [1, 2, 3]}
+
+    threads, results, errors = _run_concurrently(flight, "key", slow, 5)
+    deadline = time.monotonic() + 5
+    while flight.stats()["requests"] < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert errors == [None] * 5
+    assert len(calls) == 1
+    assert all(result == {"hits": [1, 2, 3]} for result in results)
+    # Waiters get their own copy, so in-place post-processing cannot leak between callers
+    assert len({id(result) for result in results}) == 5
+    stats = flight.stats()
+    assert (stats["requests"], stats["executions"], stats["coalesced"]) == (5, 1, 4)
+    assert stats["in_flight"] == 0
+
+
+def test_errors_propagate_to_waiters():
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise RuntimeError("backend down")
+
+    threads, results, errors = _run_concurrently(flight, "key", failing, 3)
+    deadline = time.monotonic() + 5
+    while flight.stats()["requests"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert flight.stats()["executions"] == 1
+
+
+def test_results_are_not_cached_after_the_call_finishes():
+    flight = SingleFlight("test")
+    counter = iter(range(10))
+
+    assert flight.do("key", lambda: next(counter)) == 0
+    assert flight.do("key", lambda: next(counter)) == 1
+    assert flight.do("other", lambda x: x * 2, 21) == 42
+    assert flight.stats()["executions"] == 3
+
+
+def test_failed_call_does_not_poison_the_key():
+    flight = SingleFlight("test")
+
+    with pytest.raises(ValueError):
+        flight.do("key", lambda: (_ for _ in ()).throw(ValueError("bad")))
+    assert flight.do("key", lambda: "ok") == "ok"
@@ -0,0 +1,81 @@
+import csv
+
+import pytest
+
+from benchmarks.fakes import write_synthetic_sheet
+from rag.tools.lifecycle.testcase_reader import open_testcases
+
+
+def _write_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows)
+    return str(path)
+
+
+def test_reads_xlsx_sheet_with_detected_columns(tmp_path):
+    path = write_synthetic_sheet(str(tmp_path / "sheet.xlsx"), rows=5, seed=1)
+    reader = open_testcases(path)
+
+    assert reader.columns == ["Query", "Ground Truth", "Category"]
+    assert (reader.query_column, reader.truth_column) == ("Query", "Ground Truth")
+    cases = list(reader)
+    assert [case.row_id for case in cases] == [1, 2, 3, 4, 5]
+    assert all(case.query.startswith("What does my policy say about") for case in cases)
+    assert cases[0].as_dict(reader.columns)["Ground Truth"] == cases[0].ground_truth
+    assert reader.rows_read == 5
+
+
+def test_csv_skips_empty_rows_but_keeps_row_ids(tmp_path):
+    path = _write_csv(tmp_path / "sheet.csv", [
+        ["Category", "Question", "Expected"],
+        ["POLICY", "Is flood covered?", "No"],
+        ["", "", ""],
+        ["VAS", "Is towing covered?", ""],
+    ])
+    reader = open_testcases(path)
+
+    assert (reader.query_index, reader.truth_index) == (1, 2)
+    cases = list(reader)
+    assert [case.row_id for case in cases] == [1, 3]
+    assert cases[0].ground_truth == "No"
+    # A missing ground truth is reported as N/A; the raw value stays None
+    assert cases[1].ground_truth == "N/A"
+    assert cases[1].values == ("VAS", "Is towing covered?", None)
+
+
+def test_query_column_falls_back_to_the_first_column(tmp_path):
+    path = _write_csv(tmp_path / "sheet.csv", [["Prompt", "Notes"], ["Hello there", "short row"], ["Only prompt"]])
+    reader = open_testcases(path)
+
+    assert reader.query_column == "Prompt"
+    assert reader.truth_column is None
+    cases = list(reader)
+    assert [case.query for case in cases] == ["Hello there", "Only prompt"]
+    # Short rows are padded to the header width
+    assert cases[1].values == ("Only prompt", None)
+
+
+def test_reads_parquet_sheet(tmp_path):
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+    path = str(tmp_path / "sheet.parquet")
+    pd.DataFrame({"query": ["a?", "b?"], "answer": ["A", None]}).to_parquet(path)
+
+    cases = list(open_testcases(path))
+    assert [(case.query, case.ground_truth) for case in cases] == [("a?", "A"), ("b?", "N/A")]
+
+
+@pytest.mark.parametrize("name", ["missing.xlsx", "notes.txt"])
+def test_rejects_missing_or_unsupported_files(tmp_path, name):
+    path = tmp_path / name
+    if name.endswith(".txt"):
+        path.write_text("query\nhello\n")
+    with pytest.raises(ValueError):
+        open_testcases(str(path))
+
+
+def test_rejects_file_without_header(tmp_path):
+    path = tmp_path / "empty.csv"
+    path.write_text("")
+    with pytest.raises(ValueError, match="no header"):
+        open_testcases(str(path))
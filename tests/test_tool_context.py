@@ -0,0 +1,41 @@
+import threading
+
+from rag.tools.instrumentation.instrumentation_tools import _current_tool, instrument_tool
+
+
+def test_bulk_delete_workers_run_in_the_tool_context(backends, monkeypatch):
+    from rag.tools.corpus import corpus_tools
+
+    seen = []
+
+    def fake_delete(corpus_id, file_id):
+        seen.append((_current_tool.get(), threading.current_thread() is not threading.main_thread()))
+        return {"status": "success"}
+
+    monkeypatch.setattr(corpus_tools, "delete_file_from_corpus", fake_delete)
+    tool = instrument_tool(corpus_tools.bulk_delete_files)
+
+    result = tool("1002", display_name_patterns=["policy_000*.pdf"], max_workers=4)
+    assert result["deleted"] == 10
+    assert seen == [("bulk_delete_files", True)] * 10
+
+
+def test_federated_retrieval_batches_run_in_the_tool_context(backends, monkeypatch):
+    from rag.tools.corpus import corpus_tools
+    from rag.tools.corpus.retrieval_results import RetrievalHits
+
+    seen = []
+
+    def fake_retrieve(batch, *args):
+        seen.append(_current_tool.get())
+        return RetrievalHits.empty()
+
+    monkeypatch.setattr(corpus_tools, "_retrieve_batch", fake_retrieve)
+    token = _current_tool.set("query_corpus")
+    try:
+        per_corpus = corpus_tools._retrieve_per_corpus(["1000", "1001", "1002"], "claims", 3, 0.5, batch_size=1)
+    finally:
+        _current_tool.reset(token)
+
+    assert [entry["error"] for entry in per_corpus] == [None] * 3
+    assert seen == ["query_corpus"] * 3